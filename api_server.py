@@ -0,0 +1,186 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import hmac
+import logging
+import threading
+import time
+from typing import Callable
+
+import uvicorn
+from fastapi import Depends, FastAPI, Header, HTTPException, Query, WebSocket, WebSocketDisconnect
+from pydantic import BaseModel
+
+from command_dispatcher import CommandDispatcher
+
+# HTTP/WebSocket gateway next to the TCP command server.
+#
+# Commands go through the same CommandDispatcher as the TCP clients, so both paths share handlers,
+# timeouts and statistics. REP events (the messages VoegeliMonitor.send_tcp_rep broadcasts) are
+# fanned out to every client connected to /ws/events. Everything runs on one uvicorn event loop on
+# its own thread. Requests authenticate with "Authorization: Bearer <API_TOKEN>", WebSockets with
+# "?token=<API_TOKEN>".
+
+
+class EventStream:
+    """Fans REP events out to WebSocket clients, each with a bounded queue that drops its oldest event."""
+
+    def __init__(self, max_queue: int = 64):
+        self.max_queue = max_queue
+        self.loop: asyncio.AbstractEventLoop | None = None
+        self._subscribers: set[asyncio.Queue] = set()
+        self.dropped = 0
+
+    def publish(self, message: str) -> None:
+        """Thread-safe; events published before the server is up are discarded."""
+        loop = self.loop
+        if loop is None or loop.is_closed():
+            return
+        event = {"type": "rep", "time": time.time(), "message": message.strip()}
+        try:
+            loop.call_soon_threadsafe(self._fan_out, event)
+        except RuntimeError:
+            # loop closed while we were publishing
+            pass
+
+    def _fan_out(self, event: dict) -> None:
+        for subscriber in self._subscribers:
+            if subscriber.full():
+                subscriber.get_nowait()
+                self.dropped += 1
+            subscriber.put_nowait(event)
+
+    def subscribe(self) -> asyncio.Queue:
+        subscriber = asyncio.Queue(self.max_queue)
+        self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: asyncio.Queue) -> None:
+        self._subscribers.discard(subscriber)
+
+    @property
+    def client_count(self) -> int:
+        return len(self._subscribers)
+
+
+class SwitchRequest(BaseModel):
+    on: bool
+
+
+class NewsletterRequest(BaseModel):
+    email: str
+
+
+def create_app(dispatcher: CommandDispatcher, events: EventStream, status: Callable[[], dict], api_token: str, *,
+               command_timeout_s: float = 10.0) -> FastAPI:
+
+    @contextlib.asynccontextmanager
+    async def lifespan(_app: FastAPI):
+        events.loop = asyncio.get_running_loop()
+        yield
+        events.loop = None
+
+    app = FastAPI(title="Birdhouse", lifespan=lifespan)
+
+    def _token_ok(token: str | None) -> bool:
+        return token is not None and hmac.compare_digest(token, api_token)
+
+    def require_token(authorization: str | None = Header(default=None)) -> None:
+        scheme, _, token = (authorization or "").partition(" ")
+        if scheme.lower() != "bearer" or not _token_ok(token):
+            raise HTTPException(status_code=401, detail="invalid token")
+
+    async def run_command(cmd_string: str) -> dict:
+        loop = asyncio.get_running_loop()
+        reply = loop.create_future()
+
+        def send_ack(message: str):
+            # handlers may answer from a dispatcher worker thread
+            loop.call_soon_threadsafe(lambda: reply.done() or reply.set_result(message))
+
+        dispatcher.dispatch(cmd_string, send_ack)
+        try:
+            message = (await asyncio.wait_for(reply, command_timeout_s)).strip()
+        except asyncio.TimeoutError:
+            raise HTTPException(status_code=504, detail="command not acknowledged") from None
+        if message.startswith("[ERR]"):
+            if "unknown command" in message:
+                status_code = 404
+            elif "timed out" in message:
+                status_code = 504
+            else:
+                status_code = 500
+            raise HTTPException(status_code=status_code, detail=message)
+        return {"reply": message}
+
+    authorized = [Depends(require_token)]
+
+    # a plain def, so FastAPI runs it in its threadpool: status() takes locks and queries the outbox manifest
+    @app.get("/api/status", dependencies=authorized)
+    def get_status():
+        return status()
+
+    @app.post("/api/ir/led", dependencies=authorized)
+    async def set_ir_led(request: SwitchRequest):
+        return await run_command("[CMD] IR ON" if request.on else "[CMD] IR OFF")
+
+    @app.post("/api/ir/filter", dependencies=authorized)
+    async def set_ir_filter(request: SwitchRequest):
+        return await run_command("[CMD] IR FILTER ON" if request.on else "[CMD] IR FILTER OFF")
+
+    @app.post("/api/images", status_code=202, dependencies=authorized)
+    async def save_image():
+        # acknowledged as soon as the capture starts; the result arrives as a REP event
+        return await run_command("[CMD] save image")
+
+    @app.post("/api/newsletter", dependencies=authorized)
+    async def add_newsletter(request: NewsletterRequest):
+        return await run_command(f"[CMD] add newsletter={request.email}")
+
+    @app.delete("/api/newsletter/{email}", dependencies=authorized)
+    async def remove_newsletter(email: str):
+        return await run_command(f"[CMD] remove newsletter={email}")
+
+    @app.websocket("/ws/events")
+    async def event_socket(websocket: WebSocket, token: str | None = Query(default=None)):
+        if not _token_ok(token):
+            await websocket.close(code=1008)
+            return
+        await websocket.accept()
+        subscriber = events.subscribe()
+        try:
+            while True:
+                await websocket.send_json(await subscriber.get())
+        except (WebSocketDisconnect, RuntimeError):
+            pass
+        finally:
+            events.unsubscribe(subscriber)
+
+    return app
+
+
+class ApiServer:
+    def __init__(self, app: FastAPI, ip: str, port: int):
+        self.server = uvicorn.Server(uvicorn.Config(app, host=ip, port=port, log_level="warning"))
+        self.thread = threading.Thread(target=self.server.run, name="api_server", daemon=True)
+
+    def start(self, timeout: float = 10.0) -> None:
+        self.thread.start()
+        deadline = time.monotonic() + timeout
+        while not self.server.started and self.thread.is_alive() and time.monotonic() < deadline:
+            time.sleep(0.05)
+        if not self.server.started:
+            raise RuntimeError("API server failed to start")
+
+    def shutdown(self) -> None:
+        self.server.should_exit = True
+        self.thread.join(timeout=5.0)
+
+
+def run_api_server(dispatcher: CommandDispatcher, events: EventStream, status: Callable[[], dict], api_token: str,
+                   ip: str = "0.0.0.0", port: int = 8000) -> ApiServer:
+    server = ApiServer(create_app(dispatcher, events, status, api_token), ip, port)
+    server.start()
+    logging.info(f"[API] Server running on: {ip}, {port}")
+    return server
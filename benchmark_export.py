@@ -0,0 +1,277 @@
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import os
+import resource
+import shutil
+import statistics
+import subprocess
+import tempfile
+import threading
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+import psutil
+
+from persistent_rtsp import PersistentRtspRecorder
+
+# Mirrors the segment branch of the README pipeline: 1080p25 High profile H.264,
+# 18 Mbit/s, keyframe every 20 frames, 1 s MPEG-TS segments wrapped at 16.
+_SEGMENT_TIME_SECONDS = 1.0
+_SEGMENT_WRAP = 16
+_VIDEO_FPS = 25
+
+EXPORT_MODES = {
+    # Full Live Photo export: concat, trim/re-encode, still extraction, metadata.
+    "live_photo": {"duration_seconds": 5.0},
+    # Longer clip to show how the export path scales with the rendered duration.
+    "long_clip": {"duration_seconds": 10.0},
+}
+
+
+@dataclass
+class ExportRun:
+    encoder: str
+    mode: str
+    iteration: int
+    wall_s: float
+    cpu_s: float
+    peak_rss_mb: float
+    still_bytes: int
+    motion_bytes: int
+
+
+def generate_segment_buffer(buffer_dir: Path, *, seconds: int = _SEGMENT_WRAP) -> list[Path]:
+    buffer_dir.mkdir(parents=True, exist_ok=True)
+    for stale in buffer_dir.glob("segment_*.ts"):
+        stale.unlink()
+    subprocess.run(
+        [
+            "ffmpeg",
+            "-hide_banner",
+            "-loglevel", "warning",
+            "-f", "lavfi",
+            "-i", f"testsrc2=size=1920x1080:rate={_VIDEO_FPS}",
+            "-t", str(seconds),
+            "-c:v", "libx264",
+            "-profile:v", "high",
+            "-level", "4.2",
+            "-pix_fmt", "yuv420p",
+            "-b:v", "18000k",
+            "-maxrate", "18000k",
+            "-bufsize", "36000k",
+            "-g", "20",
+            "-f", "segment",
+            "-segment_time", str(_SEGMENT_TIME_SECONDS),
+            "-segment_wrap", str(_SEGMENT_WRAP),
+            "-segment_list_size", str(_SEGMENT_WRAP),
+            "-segment_format", "mpegts",
+            str(buffer_dir / "segment_%03d.ts"),
+        ],
+        check=True,
+        capture_output=True,
+        text=True,
+        timeout=max(120, seconds * 10),
+    )
+    return sorted(buffer_dir.glob("segment_*.ts"))
+
+
+def _refresh_segment_mtimes(segments: list[Path]) -> None:
+    # The recorder prunes segments older than its rolling window and only picks
+    # "settled" ones, so make the synthetic buffer look like it was just written.
+    now = time.time()
+    for index, segment in enumerate(segments):
+        age = (len(segments) - index) * _SEGMENT_TIME_SECONDS + 1.0
+        os.utime(segment, (now - age, now - age))
+
+
+def _cpu_seconds() -> float:
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+
+class _ChildRssSampler:
+    """
+    Peak combined RSS of this process's child tree (the export's ffmpeg runs) while active.
+
+    ru_maxrss cannot be used here: it is a lifetime high-water mark, so it would still report the
+    libx264 encode that generated the synthetic buffer. Sampling misses children shorter than
+    ``interval_s``, which are the small probe and still-frame runs, not the peak.
+    """
+
+    def __init__(self, interval_s: float = 0.02):
+        self.interval_s = interval_s
+        self.peak_bytes = 0
+        self._process = psutil.Process()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, name="bench_rss", daemon=True)
+
+    def _sample(self) -> None:
+        while True:
+            total = 0
+            for child in self._process.children(recursive=True):
+                try:
+                    total += child.memory_info().rss
+                except psutil.Error:
+                    pass  # exited between listing and reading
+            self.peak_bytes = max(self.peak_bytes, total)
+            if self._stop.wait(self.interval_s):
+                return
+
+    def __enter__(self) -> _ChildRssSampler:
+        self._thread.start()
+        return self
+
+    def __exit__(self, *_exc) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    @property
+    def peak_mb(self) -> float:
+        return self.peak_bytes / (1024.0 * 1024.0)
+
+
+def run_export_benchmark(
+    *,
+    buffer_dir: Path,
+    output_dir: Path,
+    encoders: list[str],
+    modes: list[str],
+    iterations: int,
+    keep_outputs: bool = False,
+) -> list[ExportRun]:
+    segments = sorted(buffer_dir.glob("segment_*.ts"))
+    if not segments:
+        raise FileNotFoundError(f"No segment_*.ts files in {buffer_dir}")
+
+    runs: list[ExportRun] = []
+    for encoder in encoders:
+        recorder = PersistentRtspRecorder(
+            "rtsp://benchmark.invalid/birdcam",
+            local_buffer_dir=str(buffer_dir),
+            segment_time_seconds=_SEGMENT_TIME_SECONDS,
+            rolling_window_seconds=_SEGMENT_WRAP,
+            final_video_encoder=encoder,
+            video_fps=_VIDEO_FPS,
+        )
+        recorder.start()
+        try:
+            for mode in modes:
+                mode_kwargs = EXPORT_MODES[mode]
+                for iteration in range(iterations):
+                    _refresh_segment_mtimes(segments)
+                    cpu_before = _cpu_seconds()
+                    start = time.perf_counter()
+                    with _ChildRssSampler() as rss:
+                        result = recorder.export_live_photo(
+                            timestamp=f"bench_{encoder}_{mode}_{iteration:03d}",
+                            output_dir=str(output_dir),
+                            post_trigger_seconds=0.0,
+                            **mode_kwargs,
+                        )
+                    wall_s = time.perf_counter() - start
+                    cpu_s = _cpu_seconds() - cpu_before
+
+                    still_bytes = result.still_path.stat().st_size if result.still_path else 0
+                    motion_bytes = result.motion_path.stat().st_size if result.motion_path else 0
+                    runs.append(ExportRun(
+                        encoder=encoder,
+                        mode=mode,
+                        iteration=iteration,
+                        wall_s=wall_s,
+                        cpu_s=cpu_s,
+                        peak_rss_mb=rss.peak_mb,
+                        still_bytes=still_bytes,
+                        motion_bytes=motion_bytes,
+                    ))
+                    logging.info(
+                        "[bench] %s/%s #%d: wall=%.2fs cpu=%.2fs still=%dB motion=%dB",
+                        encoder, mode, iteration, wall_s, cpu_s, still_bytes, motion_bytes,
+                    )
+                    if not keep_outputs:
+                        for path in (result.still_path, result.motion_path):
+                            if path is not None:
+                                path.unlink(missing_ok=True)
+        finally:
+            recorder.stop()
+    return runs
+
+
+def summarize(runs: list[ExportRun]) -> list[dict]:
+    summary = []
+    keys = sorted({(run.encoder, run.mode) for run in runs})
+    for encoder, mode in keys:
+        group = [run for run in runs if run.encoder == encoder and run.mode == mode]
+        walls = [run.wall_s for run in group]
+        cpus = [run.cpu_s for run in group]
+        summary.append({
+            "encoder": encoder,
+            "mode": mode,
+            "runs": len(group),
+            "wall_s_median": statistics.median(walls),
+            "wall_s_min": min(walls),
+            "wall_s_max": max(walls),
+            "cpu_s_median": statistics.median(cpus),
+            "peak_rss_mb": max(run.peak_rss_mb for run in group),
+            "still_bytes_median": statistics.median(run.still_bytes for run in group),
+            "motion_bytes_median": statistics.median(run.motion_bytes for run in group),
+        })
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark PersistentRtspRecorder.export_live_photo against a synthetic local buffer."
+    )
+    parser.add_argument("-n", "--iterations", type=int, default=3)
+    parser.add_argument("--encoders", default="libx264",
+                        help="comma separated, e.g. libx264,h264_v4l2m2m")
+    parser.add_argument("--modes", default=",".join(EXPORT_MODES),
+                        help=f"comma separated subset of {', '.join(EXPORT_MODES)}")
+    parser.add_argument("--buffer-dir", type=Path, default=None,
+                        help="reuse an existing segment buffer instead of generating one")
+    parser.add_argument("--keep-outputs", action="store_true")
+    parser.add_argument("--json", type=Path, default=None, help="write raw runs and summary to this file")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    work_dir = Path(tempfile.mkdtemp(prefix="birdhouse-bench-"))
+    try:
+        buffer_dir = args.buffer_dir
+        if buffer_dir is None:
+            buffer_dir = work_dir / "buffer"
+            logging.info("Generating synthetic 1080p25 segment buffer in %s", buffer_dir)
+            generate_segment_buffer(buffer_dir)
+
+        bench_runs = run_export_benchmark(
+            buffer_dir=buffer_dir,
+            output_dir=work_dir / "out",
+            encoders=[e.strip() for e in args.encoders.split(",") if e.strip()],
+            modes=[m.strip() for m in args.modes.split(",") if m.strip()],
+            iterations=args.iterations,
+            keep_outputs=args.keep_outputs,
+        )
+        bench_summary = summarize(bench_runs)
+
+        print(f"{'encoder':<16}{'mode':<12}{'runs':>5}{'wall med':>10}{'cpu med':>10}"
+              f"{'rss MB':>9}{'still B':>11}{'motion B':>12}")
+        for row in bench_summary:
+            print(f"{row['encoder']:<16}{row['mode']:<12}{row['runs']:>5}{row['wall_s_median']:>10.2f}"
+                  f"{row['cpu_s_median']:>10.2f}{row['peak_rss_mb']:>9.1f}"
+                  f"{row['still_bytes_median']:>11.0f}{row['motion_bytes_median']:>12.0f}")
+
+        if args.json is not None:
+            args.json.write_text(json.dumps({
+                "runs": [asdict(run) for run in bench_runs],
+                "summary": bench_summary,
+            }, indent=2))
+    finally:
+        if args.keep_outputs:
+            print(f"Outputs kept in {work_dir}")
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
@@ -1,4 +1,8 @@
+import logging
+import threading
 import time
+from typing import Callable
+
 import RPi.GPIO as GPIO
 
 from ignore_motion import ignore_motion_for
@@ -20,49 +24,137 @@ GPIO.output(IR_LED_PIN, GPIO.LOW)
 GPIO.output(IR_FILTER_A_PIN, GPIO.LOW)
 GPIO.output(IR_FILTER_B_PIN, GPIO.LOW)
 
-ir_led_state = False
-ir_filter_state = False
+IR_LED = "led"
+IR_FILTER = "filter"
+
+# subscriber(kind, state): kind is IR_LED or IR_FILTER, state is the new ON/OFF value
+IrStateListener = Callable[[str, bool], None]
+
+
+class IrController:
+    """
+    Owns the IR LED / IR filter state.
+
+    State reads return immediately. Every actual change is published to the subscribed listeners
+    (outside the lock, on the thread that made the change), and each OFF->ON transition of the LED
+    arms an auto-off timer so a forgotten LED cannot stay on all night.
+    """
+
+    def __init__(self, auto_off_seconds: float | None = 5 * 60):
+        self.auto_off_seconds = auto_off_seconds
+        self._lock = threading.Lock()
+        self._filter_lock = threading.Lock()
+        self._led_on = False
+        self._filter_on = False
+        self._listeners: list[IrStateListener] = []
+        self._auto_off_timer: threading.Timer | None = None
+
+    @property
+    def led_on(self) -> bool:
+        return self._led_on
+
+    @property
+    def filter_on(self) -> bool:
+        return self._filter_on
+
+    def subscribe(self, listener: IrStateListener) -> None:
+        with self._lock:
+            self._listeners.append(listener)
+
+    def unsubscribe(self, listener: IrStateListener) -> None:
+        with self._lock:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+
+    def _publish(self, kind: str, state: bool) -> None:
+        logging.info(f"IR {kind} state changed to {'ON' if state else 'OFF'}")
+        with self._lock:
+            listeners = list(self._listeners)
+        for listener in listeners:
+            try:
+                listener(kind, state)
+            except Exception:
+                logging.exception("IR state listener failed.")
+
+    def turn_led_on(self) -> None:
+        with self._lock:
+            GPIO.output(IR_LED_PIN, GPIO.HIGH)
+            changed = not self._led_on
+            self._led_on = True
+            if changed and self.auto_off_seconds is not None:
+                # Start a fresh auto-off timer on each OFF->ON transition.
+                self._auto_off_timer = threading.Timer(self.auto_off_seconds, self._auto_off)
+                self._auto_off_timer.daemon = True
+                self._auto_off_timer.start()
+        if changed:
+            self._publish(IR_LED, True)
+
+    def turn_led_off(self) -> None:
+        ignore_motion_for(10)
+        with self._lock:
+            GPIO.output(IR_LED_PIN, GPIO.LOW)
+            changed = self._led_on
+            self._led_on = False
+            self._cancel_auto_off_locked()
+        if changed:
+            self._publish(IR_LED, False)
+
+    def _cancel_auto_off_locked(self) -> None:
+        if self._auto_off_timer is not None:
+            self._auto_off_timer.cancel()
+            self._auto_off_timer = None
+
+    def _auto_off(self) -> None:
+        with self._lock:
+            # a timer that lost the race against turn_led_off/turn_led_on is stale
+            if self._auto_off_timer is not threading.current_thread():
+                return
+            self._auto_off_timer = None
+        logging.info("Turning IR LED off after %.0f s.", self.auto_off_seconds)
+        self.turn_led_off()
+
+    def _pulse_filter(self, on: bool) -> None:
+        # The filter is a latching actuator: pulse one coil for a second, then release both.
+        with self._filter_lock:
+            changed = self._filter_on != on
+            self._filter_on = on
+            GPIO.output(IR_FILTER_A_PIN, GPIO.HIGH if on else GPIO.LOW)
+            GPIO.output(IR_FILTER_B_PIN, GPIO.LOW if on else GPIO.HIGH)
+            time.sleep(1.0)
+            GPIO.output(IR_FILTER_A_PIN, GPIO.LOW)
+            GPIO.output(IR_FILTER_B_PIN, GPIO.LOW)
+        if changed:
+            self._publish(IR_FILTER, on)
+
+    def turn_filter_on(self) -> None:
+        self._pulse_filter(True)
+
+    def turn_filter_off(self) -> None:
+        self._pulse_filter(False)
+
+
+ir_controller = IrController()
 
 
 def turn_ir_on():
-    global ir_led_state
-    ir_led_state = True
-    GPIO.output(IR_LED_PIN, GPIO.HIGH)
+    ir_controller.turn_led_on()
 
 
 def turn_ir_off():
-    ignore_motion_for(10)
-    global ir_led_state
-    ir_led_state = False
-    GPIO.output(IR_LED_PIN, GPIO.LOW)
+    ir_controller.turn_led_off()
 
 
 def get_ir_led_state():
-    global ir_led_state
-    time.sleep(0.1)
-    return ir_led_state
+    return ir_controller.led_on
+
 
 def turn_ir_filter_on():
-    global ir_filter_state
-    ir_filter_state = True
-    GPIO.output(IR_FILTER_A_PIN, GPIO.HIGH)
-    GPIO.output(IR_FILTER_B_PIN, GPIO.LOW)
-    time.sleep(1.0)
-    GPIO.output(IR_FILTER_A_PIN, GPIO.LOW)
-    GPIO.output(IR_FILTER_B_PIN, GPIO.LOW)
+    ir_controller.turn_filter_on()
 
 
 def turn_ir_filter_off():
-    global ir_filter_state
-    ir_filter_state = False
-    GPIO.output(IR_FILTER_A_PIN, GPIO.LOW)
-    GPIO.output(IR_FILTER_B_PIN, GPIO.HIGH)
-    time.sleep(1.0)
-    GPIO.output(IR_FILTER_A_PIN, GPIO.LOW)
-    GPIO.output(IR_FILTER_B_PIN, GPIO.LOW)
+    ir_controller.turn_filter_off()
 
 
 def get_ir_filter_state():
-    global ir_filter_state
-    time.sleep(0.1)
-    return ir_filter_state
+    return ir_controller.filter_on
@@ -0,0 +1,172 @@
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+import heapq
+import itertools
+import logging
+import threading
+import time
+from typing import Callable, Optional
+
+# handler(argument, send_ack): argument is the text after "=" (or None), send_ack sends the reply
+CommandHandler = Callable[[Optional[str], Callable[[str], None]], None]
+
+
+@dataclass
+class CommandStats:
+    count: int = 0
+    errors: int = 0
+    timeouts: int = 0
+    total_ack_s: float = 0.0
+    max_ack_s: float = 0.0
+
+    def as_dict(self) -> dict:
+        acked = self.count - self.timeouts
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "avg_ack_ms": 1000.0 * self.total_ack_s / acked if acked > 0 else None,
+            "max_ack_ms": 1000.0 * self.max_ack_s,
+        }
+
+
+@dataclass
+class _RegisteredCommand:
+    name: str
+    handler: CommandHandler
+    blocking: bool
+    timeout_s: float
+    stats: CommandStats = field(default_factory=CommandStats)
+
+
+class _AckOnce:
+    """Forwards the first reply only, so a late handler cannot answer after its timeout error went out."""
+
+    def __init__(self, command: _RegisteredCommand, send_ack: Callable[[str], None], started_at: float,
+                 stats_lock: threading.Lock):
+        self._command = command
+        self._send_ack = send_ack
+        self._started_at = started_at
+        self._stats_lock = stats_lock
+        self._lock = threading.Lock()
+        self.done = False
+
+    def __call__(self, message: str) -> None:
+        with self._lock:
+            if self.done:
+                logging.debug("[CMD] dropping late reply for %s: %s", self._command.name, message.strip())
+                return
+            self.done = True
+        elapsed = time.monotonic() - self._started_at
+        with self._stats_lock:
+            self._command.stats.total_ack_s += elapsed
+            self._command.stats.max_ack_s = max(self._command.stats.max_ack_s, elapsed)
+        self._send_ack(message)
+
+    def expire(self) -> None:
+        with self._lock:
+            if self.done:
+                return
+            self.done = True
+        with self._stats_lock:
+            self._command.stats.timeouts += 1
+        logging.warning("[CMD] %s did not reply within %.1fs", self._command.name, self._command.timeout_s)
+        self._send_ack(f"[ERR] command timed out: {self._command.name}\n")
+
+
+class CommandDispatcher:
+    """
+    Exact "[CMD] <name>[=<argument>]" parsing with O(1) handler lookup.
+
+    Non-blocking handlers run inline on the calling thread (the fast path for ACK-only commands).
+    Blocking handlers run on a bounded worker pool; if one has not replied within its timeout the
+    client gets "[ERR] command timed out" and any later reply is dropped.
+    """
+
+    def __init__(self, *, max_workers: int = 4, default_timeout_s: float = 8.0):
+        # default_timeout_s stays below the TCP server's 10 s ACK wait so the error reaches the client
+        self.default_timeout_s = default_timeout_s
+        self._commands: dict[str, _RegisteredCommand] = {}
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="cmd_worker")
+        self._stats_lock = threading.Lock()
+
+        self._deadlines: list[tuple[float, int, _AckOnce]] = []
+        self._deadline_counter = itertools.count()
+        self._deadline_cond = threading.Condition()
+        self._watchdog_thread = threading.Thread(target=self._watchdog, name="cmd_watchdog", daemon=True)
+        self._watchdog_thread.start()
+
+    def register(self, name: str, handler: CommandHandler, *, blocking: bool = False,
+                 timeout_s: float | None = None) -> None:
+        if name in self._commands:
+            raise ValueError(f"Command {name!r} is already registered")
+        self._commands[name] = _RegisteredCommand(
+            name=name,
+            handler=handler,
+            blocking=blocking,
+            timeout_s=self.default_timeout_s if timeout_s is None else timeout_s,
+        )
+
+    @staticmethod
+    def parse(cmd_string: str) -> tuple[str | None, str | None]:
+        text = cmd_string.strip()
+        if not text.startswith("[CMD]"):
+            return None, None
+        text = text[len("[CMD]"):].strip()
+        name, sep, argument = text.partition("=")
+        return name.strip(), argument.strip() if sep else None
+
+    def dispatch(self, cmd_string: str, send_ack: Callable[[str], None]) -> None:
+        name, argument = self.parse(cmd_string)
+        command = self._commands.get(name) if name is not None else None
+        if command is None:
+            logging.info("[CMD] unknown command: %s", cmd_string.strip())
+            send_ack(f"[ERR] unknown command {name or cmd_string.strip()}\n")
+            return
+
+        with self._stats_lock:
+            command.stats.count += 1
+        reply = _AckOnce(command, send_ack, time.monotonic(), self._stats_lock)
+
+        if not command.blocking:
+            self._run(command, argument, reply)
+            return
+
+        with self._deadline_cond:
+            heapq.heappush(
+                self._deadlines,
+                (time.monotonic() + command.timeout_s, next(self._deadline_counter), reply),
+            )
+            self._deadline_cond.notify()
+        self._executor.submit(self._run, command, argument, reply)
+
+    def _run(self, command: _RegisteredCommand, argument: str | None, reply: _AckOnce) -> None:
+        try:
+            command.handler(argument, reply)
+        except Exception:
+            logging.exception("[CMD] handler for %s failed", command.name)
+            with self._stats_lock:
+                command.stats.errors += 1
+            reply(f"[ERR] {command.name} failed\n")
+
+    def _watchdog(self) -> None:
+        while True:
+            with self._deadline_cond:
+                while not self._deadlines:
+                    self._deadline_cond.wait()
+                deadline, _, reply = self._deadlines[0]
+                remaining = deadline - time.monotonic()
+                if remaining > 0:
+                    self._deadline_cond.wait(remaining)
+                    continue
+                heapq.heappop(self._deadlines)
+            reply.expire()
+
+    def stats(self) -> dict[str, dict]:
+        with self._stats_lock:
+            return {name: command.stats.as_dict() for name, command in self._commands.items()}
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
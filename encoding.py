@@ -1,9 +1,13 @@
 import base64
+import functools
+
 from dotenv import dotenv_values
 
-env_values = dotenv_values(".env")
 
-custom_key = env_values['ENCODING']
+@functools.lru_cache(maxsize=None)
+def _custom_key():
+    """The ENCODING key from .env, read on first use instead of at import time."""
+    return dotenv_values(".env")['ENCODING']
 
 
 def xor_encrypt_decrypt(data, key):
@@ -12,15 +16,29 @@ def xor_encrypt_decrypt(data, key):
     return ''.join(chr(ord(data[i]) ^ ord(key[i % key_length])) for i in range(len(data)))
 
 
-def encode_email(email):
+def xor_bytes(data: bytes, key: bytes) -> bytes:
+    """Same as xor_encrypt_decrypt for single-byte characters, as one big-integer XOR."""
+    if not data:
+        return b""
+    keystream = (key * (len(data) // len(key) + 1))[:len(data)]
+    return (int.from_bytes(data, "big") ^ int.from_bytes(keystream, "big")).to_bytes(len(data), "big")
+
+
+def encode_email(email, key=None):
     """Encodes (hashes) the email."""
-    xor_result = xor_encrypt_decrypt(email, custom_key)
-    encoded = base64.urlsafe_b64encode(xor_result.encode()).decode()
-    return encoded
+    key = key or _custom_key()
+    if email.isascii() and key.isascii():
+        # ASCII XOR ASCII stays ASCII, so UTF-8 encoding before or after the XOR is the same
+        xor_result = xor_bytes(email.encode(), key.encode())
+    else:
+        xor_result = xor_encrypt_decrypt(email, key).encode()
+    return base64.urlsafe_b64encode(xor_result).decode()
 
 
-def decode_email(encoded_email):
+def decode_email(encoded_email, key=None):
     """Decodes (unhashes) the email."""
+    key = key or _custom_key()
     decoded_bytes = base64.urlsafe_b64decode(encoded_email)
-    original_email = xor_encrypt_decrypt(decoded_bytes.decode(), custom_key)
-    return original_email
+    if decoded_bytes.isascii() and key.isascii():
+        return xor_bytes(decoded_bytes, key.encode()).decode()
+    return xor_encrypt_decrypt(decoded_bytes.decode(), key)
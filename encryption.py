@@ -1,4 +1,5 @@
 import base64
+import threading
 import time
 
 from Crypto.Cipher import AES
@@ -10,31 +11,68 @@ pad = lambda s: s + (BS - len(s) % BS) * chr(BS - len(s) % BS)
 unpad = lambda s: s[:-ord(s[len(s) - 1:])]
 
 
+class NonceStore:
+    """
+    Replay cache for (timestamp, iv) nonces, bucketed by timestamp second.
+
+    Only timestamps within +/- window_seconds of now are ever accepted, so a ring of
+    2 * window_seconds + 3 per-second sets is enough: two accepted timestamps can never share
+    a slot, and a slot still holding an older second is simply expired and reused. Both expiry
+    and lookup are O(1) regardless of traffic.
+    """
+
+    def __init__(self, window_seconds):
+        self.window_seconds = int(window_seconds)
+        self._size = 2 * self.window_seconds + 3
+        self._bucket_seconds = [None] * self._size
+        self._buckets = [set() for _ in range(self._size)]
+        self._lock = threading.Lock()
+
+    def _bucket_locked(self, timestamp):
+        slot = timestamp % self._size
+        if self._bucket_seconds[slot] != timestamp:
+            # slot belongs to an expired second: drop the whole bucket
+            self._bucket_seconds[slot] = timestamp
+            self._buckets[slot] = set()
+        return self._buckets[slot]
+
+    def contains(self, timestamp, iv):
+        with self._lock:
+            slot = timestamp % self._size
+            return self._bucket_seconds[slot] == timestamp and iv in self._buckets[slot]
+
+    def add_if_unused(self, timestamp, iv):
+        """Record the nonce and return True, or return False if it was already used."""
+        with self._lock:
+            bucket = self._bucket_locked(timestamp)
+            if iv in bucket:
+                return False
+            bucket.add(iv)
+            return True
+
+
 class Cipher:
 
     def __init__(self, key_file, nonce_expiration_seconds=30):
         env_values = dotenv_values(key_file)
         self.key = env_values["TCP_ENCRYPTION_KEY"]
-        self.nonce_set = set()
         self.nonce_expiration_seconds = nonce_expiration_seconds
+        self.nonce_store = NonceStore(nonce_expiration_seconds)
+        # encoded once; a CBC object is bound to one IV, so one is created per message
+        self._key_bytes = self.key.encode("utf8")
+        self._random = Random.new()
 
     def encrypt_message(self, message):
         message = pad(message)
-        iv = Random.new().read(AES.block_size - 8)
+        iv = self._random.read(AES.block_size - 8)
         timestamp = int(time.time()).to_bytes(8, byteorder="little")
-        enc = AES.new(self.key.encode("utf8"), AES.MODE_CBC, timestamp + iv)
-        return base64.b64encode(timestamp + iv + enc.encrypt(message.encode("utf8")))
-
-    def cleanup_expired_nonces(self):
-        # Remove expired nonces from the set
-        expired_nonces = {(timestamp, iv) for (timestamp, iv) in self.nonce_set if
-                          int.from_bytes(timestamp, byteorder="little") < time.time() - self.nonce_expiration_seconds}
-        self.nonce_set -= expired_nonces
+        cipher = AES.new(self._key_bytes, AES.MODE_CBC, timestamp + iv)
+        return base64.b64encode(timestamp + iv + cipher.encrypt(message.encode("utf8")))
 
     def is_nonce_used(self, timestamp_nonce):
         # Check if the nonce has been used before
-        self.cleanup_expired_nonces()  # Ensure cleanup before checking
-        return timestamp_nonce in self.nonce_set
+        timestamp, iv = timestamp_nonce
+        return self.nonce_store.contains(int.from_bytes(timestamp, byteorder="little"), iv)
 
     def decrypt_message(self, ciphertext):
         ciphertext = base64.b64decode(ciphertext)
@@ -44,12 +82,14 @@ class Cipher:
         if (timestamp_int < time.time() - self.nonce_expiration_seconds or
                 timestamp_int > time.time() + self.nonce_expiration_seconds):
             raise Exception("Expired timestamp")
-        if self.is_nonce_used((timestamp, iv)):
+        # check and record in one step so two threads cannot both accept the same nonce
+        if not self.nonce_store.add_if_unused(timestamp_int, iv):
             raise Exception("Replay Attack detected")
-        self.nonce_set.add((timestamp, iv))
         message = ciphertext[AES.block_size:]
-        dec = AES.new(self.key.encode("utf8"), AES.MODE_CBC, timestamp + iv)
-        decrypted_message = unpad(dec.decrypt(message)).decode("utf-8")
+        if not message or len(message) % BS:
+            raise ValueError("Ciphertext is not a whole number of blocks")
+        cipher = AES.new(self._key_bytes, AES.MODE_CBC, timestamp + iv)
+        decrypted_message = unpad(cipher.decrypt(message)).decode("utf-8")
         return decrypted_message
 
 
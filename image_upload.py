@@ -1,13 +1,180 @@
+import collections
+import hashlib
+import threading
+import time
+import uuid
+from concurrent.futures import Executor
+
 import requests
 from dotenv import dotenv_values
 from pathlib import Path
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 
 class UploadImageError(RuntimeError):
     pass
 
 
-def upload_image(image_path, token, url, extra_data=None, content_type="application/octet-stream"):
+_SESSION: requests.Session | None = None
+_SESSION_LOCK = threading.Lock()
+
+
+def get_upload_session() -> requests.Session:
+    """Shared keep-alive session so uploads reuse TCP/TLS connections to the server."""
+    global _SESSION
+    with _SESSION_LOCK:
+        if _SESSION is None:
+            # Only retry failures where the request never reached the server (connect errors) or
+            # was rejected by a proxy in front of it; a read timeout may mean the upload landed.
+            retry = Retry(
+                total=3,
+                connect=3,
+                read=0,
+                status=2,
+                backoff_factor=0.5,
+                status_forcelist=(502, 503, 504),
+                allowed_methods=frozenset({"GET", "POST", "PUT"}),
+                raise_on_status=False,
+            )
+            adapter = HTTPAdapter(pool_connections=2, pool_maxsize=4, max_retries=retry)
+            session = requests.Session()
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _SESSION = session
+        return _SESSION
+
+
+class TokenBucket:
+    """Blocking token bucket shared by all uploads so their combined rate stays below ``rate_bytes_per_s``."""
+
+    def __init__(self, rate_bytes_per_s: float, burst_bytes: int = 256 * 1024):
+        self.rate_bytes_per_s = float(rate_bytes_per_s)
+        self.burst_bytes = burst_bytes
+        self._tokens = float(burst_bytes)
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def set_rate(self, rate_bytes_per_s: float) -> None:
+        with self._lock:
+            self._refill_locked()
+            self.rate_bytes_per_s = float(rate_bytes_per_s)
+
+    def _refill_locked(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.burst_bytes, self._tokens + (now - self._last_refill) * self.rate_bytes_per_s)
+        self._last_refill = now
+
+    def consume(self, num_bytes: int) -> None:
+        # Chunks larger than the burst size are allowed to drive the bucket negative,
+        # which simply delays the next chunk accordingly.
+        with self._lock:
+            self._refill_locked()
+            self._tokens -= num_bytes
+            deficit = -self._tokens
+            rate = self.rate_bytes_per_s
+        if deficit > 0:
+            time.sleep(deficit / rate)
+
+
+class AdaptiveUploadLimiter(TokenBucket):
+    """
+    Token bucket whose rate follows the uplink usage measured by ``SystemMonitoring``.
+
+    ``uploaded_bytes_per_s`` includes our own uploads, so the limiter subtracts what it
+    sent itself over the same window to estimate the other traffic (mostly the RTSP
+    stream). Uploads get what is left after reserving at least ``stream_bytes_per_s``
+    for the stream and keeping ``headroom_ratio`` of the uplink free for keyframe bursts.
+    """
+
+    def __init__(
+        self,
+        system_monitoring,
+        *,
+        uplink_bytes_per_s: float,
+        stream_bytes_per_s: float = 18_000_000 / 8,
+        headroom_ratio: float = 0.15,
+        min_bytes_per_s: float = 64 * 1024,
+        measurement_window_s: float = 10.0,
+    ):
+        self.system_monitoring = system_monitoring
+        self.uplink_bytes_per_s = uplink_bytes_per_s
+        self.stream_bytes_per_s = stream_bytes_per_s
+        self.headroom_ratio = headroom_ratio
+        self.min_bytes_per_s = min_bytes_per_s
+        self.measurement_window_s = measurement_window_s
+        self._sent = collections.deque()
+        self._sent_lock = threading.Lock()
+        self._last_update = 0.0
+        super().__init__(self._target_rate(own_rate=0.0))
+
+    def _target_rate(self, own_rate: float) -> float:
+        measured = getattr(self.system_monitoring, "uploaded_bytes_per_s", None)
+        other_traffic = self.stream_bytes_per_s
+        if measured is not None:
+            other_traffic = max(other_traffic, measured - own_rate)
+        available = self.uplink_bytes_per_s * (1.0 - self.headroom_ratio) - other_traffic
+        return max(self.min_bytes_per_s, available)
+
+    def consume(self, num_bytes: int) -> None:
+        now = time.monotonic()
+        with self._sent_lock:
+            self._sent.append((now, num_bytes))
+            while self._sent and self._sent[0][0] < now - self.measurement_window_s:
+                self._sent.popleft()
+            update_due = now - self._last_update >= 1.0
+            if update_due:
+                self._last_update = now
+                own_rate = sum(n for _, n in self._sent) / self.measurement_window_s
+        if update_due:
+            self.set_rate(self._target_rate(own_rate))
+        super().consume(num_bytes)
+
+
+class _ThrottledMultipartBody:
+    """
+    multipart/form-data body streamed from disk in chunks through a rate limiter.
+
+    It has a length so requests sends a Content-Length instead of chunked encoding,
+    and iterating it again restarts from the beginning so connection retries work.
+    """
+
+    def __init__(self, path: Path, fields: dict, filename: str, content_type: str, rate_limiter,
+                 chunk_size: int = 64 * 1024):
+        self.path = path
+        self.rate_limiter = rate_limiter
+        self.chunk_size = chunk_size
+        boundary = uuid.uuid4().hex
+        self.content_type = f"multipart/form-data; boundary={boundary}"
+        head = b"".join(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode()
+            for name, value in fields.items()
+        )
+        head += (
+            f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+            f"Content-Type: {content_type}\r\n\r\n"
+        ).encode()
+        self._head = head
+        self._tail = f"\r\n--{boundary}--\r\n".encode()
+        self._length = len(head) + path.stat().st_size + len(self._tail)
+
+    def __len__(self):
+        return self._length
+
+    def __iter__(self):
+        yield self._head
+        with self.path.open("rb") as f:
+            while True:
+                chunk = f.read(self.chunk_size)
+                if not chunk:
+                    break
+                self.rate_limiter.consume(len(chunk))
+                yield chunk
+        yield self._tail
+
+
+def upload_image(image_path, token, url, extra_data=None, content_type="application/octet-stream",
+                 session=None, rate_limiter=None):
     """
     Upload a file as multipart/form-data with fields:
       - file (file upload)
@@ -21,13 +188,18 @@ def upload_image(image_path, token, url, extra_data=None, content_type="applicat
     filename = image_path.name
     file_size = image_path.stat().st_size
 
-    with image_path.open("rb") as f:
-        files = {"file": (filename, f, content_type)}
-        data = {"filename": filename, "auth_token": token}
-        if extra_data:
-            data.update(extra_data)
+    data = {"filename": filename, "auth_token": token}
+    if extra_data:
+        data.update(extra_data)
+    session = session or get_upload_session()
 
-        resp = requests.post(url, files=files, data=data, timeout=30)
+    if rate_limiter is not None:
+        body = _ThrottledMultipartBody(image_path, data, filename, content_type, rate_limiter)
+        resp = session.post(url, data=body, headers={"Content-Type": body.content_type}, timeout=30)
+    else:
+        with image_path.open("rb") as f:
+            files = {"file": (filename, f, content_type)}
+            resp = session.post(url, files=files, data=data, timeout=30)
 
     if resp.status_code == 200:
         print("✓ HTTP 200")
@@ -46,7 +218,120 @@ def upload_image(image_path, token, url, extra_data=None, content_type="applicat
     return resp
 
 
-def upload_live_photo(live_photo_result, token, url):
+def _file_sha256(path: Path, chunk_size: int = 1024 * 1024) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as f:
+        while True:
+            block = f.read(chunk_size)
+            if not block:
+                break
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _committed_offset(resp) -> int:
+    try:
+        return int(resp.json().get("offset", 0))
+    except (ValueError, AttributeError):
+        raise UploadImageError(f"Malformed chunked upload response: HTTP {resp.status_code} {resp.text}")
+
+
+def upload_image_resumable(image_path, token, url, extra_data=None, content_type="application/octet-stream",
+                           session=None, rate_limiter=None, chunk_size=1024 * 1024, max_attempts=6):
+    """
+    Upload a file in fixed-size chunks that survive network blips.
+
+    Protocol, relative to ``{url}/chunked/{upload_id}`` where upload_id is the SHA-256 of the file:
+      - GET                  -> {"offset": n}, bytes the server has committed so far
+      - PUT (chunk body)     -> {"offset": n}; headers Content-Range and X-Chunk-SHA256,
+                                409 with {"offset": n} if the start does not match the committed offset
+      - POST .../complete    -> form fields filename, auth_token, sha256, content_type and extra_data;
+                                the server verifies the whole file hash and then handles it like upload_image
+    Every request carries the token in X-Upload-Token. After a failure the client asks for the
+    committed offset again and resumes from there instead of starting over.
+    """
+    image_path = Path(image_path)
+    if not image_path.exists():
+        raise FileNotFoundError(f"{image_path} not found")
+
+    filename = image_path.name
+    file_size = image_path.stat().st_size
+    sha256 = _file_sha256(image_path)
+    chunk_url = f"{url.rstrip('/')}/chunked/{sha256}"
+    headers = {"X-Upload-Token": token}
+    session = session or get_upload_session()
+
+    attempt = 0
+    offset = None
+    with image_path.open("rb") as f:
+        while True:
+            try:
+                if offset is None:
+                    resp = session.get(chunk_url, headers=headers, timeout=10)
+                    if resp.status_code != 200:
+                        raise UploadImageError(
+                            f"Chunked upload status failed for {filename}: HTTP {resp.status_code} {resp.text}"
+                        )
+                    offset = _committed_offset(resp)
+                if offset >= file_size:
+                    break
+
+                f.seek(offset)
+                chunk = f.read(chunk_size)
+                if rate_limiter is not None:
+                    rate_limiter.consume(len(chunk))
+                end = offset + len(chunk) - 1
+                resp = session.put(
+                    chunk_url,
+                    data=chunk,
+                    headers={
+                        **headers,
+                        "Content-Type": "application/octet-stream",
+                        "Content-Range": f"bytes {offset}-{end}/{file_size}",
+                        "X-Chunk-SHA256": hashlib.sha256(chunk).hexdigest(),
+                    },
+                    timeout=30,
+                )
+                if resp.status_code == 409:
+                    # The server committed a different amount than we thought; continue from there.
+                    offset = _committed_offset(resp)
+                    continue
+                if resp.status_code != 200:
+                    raise UploadImageError(
+                        f"Chunk {offset}-{end} of {filename} failed: HTTP {resp.status_code} {resp.text}"
+                    )
+                offset = _committed_offset(resp)
+                attempt = 0
+            except requests.RequestException as e:
+                attempt += 1
+                if attempt >= max_attempts:
+                    raise UploadImageError(f"Chunked upload of {filename} gave up at offset {offset}: {e}")
+                print(f"chunked upload of {filename} interrupted ({e}), resuming")
+                # Ask the server what it actually committed before sending anything else.
+                offset = None
+                time.sleep(min(30.0, 0.5 * 2 ** attempt))
+
+    data = {"filename": filename, "auth_token": token, "sha256": sha256, "content_type": content_type}
+    if extra_data:
+        data.update(extra_data)
+    resp = session.post(f"{chunk_url}/complete", data=data, headers=headers, timeout=30)
+    if resp.status_code != 200:
+        print(f"upload failed for {image_path} ({file_size} bytes, {content_type})")
+        print(f"✗ HTTP {resp.status_code}: {resp.text}")
+        raise UploadImageError(
+            f"Chunked upload failed for {filename} ({file_size} bytes, {content_type}): "
+            f"HTTP {resp.status_code} {resp.text}"
+        )
+    print("✓ HTTP 200 (chunked)")
+    return resp
+
+
+def upload_live_photo(live_photo_result, token, url, rate_limiter=None, chunked=False,
+                      part_executor: Executor | None = None):
+    """
+    Upload both parts of a Live Photo bundle. With ``part_executor`` the motion clip goes out on it while
+    the still is sent from the calling thread; without one the parts are sent one after the other.
+    """
     still_path = live_photo_result.still_path
     motion_path = live_photo_result.motion_path
 
@@ -54,34 +339,58 @@ def upload_live_photo(live_photo_result, token, url):
         raise ValueError("Live photo bundle is incomplete")
 
     bundle_id = live_photo_result.bundle_id
-    still_response = upload_image(
-        image_path=still_path,
-        token=token,
-        url=url,
-        extra_data={
-            "bundle_id": bundle_id,
-            "asset_id": live_photo_result.asset_id,
-            "asset_kind": "live_photo_still",
-            "apple_metadata_ready": str(live_photo_result.apple_metadata_ready).lower(),
-        },
-        content_type="image/jpeg",
-    )
-    print(f"uploaded live photo still {still_path} ({bundle_id})")
-    motion_response = upload_image(
+    common_data = {
+        "bundle_id": bundle_id,
+        "asset_id": live_photo_result.asset_id,
+        "apple_metadata_ready": str(live_photo_result.apple_metadata_ready).lower(),
+    }
+    session = get_upload_session()
+
+    # The motion clip is the large part, so that is the one worth making resumable.
+    motion_kwargs = dict(
         image_path=motion_path,
         token=token,
         url=url,
-        extra_data={
-            "bundle_id": bundle_id,
-            "asset_id": live_photo_result.asset_id,
-            "asset_kind": "live_photo_motion",
-            "apple_metadata_ready": str(live_photo_result.apple_metadata_ready).lower(),
-        },
+        extra_data={**common_data, "asset_kind": "live_photo_motion"},
         content_type="application/octet-stream",
+        session=session,
+        rate_limiter=rate_limiter,
     )
+    upload_motion = upload_image_resumable if chunked else upload_image
+    # The executor is the caller's (UploadOutbox sizes one per outbox), so concurrent bundles never
+    # queue behind each other for a shared part slot.
+    motion_future = part_executor.submit(upload_motion, **motion_kwargs) if part_executor is not None else None
+
+    still_error = None
+    try:
+        still_response = upload_image(
+            image_path=still_path,
+            token=token,
+            url=url,
+            extra_data={**common_data, "asset_kind": "live_photo_still"},
+            content_type="image/jpeg",
+            session=session,
+            rate_limiter=rate_limiter,
+        )
+    except Exception as e:
+        if motion_future is None:
+            raise
+        still_error = e
+    if motion_future is not None:
+        # Wait for the motion part before raising so a failing still never leaves it running.
+        motion_error = motion_future.exception()
+        if still_error is not None:
+            raise still_error
+        if motion_error is not None:
+            raise motion_error
+        motion_response = motion_future.result()
+    else:
+        motion_response = upload_motion(**motion_kwargs)
+    print(f"uploaded live photo still {still_path} ({bundle_id})")
     print(f"uploaded live photo motion {motion_path} ({bundle_id})")
     return still_response, motion_response
 
+
 if __name__ == "__main__":
     env = dotenv_values(".env")
     upload_image_token = env.get("UPLOAD_IMAGE_TOKEN")
@@ -12,16 +12,21 @@ from sensirion_i2c_driver import LinuxI2cTransceiver, I2cConnection, CrcCalculat
 from sensirion_driver_adapters.i2c_adapter.i2c_channel import I2cChannel
 from sensirion_i2c_sht4x.device import Sht4xDevice
 
-import csv
 import datetime
 import threading
 
-from image_upload import UploadImageError, upload_live_photo
+from api_server import EventStream, run_api_server
+from command_dispatcher import CommandDispatcher
+from image_upload import AdaptiveUploadLimiter
 from persistent_rtsp import PersistentRtspRecorder
-from radar import Radar
+from radar import Radar, RadarFrameRecorder
 from time_utils import bern_image_timestamp
+from upload_outbox import UploadOutbox
+from subscribers import SubscriberStore
 from system_monitor import SystemMonitoring
-from camera import turn_ir_on, turn_ir_off, get_ir_led_state, turn_ir_filter_on, turn_ir_filter_off, get_ir_filter_state
+from telemetry import TelemetryHub
+from camera import (IR_LED, ir_controller, turn_ir_on, turn_ir_off, get_ir_led_state, turn_ir_filter_on,
+                    turn_ir_filter_off, get_ir_filter_state)
 
 from dotenv import dotenv_values
 import psycopg
@@ -39,6 +44,12 @@ import joblib
 
 class VoegeliMonitor:
     _TSL2561_CLIP_THRESHOLD = (4900, 37000, 65000)
+    SENSOR_TELEMETRY_FIELDS = (
+        'cpu_perc', 'cpu_temp', 'memory_perc', 'disk_perc', 'uploaded_bytes_per_s', 'downloaded_bytes_per_s',
+        'outside_temperature', 'outside_humidity', 'inside_temperature', 'inside_humidity',
+        'inside_co2', 'inside_co2_temperature', 'inside_co2_humidity_f',
+        'luminosity', 'broadband_luminosity', 'IR_luminosity', 'probability',
+    )
 
     def __init__(self, env_file: Path = Path('./.env')):
 
@@ -60,6 +71,26 @@ class VoegeliMonitor:
         )
         self.rtsp_recorder.start()
 
+        self.system_monitoring = SystemMonitoring()
+        self.sys_monitoring_thread = threading.Thread(target=self.system_monitoring.monitor_system)
+        self.sys_monitoring_thread.daemon = True
+        self.sys_monitoring_thread.start()
+
+        # Shape uploads so they leave room on the uplink for the RTSP stream to MediaMTX.
+        self.upload_rate_limiter = AdaptiveUploadLimiter(
+            self.system_monitoring,
+            uplink_bytes_per_s=float(env_values.get("UPLOAD_UPLINK_MBIT") or 40.0) * 1e6 / 8,
+            stream_bytes_per_s=float(env_values.get("STREAM_BITRATE_MBIT") or 18.0) * 1e6 / 8,
+        )
+        self.upload_outbox = UploadOutbox(
+            self.upload_image_token,
+            self.upload_image_url,
+            outbox_dir=env_values.get("UPLOAD_OUTBOX_DIR") or "gallery/outbox",
+            rate_limiter=self.upload_rate_limiter,
+            chunked=str(env_values.get("UPLOAD_CHUNKED") or "").strip().lower() in {"1", "true", "yes", "on"},
+        )
+        self.upload_outbox.start()
+
         # I2C sensor setup
         i2c = board.I2C()
 
@@ -82,40 +113,75 @@ class VoegeliMonitor:
         # Luminosity sensor
         self.luminosity_sensor = adafruit_tsl2561.TSL2561(i2c)
 
+        # Live values for TCP clients that sent "[CMD] SUBSCRIBE ..."
+        self.telemetry = TelemetryHub()
+        self.telemetry.register_fields(self.SENSOR_TELEMETRY_FIELDS)
+
         # motion sensor (A121 radar 60 GHz)
-        self.radar = Radar(recorder=self.rtsp_recorder)
+        # Optional raw frame recording for tuning the presence/motion thresholds offline
+        radar_frame_recorder = None
+        if env_values.get("RADAR_RECORD_DIR"):
+            radar_frame_recorder = RadarFrameRecorder(
+                env_values["RADAR_RECORD_DIR"],
+                max_bytes=int(float(env_values.get("RADAR_RECORD_MAX_MB") or 2048) * 1024 ** 2),
+            )
+        # newsletter subscribers, shared with the radar's motion alerts
+        self.subscribers = SubscriberStore(env_values.get("SUBSCRIBER_DB") or "newsletter_subscribers.sqlite3")
+
+        self.radar = Radar(recorder=self.rtsp_recorder, outbox=self.upload_outbox, telemetry=self.telemetry,
+                           frame_recorder=radar_frame_recorder, subscribers=self.subscribers,
+                           adaptive=(env_values.get("RADAR_ADAPTIVE") or "").lower() in ("1", "true", "yes"),
+                           sensor_ids=[int(sid) for sid in (env_values.get("RADAR_SENSOR_IDS") or "1").split(",")])
         self.radar.run()
 
         # self.audio_stream_thread = threading.Thread(target=run_audiostream)
         # self.audio_stream_thread.daemon = True
         # self.audio_stream_thread.start()
 
-        self.system_monitoring = SystemMonitoring()
-        self.sys_monitoring_thread = threading.Thread(target=self.system_monitoring.monitor_system)
-        self.sys_monitoring_thread.daemon = True
-        self.sys_monitoring_thread.start()
-
         # Start data logger thread
         data_thread = threading.Thread(target=self.periodic_data_logger, daemon=True)
         data_thread.start()
 
+        # single slot for the IR filter: at most one pool worker drives the H-bridge at a time
+        self._ir_filter_slot = threading.Lock()
+        self.command_dispatcher = CommandDispatcher()
+        self.register_commands(self.command_dispatcher)
+
         self.tcp_cmd_queue = queue.Queue()
         self.tcp_cmd_ack_queue = queue.Queue()
         self.tcp_rep_queue = queue.Queue()
+        self.api_events = EventStream()
+        ir_controller.subscribe(self._on_ir_state_changed)
 
         self.tcp_server = run_server(self.tcp_cmd_queue, self.tcp_cmd_ack_queue, self.tcp_rep_queue,
                                      env_file,
                                      self.task_is_running,
                                      False,
                                      port=65432,
-                                     ip="0.0.0.0")
+                                     ip="0.0.0.0",
+                                     slow_client_policy=env_values.get("TCP_SLOW_CLIENT_POLICY") or "coalesce",
+                                     telemetry=self.telemetry)
+
+        # HTTP/WebSocket API sharing the command dispatcher; only started when a token is configured.
+        self.api_server = None
+        if env_values.get("API_TOKEN"):
+            self.api_server = run_api_server(self.command_dispatcher, self.api_events, self.status,
+                                             env_values["API_TOKEN"],
+                                             port=int(env_values.get("API_PORT") or 8000))
 
     def shutdown(self):
         try:
             self.sht4x_outside_transceiver.close()
         except Exception:
             pass
+        # stops acquisition and closes the frame recorder, which finalises the last recording's sidecar
+        self.radar.stop()
         self.rtsp_recorder.stop()
+        self.upload_outbox.stop()
+        if self.api_server is not None:
+            self.api_server.shutdown()
+        self.command_dispatcher.shutdown()
+        self.subscribers.close()
         self.db_store.close()
 
     def send_tcp_ack(self, message: str, response_queue: queue.Queue | None = None):
@@ -128,27 +194,124 @@ class VoegeliMonitor:
 
     def send_tcp_rep(self, message: str):
         self.tcp_rep_queue.put(message)
+        self.api_events.publish(message)
         logging.info("[TCP] Sent REP: %s", message.strip())
 
+    def status(self) -> dict:
+        return {
+            "ir_led": get_ir_led_state(),
+            "ir_filter": get_ir_filter_state(),
+            "sensors": self.telemetry.snapshot(),
+            "upload_outbox_pending": self.upload_outbox.pending_count(),
+            "tcp_clients": len(self.tcp_server.connected_clients),
+            "api_event_clients": self.api_events.client_count,
+            "commands": self.command_dispatcher.stats(),
+            "radar": self.radar.mode_stats(),
+        }
+
+    def _on_ir_state_changed(self, kind: str, state: bool):
+        if kind == IR_LED:
+            self.send_tcp_rep("[REP] IR LED STATE: " + ("ON" if state else "OFF"))
+
     def save_and_upload_live_image(self, timestamp: str):
+        pin = self.rtsp_recorder.pin_segments(post_trigger_seconds=5.0)
         live_photo = self.rtsp_recorder.export_live_photo(
             timestamp=timestamp,
-            post_trigger_seconds=5.0,
             output_dir="gallery",
+            pinned=pin,
         )
         if live_photo.warning:
             logging.warning("Live image %s warning: %s", timestamp, live_photo.warning)
-        upload_live_photo(
-            live_photo_result=live_photo,
-            token=self.upload_image_token,
-            url=self.upload_image_url,
-        )
-        if live_photo.still_path is not None:
-            live_photo.still_path.unlink(missing_ok=True)
-        if live_photo.motion_path is not None:
-            live_photo.motion_path.unlink(missing_ok=True)
+        # The outbox owns the files from here on and deletes them once the upload is confirmed.
+        self.upload_outbox.enqueue(live_photo)
         return live_photo
 
+    def register_commands(self, dispatcher: CommandDispatcher):
+        # ACK-only commands stay on the fast path; anything doing file I/O or pulsing GPIO for a
+        # second runs on the dispatcher's worker pool so it cannot delay other clients' ACKs.
+        dispatcher.register("IR ON", self._cmd_ir_on)
+        dispatcher.register("IR OFF", self._cmd_ir_off)
+        dispatcher.register("GET IR STATE", self._cmd_get_ir_state)
+        dispatcher.register("IR FILTER ON", self._cmd_ir_filter_on, blocking=True, timeout_s=5.0)
+        dispatcher.register("IR FILTER OFF", self._cmd_ir_filter_off, blocking=True, timeout_s=5.0)
+        dispatcher.register("GET IR FILTER STATE", self._cmd_get_ir_filter_state)
+        dispatcher.register("add newsletter", self._cmd_add_newsletter, blocking=True)
+        dispatcher.register("remove newsletter", self._cmd_remove_newsletter, blocking=True)
+        dispatcher.register("save image", self._cmd_save_image)
+
+    def _cmd_ir_on(self, _argument, send_ack):
+        turn_ir_on()
+        send_ack("[ACK] IR ON executed")
+
+    def _cmd_ir_off(self, _argument, send_ack):
+        turn_ir_off()
+        send_ack("[ACK] IR OFF executed")
+
+    def _cmd_get_ir_state(self, _argument, send_ack):
+        ir_state = get_ir_led_state()
+        send_ack(f"[ACK] IR STATE is {'ON' if ir_state else 'OFF'}")
+
+    def _cmd_ir_filter_on(self, _argument, send_ack):
+        self._pulse_ir_filter(turn_ir_filter_on, "IR FILTER ON", send_ack)
+
+    def _cmd_ir_filter_off(self, _argument, send_ack):
+        self._pulse_ir_filter(turn_ir_filter_off, "IR FILTER OFF", send_ack)
+
+    def _pulse_ir_filter(self, pulse, name, send_ack):
+        # a second filter command while one is pulsing is refused instead of occupying another worker
+        if not self._ir_filter_slot.acquire(blocking=False):
+            send_ack(f"[ERR] {name} refused, IR filter is moving")
+            return
+        try:
+            pulse()
+        finally:
+            self._ir_filter_slot.release()
+        send_ack(f"[ACK] {name} executed")
+
+    def _cmd_get_ir_filter_state(self, _argument, send_ack):
+        ir_filter_state = get_ir_filter_state()
+        send_ack(f"[ACK] IR FILTER STATE is {'ON' if ir_filter_state else 'OFF'}")
+
+    def _cmd_add_newsletter(self, email, send_ack):
+        email = (email or "").strip()
+        if self.subscribers.add(email):
+            send_ack(f"[ACK] Email {email} added to newsletter")
+        else:
+            send_ack(f"[ACK] Email {email} already in newsletter")
+
+    def _cmd_remove_newsletter(self, email, send_ack):
+        email = (email or "").strip()
+        if self.subscribers.remove(email):
+            send_ack(f"[ACK] Email {email} removed from newsletter")
+        else:
+            send_ack(f"[ACK] Email {email} not in newsletter")
+
+    def _cmd_save_image(self, _argument, send_ack):
+        timestamp = bern_image_timestamp()
+        send_ack(f"[ACK] Live image capture started for {timestamp}")
+
+        def _background_save_image():
+            try:
+                live_photo = self.save_and_upload_live_image(timestamp)
+                if live_photo.warning:
+                    self.send_tcp_rep(
+                        f"[REP] Live image saved for {timestamp} with warning: {live_photo.warning}"
+                    )
+                else:
+                    self.send_tcp_rep(f"[REP] Live image saved for {timestamp}")
+            except subprocess.CalledProcessError as e:
+                logging.error(f"Failed to save image: {e.stderr}")
+                self.send_tcp_rep("[REP] Failed to save image: MediaMTX server error")
+            except subprocess.TimeoutExpired:
+                logging.error("Timed out while saving live image.")
+                self.send_tcp_rep("[REP] Failed to save image: timed out")
+            except Exception:
+                logging.exception("Failed to save and upload live image.")
+                self.send_tcp_rep("[REP] Failed to save image: unexpected error")
+
+        # The export waits for post-trigger footage, far longer than any ACK timeout.
+        threading.Thread(target=_background_save_image, daemon=True).start()
+
     # Function to read temperature and humidity
     def read_temperature_humidity(self, sensor, sensirion=False):
         if sensirion:
@@ -285,6 +448,9 @@ class VoegeliMonitor:
             }
         }
 
+        # Push to live subscribers first so a slow database does not delay them.
+        self.telemetry.publish(device_data['data'])
+
         try:
             self.write_device_data_to_db(device_data)
         except (psycopg.Error, ConnectionError, OSError) as e:
@@ -293,8 +459,6 @@ class VoegeliMonitor:
     # Background thread for temperature/humidity logging (runs every 60s)
     def periodic_data_logger(self):
         logging.info("Periodic data logger started.")
-        turn_off_ir_led = None
-        prev_ir_led_state = get_ir_led_state()
         while True:
             try:
                 inside_temperature, inside_humidity = self.read_temperature_humidity(self.sht_inside)
@@ -317,23 +481,6 @@ class VoegeliMonitor:
                                        broadband,
                                        infrared,
                                        motion_triggered=False)
-
-                ir_led_state = get_ir_led_state()
-
-                # Start a fresh auto-off timer on each OFF->ON transition.
-                if ir_led_state and not prev_ir_led_state:
-                    turn_off_ir_led = time.time() + 5 * 60
-
-                # Clear stale deadline when LED is already OFF.
-                if not ir_led_state:
-                    turn_off_ir_led = None
-
-                if turn_off_ir_led is not None and turn_off_ir_led < time.time() and ir_led_state:
-                    turn_off_ir_led = None
-                    self.send_tcp_rep("[REP] IR LED STATE: OFF")
-                    turn_ir_off()
-
-                prev_ir_led_state = ir_led_state
             except Exception:
                 logging.exception("Periodic data logger error.")
             time.sleep(10)
@@ -351,9 +498,6 @@ if __name__ == "__main__":
 
     voegeli_monitor = VoegeliMonitor()
 
-    old_ir_led_state = False
-    old_ir_filter_state = False
-
     while True:
         try:
             cmd_packet = voegeli_monitor.tcp_cmd_queue.get(timeout=0.1)
@@ -366,105 +510,9 @@ if __name__ == "__main__":
             logging.debug(f"[TCP] revived: {cmd}")
             cmd_string = cmd.decode("utf-8", errors="replace") if isinstance(cmd, bytes) else str(cmd)
 
-            def send_ack(message: str):
+            def send_ack(message: str, response_queue=response_queue):
                 voegeli_monitor.send_tcp_ack(message, response_queue=response_queue)
 
-            if "[CMD] IR ON" in cmd_string:
-                turn_ir_on()
-                send_ack("[ACK] IR ON executed")
-            elif "[CMD] IR OFF" in cmd_string:
-                turn_ir_off()
-                send_ack("[ACK] IR OFF executed")
-            elif "[CMD] GET IR STATE" in cmd_string:
-                ir_state = get_ir_led_state()
-                send_ack(f"[ACK] IR STATE is {'ON' if ir_state else 'OFF'}")
-            elif "[CMD] IR FILTER ON" in cmd_string:
-                turn_ir_filter_on()
-                send_ack("[ACK] IR FILTER ON executed")
-            elif "[CMD] IR FILTER OFF" in cmd_string:
-                turn_ir_filter_off()
-                send_ack("[ACK] IR FILTER OFF executed")
-            elif "[CMD] GET IR FILTER STATE" in cmd_string:
-                ir_filter_state = get_ir_filter_state()
-                send_ack(f"[ACK] IR FILTER STATE is {'ON' if ir_filter_state else 'OFF'}")
-
-            elif "[CMD] add newsletter=" in cmd_string:
-                email = cmd_string.split('=', 1)[1].strip()
-                csv_file = 'newsletter_subscribers.csv'
-                # Check if the email is already in the file
-                email_exists = False
-                try:
-                    with open(csv_file, mode='r') as file:
-                        reader = csv.reader(file)
-                        for row in reader:
-                            if row and row[0] == email:
-                                email_exists = True
-                                break
-                except FileNotFoundError:
-                    pass  # File does not exist yet
-
-                if not email_exists:
-                    with open(csv_file, mode='a', newline='') as file:
-                        writer = csv.writer(file)
-                        writer.writerow([email])
-                    send_ack(f"[ACK] Email {email} added to newsletter")
-                else:
-                    send_ack(f"[ACK] Email {email} already in newsletter")
-            elif "[CMD] remove newsletter=" in cmd_string:
-                email = cmd_string.split('=', 1)[1].strip()
-                csv_file = 'newsletter_subscribers.csv'
-                # Read all emails and filter out the one to remove
-                emails = []
-                try:
-                    with open(csv_file, mode='r') as file:
-                        reader = csv.reader(file)
-                        for row in reader:
-                            if row and row[0] != email:
-                                emails.append(row[0])
-                    # Write back the filtered list
-                    with open(csv_file, mode='w', newline='') as file:
-                        writer = csv.writer(file)
-                        for em in emails:
-                            writer.writerow([em])
-                    send_ack(f"[ACK] Email {email} removed from newsletter")
-                except FileNotFoundError:
-                    send_ack(f"[ACK] Newsletter file not found")
-            elif "[CMD] save image" in cmd_string:
-                timestamp = bern_image_timestamp()
-                send_ack(f"[ACK] Live image capture started for {timestamp}")
-
-                def _background_save_image():
-                    try:
-                        live_photo = voegeli_monitor.save_and_upload_live_image(timestamp)
-                        if live_photo.warning:
-                            voegeli_monitor.send_tcp_rep(
-                                f"[REP] Live image saved for {timestamp} with warning: {live_photo.warning}"
-                            )
-                        else:
-                            voegeli_monitor.send_tcp_rep(f"[REP] Live image saved for {timestamp}")
-                    except subprocess.CalledProcessError as e:
-                        logging.error(f"Failed to save image: {e.stderr}")
-                        voegeli_monitor.send_tcp_rep("[REP] Failed to save image: MediaMTX server error")
-                    except UploadImageError as e:
-                        logging.error("Failed to upload live image: %s", e)
-                        voegeli_monitor.send_tcp_rep("[REP] Failed to upload live image")
-                    except subprocess.TimeoutExpired:
-                        logging.error("Timed out while saving live image.")
-                        voegeli_monitor.send_tcp_rep("[REP] Failed to save image: timed out")
-                    except Exception:
-                        logging.exception("Failed to save and upload live image.")
-                        voegeli_monitor.send_tcp_rep("[REP] Failed to save image: unexpected error")
-
-                threading.Thread(target=_background_save_image, daemon=True).start()
+            voegeli_monitor.command_dispatcher.dispatch(cmd_string, send_ack)
         except queue.Empty:
             pass
-
-        if old_ir_led_state != get_ir_led_state():
-            logging.info(f"IR LED state changed to {'ON' if get_ir_led_state() else 'OFF'}")
-            voegeli_monitor.send_tcp_rep("[REP] IR LED STATE: " + ('ON' if get_ir_led_state() else 'OFF'))
-            old_ir_led_state = get_ir_led_state()
-
-        # if old_ir_filter_state != get_ir_filter_state():
-        #     logging.info(f"IR Filter state changed to {'ON' if get_ir_filter_state() else 'OFF'}")
-        # .   voegeli_monitor.tcp_rep_queue.put("[REP] IR FILTER STATE: " + ('ON' if get_ir_filter_state() else 'OFF'))
-        #     old_ir_filter_state = get_ir_filter_state()
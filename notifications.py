@@ -0,0 +1,334 @@
+from __future__ import annotations
+
+import json
+import logging
+import queue
+import smtplib
+import ssl
+import threading
+import time
+from dataclasses import dataclass, field
+from email.message import EmailMessage
+from email.utils import formatdate, make_msgid
+from pathlib import Path
+from typing import Callable, Iterable, Protocol
+
+# Motion alert e-mails.
+#
+# NotificationWorker delivers one message per subscriber over at most ``max_connections`` SMTP
+# sessions, each reused for many messages. The HTML body is rendered once per campaign; per
+# recipient only the unsubscribe link is put in. Progress is journaled per campaign (a header line
+# with the original recipients, then one line per address that reached a final state), so a
+# campaign cut short by a crash or restart picks up where it stopped and nobody gets a second copy.
+# An address that still fails after the retries is journaled as failed and not tried again; the
+# journal is deleted once every address has been dealt with. Journals older than
+# ``max_campaign_age_s`` (the 23 h alert throttle) are discarded instead of resumed.
+#
+# Without SMTP_HOST in .env, messages go out one at a time through unibe_mail's Reporter, as before.
+
+UNSUBSCRIBE_PLACEHOLDER = "{unsubscribe_link}"
+
+
+class Transport(Protocol):
+    def send(self, recipient: str, subject: str, html_body: str, unsubscribe_link: str) -> None: ...
+
+    def close(self) -> None: ...
+
+
+class SmtpTransport:
+    """One lazily opened SMTP session, reused until it fails or ``max_messages`` were sent on it."""
+
+    def __init__(self, host: str, port: int = 587, *, sender: str, username: str | None = None,
+                 password: str | None = None, security: str = "starttls", timeout_s: float = 30.0,
+                 max_messages: int = 100):
+        if security not in ("starttls", "ssl", "none"):
+            raise ValueError(f"unknown SMTP security {security!r}")
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.username = username
+        self.password = password
+        self.security = security
+        self.timeout_s = timeout_s
+        self.max_messages = max_messages
+        self._smtp: smtplib.SMTP | None = None
+        self._sent_on_connection = 0
+
+    def _connect(self) -> smtplib.SMTP:
+        if self.security == "ssl":
+            smtp = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout_s,
+                                    context=ssl.create_default_context())
+        else:
+            smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout_s)
+            if self.security == "starttls":
+                smtp.starttls(context=ssl.create_default_context())
+        if self.username:
+            smtp.login(self.username, self.password or "")
+        self._sent_on_connection = 0
+        return smtp
+
+    def send(self, recipient: str, subject: str, html_body: str, unsubscribe_link: str) -> None:
+        message = EmailMessage()
+        message["From"] = self.sender
+        message["To"] = recipient
+        message["Subject"] = subject
+        message["Date"] = formatdate(localtime=True)
+        message["Message-ID"] = make_msgid(domain=self.sender.rpartition("@")[2] or None)
+        message["List-Unsubscribe"] = f"<{unsubscribe_link}>"
+        message.set_content(html_body, subtype="html")
+
+        if self._smtp is None or self._sent_on_connection >= self.max_messages:
+            self.close()
+            self._smtp = self._connect()
+        try:
+            self._smtp.send_message(message)
+        except (smtplib.SMTPServerDisconnected, smtplib.SMTPResponseException, OSError):
+            # the session is in an unknown state; the next message starts a fresh one
+            self._discard()
+            raise
+        self._sent_on_connection += 1
+
+    def _discard(self) -> None:
+        smtp, self._smtp = self._smtp, None
+        if smtp is not None:
+            try:
+                smtp.close()
+            except OSError:
+                pass
+
+    def close(self) -> None:
+        smtp, self._smtp = self._smtp, None
+        if smtp is not None:
+            try:
+                smtp.quit()
+            except (smtplib.SMTPException, OSError):
+                smtp.close()
+
+
+class ReporterTransport:
+    """Adapter for unibe_mail's Reporter, which manages its own connection per call."""
+
+    def __init__(self, reporter):
+        self.reporter = reporter
+
+    def send(self, recipient: str, subject: str, html_body: str, unsubscribe_link: str) -> None:
+        self.reporter.send_mail(html_body, subject=subject, recipients=recipient, is_html=True)
+
+    def close(self) -> None:
+        pass
+
+
+@dataclass
+class Campaign:
+    """
+    One alert to all subscribers; ``html_template`` contains ``{unsubscribe_link}`` once. ``created`` is
+    when the alert was raised; it is kept in the journal header and survives a resume.
+    """
+    campaign_id: str
+    subject: str
+    html_template: str
+    created: float = field(default_factory=time.time)
+
+
+@dataclass
+class CampaignResult:
+    campaign_id: str
+    created: float = 0.0
+    sent: int = 0
+    already_sent: int = 0
+    rejected: list[str] = field(default_factory=list)
+    failed: list[str] = field(default_factory=list)
+    elapsed_s: float = 0.0
+
+    @property
+    def complete(self) -> bool:
+        return not self.failed
+
+
+class _Journal:
+    """
+    Append-only record of a campaign's progress: a JSON header with the original recipients, then
+    "sent <addr>"/"rejected <addr>"/"failed <addr>" lines.
+    """
+
+    def __init__(self, path: Path, campaign: Campaign, recipients: list[str]):
+        self.path = path
+        self.done: set[str] = set()
+        if path.exists():
+            lines = path.read_text().splitlines()
+            self.recipients = set(json.loads(lines[0])["recipients"])
+            for line in lines[1:]:
+                _status, _, address = line.partition(" ")
+                if address:
+                    self.done.add(address)
+        else:
+            self.recipients = set(recipients)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(json.dumps({
+                "campaign_id": campaign.campaign_id,
+                "subject": campaign.subject,
+                "html_template": campaign.html_template,
+                "created": campaign.created,
+                "recipients": recipients,
+            }) + "\n")
+        self._file = path.open("a")
+        self._lock = threading.Lock()
+
+    def record(self, status: str, address: str) -> None:
+        with self._lock:
+            self._file.write(f"{status} {address}\n")
+            self._file.flush()
+
+    def close(self, complete: bool) -> None:
+        self._file.close()
+        if complete:
+            self.path.unlink(missing_ok=True)
+
+    @staticmethod
+    def read_header(path: Path) -> Campaign:
+        with path.open() as f:
+            header = json.loads(f.readline())
+        return Campaign(header["campaign_id"], header["subject"], header["html_template"], header["created"])
+
+
+class NotificationWorker:
+    def __init__(self, transport_factory: Callable[[], Transport], *, max_connections: int = 4,
+                 journal_dir: str | Path = "notification_journal", max_attempts: int = 3,
+                 retry_delay_s: float = 2.0, max_campaign_age_s: float = 23 * 60 * 60):
+        self.transport_factory = transport_factory
+        self.max_connections = max(1, max_connections)
+        self.journal_dir = Path(journal_dir)
+        self.max_attempts = max_attempts
+        self.retry_delay_s = retry_delay_s
+        self.max_campaign_age_s = max_campaign_age_s
+        # one campaign at a time; a second alert waits instead of doubling the connections
+        self._campaign_lock = threading.Lock()
+
+    def send(self, campaign: Campaign, recipients: Iterable[tuple[str, str]]) -> CampaignResult:
+        """
+        Deliver ``campaign`` to (address, unsubscribe link) pairs not already in its journal; blocks until done.
+        A resumed campaign only goes to addresses that were recipients of the original send.
+        """
+        prefix, placeholder, suffix = campaign.html_template.partition(UNSUBSCRIBE_PLACEHOLDER)
+        if not placeholder:
+            raise ValueError(f"campaign template lacks {UNSUBSCRIBE_PLACEHOLDER}")
+
+        with self._campaign_lock:
+            started = time.monotonic()
+            links = dict(recipients)
+            journal = _Journal(self.journal_dir / f"{campaign.campaign_id}.log", campaign, list(links))
+            result = CampaignResult(campaign.campaign_id, campaign.created)
+            pending: queue.SimpleQueue[tuple[str, str]] = queue.SimpleQueue()
+            for address, link in links.items():
+                if address not in journal.recipients:
+                    continue
+                if address in journal.done:
+                    result.already_sent += 1
+                else:
+                    pending.put((address, link))
+            if pending.empty():
+                journal.close(complete=True)
+                return result
+
+            result_lock = threading.Lock()
+
+            def deliver() -> None:
+                transport = self.transport_factory()
+                try:
+                    while True:
+                        try:
+                            address, link = pending.get_nowait()
+                        except queue.Empty:
+                            return
+                        status = self._deliver_one(transport, campaign.subject, prefix + link + suffix, address, link)
+                        journal.record(status, address)
+                        with result_lock:
+                            if status == "sent":
+                                result.sent += 1
+                            elif status == "rejected":
+                                result.rejected.append(address)
+                            else:
+                                result.failed.append(address)
+                finally:
+                    transport.close()
+
+            threads = [
+                threading.Thread(target=deliver, name=f"notify_{i}", daemon=True)
+                for i in range(min(self.max_connections, pending.qsize()))
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+            # every address now has a final state, so there is nothing left for a resume to do
+            journal.close(complete=True)
+            result.elapsed_s = time.monotonic() - started
+            logging.info(
+                "[notify] campaign %s: sent=%d already_sent=%d rejected=%d failed=%d in %.1fs",
+                campaign.campaign_id, result.sent, result.already_sent, len(result.rejected),
+                len(result.failed), result.elapsed_s,
+            )
+            return result
+
+    def _deliver_one(self, transport: Transport, subject: str, html_body: str, address: str, link: str) -> str:
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                transport.send(address, subject, html_body, link)
+                return "sent"
+            except smtplib.SMTPRecipientsRefused:
+                logging.warning("[notify] %s rejected by the relay.", address)
+                return "rejected"
+            except Exception as e:
+                logging.warning("[notify] sending to %s failed (attempt %d/%d): %s",
+                                address, attempt, self.max_attempts, e)
+                if attempt < self.max_attempts and self.retry_delay_s:
+                    time.sleep(self.retry_delay_s * attempt)
+        return "failed"
+
+    def pending_campaigns(self) -> list[Campaign]:
+        """Campaigns interrupted by a crash or restart; journals older than ``max_campaign_age_s`` are deleted."""
+        if not self.journal_dir.is_dir():
+            return []
+        campaigns = []
+        for path in sorted(self.journal_dir.glob("*.log")):
+            try:
+                campaign = _Journal.read_header(path)
+            except (OSError, ValueError, KeyError):
+                logging.exception("[notify] unreadable journal %s", path)
+                continue
+            if time.time() - campaign.created > self.max_campaign_age_s:
+                logging.info("[notify] discarding campaign %s, too old to resume.", campaign.campaign_id)
+                path.unlink(missing_ok=True)
+                continue
+            campaigns.append(campaign)
+        return campaigns
+
+    def resume_pending(self, recipients: Callable[[], Iterable[tuple[str, str]]]) -> list[CampaignResult]:
+        """Finish interrupted campaigns for original recipients that are still subscribed."""
+        return [self.send(campaign, recipients()) for campaign in self.pending_campaigns()]
+
+
+def notification_worker_from_env(env_values: dict, fallback_reporter=None) -> NotificationWorker:
+    host = env_values.get("SMTP_HOST")
+    journal_dir = env_values.get("NOTIFY_JOURNAL_DIR") or "notification_journal"
+    if not host:
+        if fallback_reporter is None:
+            raise ValueError("SMTP_HOST is not set and no fallback reporter was given")
+        return NotificationWorker(lambda: ReporterTransport(fallback_reporter), max_connections=1,
+                                  journal_dir=journal_dir)
+
+    security = (env_values.get("SMTP_SECURITY") or "starttls").lower()
+    default_port = 465 if security == "ssl" else 587
+    return NotificationWorker(
+        lambda: SmtpTransport(
+            host,
+            int(env_values.get("SMTP_PORT") or default_port),
+            sender=env_values.get("SMTP_FROM") or env_values.get("SMTP_USER") or "",
+            username=env_values.get("SMTP_USER"),
+            password=env_values.get("SMTP_PASSWORD"),
+            security=security,
+        ),
+        max_connections=int(env_values.get("NOTIFY_MAX_CONNECTIONS") or 4),
+        journal_dir=journal_dir,
+    )
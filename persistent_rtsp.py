@@ -15,6 +15,77 @@ import uuid
 from live_photo import LivePhotoResult, _write_still_metadata, save_live_photo_bundle
 
 
+class SegmentPin:
+    """
+    Private copies of the buffer segments covering one trigger.
+
+    The ring buffer reuses segment file names (and ffmpeg truncates them in place), so footage from
+    around a trigger is copied out as soon as it is settled: the pre-trigger part when the pin is
+    created, the rest by a background thread until ``end_time``. An export can then run whenever
+    the export lock frees up without losing its footage to wrap-around.
+    """
+
+    def __init__(self, recorder: "PersistentRtspRecorder", trigger_time: float, *, start_time: float,
+                 end_time: float) -> None:
+        self.recorder = recorder
+        self.trigger_time = trigger_time
+        self.start_time = start_time
+        self.end_time = end_time
+        self.pin_dir = recorder.buffer_dir / "pins" / uuid.uuid4().hex
+        self.pin_dir.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._segments: list[tuple[float, Path]] = []
+        self._seen: set[tuple[str, float]] = set()
+        self._done = threading.Event()
+        self._released = False
+
+        self._copy_settled()
+        self._thread = threading.Thread(target=self._collect, name="segment_pin", daemon=True)
+        self._thread.start()
+
+    def _copy_settled(self) -> None:
+        # a segment's mtime is the end of the footage it holds
+        latest = self.end_time + self.recorder.segment_time_seconds
+        for modified_at, path in self.recorder._settled_segments():
+            key = (path.name, modified_at)
+            if modified_at <= self.start_time or modified_at > latest or key in self._seen:
+                continue
+            pinned_path = self.pin_dir / f"{len(self._seen):04d}_{path.name}"
+            try:
+                shutil.copy2(path, pinned_path)
+            except FileNotFoundError:
+                continue
+            self._seen.add(key)
+            with self._lock:
+                self._segments.append((modified_at, pinned_path))
+
+    def _collect(self) -> None:
+        settled_age_seconds = max(0.5, self.recorder.segment_time_seconds * 0.8)
+        deadline = self.end_time + self.recorder.segment_time_seconds + settled_age_seconds
+        try:
+            while not self._released and time.time() < deadline:
+                time.sleep(0.25)
+                self._copy_settled()
+            if not self._released:
+                self._copy_settled()
+        except Exception:
+            logging.exception("Failed to pin RTSP buffer segments.")
+        finally:
+            self._done.set()
+
+    def wait(self, timeout: float | None = None) -> list[Path]:
+        """Block until the pinned window is complete and return its segments, oldest first."""
+        self._done.wait(timeout)
+        with self._lock:
+            return [path for _, path in sorted(self._segments)]
+
+    def release(self) -> None:
+        self._released = True
+        self._done.wait(2.0)
+        shutil.rmtree(self.pin_dir, ignore_errors=True)
+
+
 class PersistentRtspRecorder:
     def __init__(
         self,
@@ -51,9 +122,26 @@ class PersistentRtspRecorder:
         self._stop_event = threading.Event()
         self._monitor_thread: threading.Thread | None = None
         self._started = False
+        self._stale_pins_removed = False
+
+    def _remove_stale_pins(self) -> None:
+        # pins are only removed by release(); after a crash or kill their copies would stay forever
+        if self._stale_pins_removed:
+            return
+        self._stale_pins_removed = True
+        pins_dir = self.buffer_dir / "pins"
+        if not pins_dir.is_dir():
+            return
+        stale = [path for path in pins_dir.iterdir() if path.is_dir()]
+        for path in stale:
+            shutil.rmtree(path, ignore_errors=True)
+        if stale:
+            logging.info("Removed %d stale segment pin(s) from %s", len(stale), pins_dir)
 
     def start(self) -> None:
         self.buffer_dir.mkdir(parents=True, exist_ok=True)
+        # only on the first start; a restart of the ffmpeg process must not touch live pins
+        self._remove_stale_pins()
         if self.local_buffer_dir is not None:
             self._started = True
             logging.info("Using local video buffer directory %s", self.buffer_dir)
@@ -87,6 +175,31 @@ class PersistentRtspRecorder:
             if self._process is None or self._process.poll() is not None:
                 self._start_process_locked()
 
+    def pin_segments(
+        self,
+        trigger_time: float | None = None,
+        *,
+        duration_seconds: float | None = None,
+        post_trigger_seconds: float | None = None,
+    ) -> SegmentPin:
+        """
+        Start keeping the footage for a clip of ``duration_seconds`` that ends ``post_trigger_seconds``
+        after ``trigger_time``; pass the result to ``export_live_photo(pinned=...)``.
+        """
+        trigger_time = time.time() if trigger_time is None else trigger_time
+        duration_seconds = duration_seconds or self.default_duration_seconds
+        post_trigger_seconds = (
+            self.post_trigger_seconds if post_trigger_seconds is None else post_trigger_seconds
+        )
+        self.ensure_running()
+        end_time = trigger_time + post_trigger_seconds
+        return SegmentPin(
+            self,
+            trigger_time,
+            start_time=end_time - duration_seconds - self.decode_safety_margin_seconds - self.segment_time_seconds,
+            end_time=end_time,
+        )
+
     def export_live_photo(
         self,
         timestamp: str,
@@ -94,6 +207,7 @@ class PersistentRtspRecorder:
         output_dir: str = "gallery",
         duration_seconds: float | None = None,
         post_trigger_seconds: float | None = None,
+        pinned: SegmentPin | None = None,
     ) -> LivePhotoResult:
         duration_seconds = duration_seconds or self.default_duration_seconds
         post_trigger_seconds = (
@@ -102,6 +216,18 @@ class PersistentRtspRecorder:
         out_dir = Path(output_dir)
         out_dir.mkdir(parents=True, exist_ok=True)
 
+        if pinned is not None:
+            # The pin already waits for the post-trigger footage, outside the export lock.
+            try:
+                segments = pinned.wait(timeout=max(0.0, pinned.end_time - time.time()) + 10.0)
+                with self._export_lock:
+                    return self._export_segments(
+                        segments, timestamp, output_dir=output_dir, out_dir=out_dir,
+                        duration_seconds=duration_seconds, snapshot_segments=False,
+                    )
+            finally:
+                pinned.release()
+
         with self._export_lock:
             self.ensure_running()
             if post_trigger_seconds > 0:
@@ -112,96 +238,111 @@ class PersistentRtspRecorder:
             segments = self._select_recent_segments(duration_seconds=buffered_duration_seconds)
             if not segments:
                 segments = self._wait_for_segments(duration_seconds=buffered_duration_seconds)
-            if not segments:
-                logging.warning("RTSP buffer not ready; falling back to direct live capture.")
-                live_photo = save_live_photo_bundle(
-                    rtsp_url=self.rtsp_url,
-                    timestamp=timestamp,
-                    output_dir=output_dir,
-                    duration_seconds=duration_seconds,
-                )
-                warning = "Persistent RTSP buffer was not ready; used direct capture fallback"
-                if live_photo.warning:
-                    live_photo.warning = f"{live_photo.warning}; {warning}"
-                else:
-                    live_photo.warning = warning
-                return live_photo
-
-            logging.info(
-                "Constructing live photo clip from %d buffered segments: %s",
-                len(segments),
-                ", ".join(path.name for path in segments),
+            return self._export_segments(
+                segments, timestamp, output_dir=output_dir, out_dir=out_dir, duration_seconds=duration_seconds,
             )
 
-            mov_path = out_dir / f"{timestamp}.mov"
-            jpg_path = out_dir / f"{timestamp}.jpg"
-            asset_id = str(uuid.uuid4()).upper()
-            warning_parts: list[str] = []
+    def _export_segments(
+        self,
+        segments: list[Path],
+        timestamp: str,
+        *,
+        output_dir: str,
+        out_dir: Path,
+        duration_seconds: float,
+        snapshot_segments: bool = True,
+    ) -> LivePhotoResult:
+        if not segments:
+            logging.warning("RTSP buffer not ready; falling back to direct live capture.")
+            live_photo = save_live_photo_bundle(
+                rtsp_url=self.rtsp_url,
+                timestamp=timestamp,
+                output_dir=output_dir,
+                duration_seconds=duration_seconds,
+            )
+            warning = "Persistent RTSP buffer was not ready; used direct capture fallback"
+            if live_photo.warning:
+                live_photo.warning = f"{live_photo.warning}; {warning}"
+            else:
+                live_photo.warning = warning
+            return live_photo
 
-            temp_ts_path = mov_path.with_suffix(".buffer.ts")
+        logging.info(
+            "Constructing live photo clip from %d buffered segments: %s",
+            len(segments),
+            ", ".join(path.name for path in segments),
+        )
 
-            try:
-                self._render_segments_to_mov(
-                    segments=segments,
-                    temp_ts_path=temp_ts_path,
-                    output_path=mov_path,
-                    asset_id=asset_id,
-                    duration_seconds=duration_seconds,
-                    decode_safety_margin_seconds=self.decode_safety_margin_seconds,
-                )
-            except subprocess.TimeoutExpired:
-                logging.error(
-                    "Timed out while rendering %d RTSP segments into %s.",
-                    len(segments),
-                    mov_path,
-                )
-                raise
+        mov_path = out_dir / f"{timestamp}.mov"
+        jpg_path = out_dir / f"{timestamp}.jpg"
+        asset_id = str(uuid.uuid4()).upper()
+        warning_parts: list[str] = []
 
-            try:
-                self._extract_still_from_clip(
-                    clip_path=mov_path,
-                    still_path=jpg_path,
-                    seek_seconds=max(0.0, duration_seconds / 2.0),
-                )
-            except subprocess.TimeoutExpired:
-                logging.error("Timed out while extracting still image from %s.", mov_path)
-                raise
-            finally:
-                temp_ts_path.unlink(missing_ok=True)
+        temp_ts_path = mov_path.with_suffix(".buffer.ts")
 
-            if not jpg_path.exists():
-                raise FileNotFoundError(f"{jpg_path} not found after still extraction")
+        try:
+            self._render_segments_to_mov(
+                segments=segments,
+                temp_ts_path=temp_ts_path,
+                output_path=mov_path,
+                asset_id=asset_id,
+                duration_seconds=duration_seconds,
+                decode_safety_margin_seconds=self.decode_safety_margin_seconds,
+                snapshot_segments=snapshot_segments,
+            )
+        except subprocess.TimeoutExpired:
+            logging.error(
+                "Timed out while rendering %d RTSP segments into %s.",
+                len(segments),
+                mov_path,
+            )
+            raise
 
-            try:
-                still_metadata_written = _write_still_metadata(jpg_path, asset_id)
-            except subprocess.CalledProcessError as exc:
-                logging.warning("Failed to write Apple still metadata: %s", exc.stderr.strip())
-                still_metadata_written = False
-                warning_parts.append("Failed to write Apple still metadata")
-            except subprocess.TimeoutExpired:
-                logging.warning("Timed out while writing Apple still metadata.")
-                still_metadata_written = False
-                warning_parts.append("Timed out while writing Apple still metadata")
+        try:
+            self._extract_still_from_clip(
+                clip_path=mov_path,
+                still_path=jpg_path,
+                seek_seconds=max(0.0, duration_seconds / 2.0),
+            )
+        except subprocess.TimeoutExpired:
+            logging.error("Timed out while extracting still image from %s.", mov_path)
+            raise
+        finally:
+            temp_ts_path.unlink(missing_ok=True)
 
-            if still_metadata_written:
-                warning_parts.append(
-                    "Only partial Apple metadata was written; MOV still-image-time metadata is still missing"
-                )
-            else:
-                warning_parts.append(
-                    "Full Apple Live Photo metadata is incomplete on this device; exiftool is not installed"
-                )
+        if not jpg_path.exists():
+            raise FileNotFoundError(f"{jpg_path} not found after still extraction")
 
-            return LivePhotoResult(
-                still_path=jpg_path,
-                motion_path=mov_path,
-                bundle_id=timestamp,
-                asset_id=asset_id,
-                used_heic=False,
-                apple_metadata_ready=False,
-                warning="; ".join(warning_parts) if warning_parts else None,
+        try:
+            still_metadata_written = _write_still_metadata(jpg_path, asset_id)
+        except subprocess.CalledProcessError as exc:
+            logging.warning("Failed to write Apple still metadata: %s", exc.stderr.strip())
+            still_metadata_written = False
+            warning_parts.append("Failed to write Apple still metadata")
+        except subprocess.TimeoutExpired:
+            logging.warning("Timed out while writing Apple still metadata.")
+            still_metadata_written = False
+            warning_parts.append("Timed out while writing Apple still metadata")
+
+        if still_metadata_written:
+            warning_parts.append(
+                "Only partial Apple metadata was written; MOV still-image-time metadata is still missing"
+            )
+        else:
+            warning_parts.append(
+                "Full Apple Live Photo metadata is incomplete on this device; exiftool is not installed"
             )
 
+        return LivePhotoResult(
+            still_path=jpg_path,
+            motion_path=mov_path,
+            bundle_id=timestamp,
+            asset_id=asset_id,
+            used_heic=False,
+            apple_metadata_ready=False,
+            warning="; ".join(warning_parts) if warning_parts else None,
+        )
+
     def _monitor_loop(self) -> None:
         while not self._stop_event.wait(2.0):
             try:
@@ -272,6 +413,20 @@ class PersistentRtspRecorder:
             except FileNotFoundError:
                 continue
 
+    def _settled_segments(self) -> list[tuple[float, Path]]:
+        """(mtime, path) of every segment ffmpeg has finished writing, oldest first."""
+        now = time.time()
+        settled_age_seconds = max(0.5, self.segment_time_seconds * 0.8)
+        segments = []
+        for path in self.buffer_dir.glob("segment_*.ts"):
+            try:
+                modified_at = path.stat().st_mtime
+            except FileNotFoundError:
+                continue
+            if now - modified_at >= settled_age_seconds:
+                segments.append((modified_at, path))
+        return sorted(segments)
+
     def _select_recent_segments(self, *, duration_seconds: float) -> list[Path]:
         self._prune_old_segments()
         required_segments = max(2, int(duration_seconds / self.segment_time_seconds) + 2)
@@ -315,14 +470,20 @@ class PersistentRtspRecorder:
         asset_id: str,
         duration_seconds: float,
         decode_safety_margin_seconds: float,
+        snapshot_segments: bool = True,
     ) -> None:
         with tempfile.TemporaryDirectory() as temp_dir_name:
             temp_dir = Path(temp_dir_name)
+            # Segments still in the ring buffer are copied first so ffmpeg cannot overwrite them
+            # mid-concat; pinned segments are already private copies.
             snapshot_paths: list[Path] = []
-            for index, segment in enumerate(segments):
-                snapshot_path = temp_dir / f"{index:03d}_{segment.name}"
-                shutil.copy2(segment, snapshot_path)
-                snapshot_paths.append(snapshot_path)
+            if snapshot_segments:
+                for index, segment in enumerate(segments):
+                    snapshot_path = temp_dir / f"{index:03d}_{segment.name}"
+                    shutil.copy2(segment, snapshot_path)
+                    snapshot_paths.append(snapshot_path)
+            else:
+                snapshot_paths = list(segments)
 
             with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False) as tmp:
                 concat_path = Path(tmp.name)
@@ -4,16 +4,21 @@
 
 from __future__ import annotations
 
+import collections
 import threading
 import time
 from dataclasses import dataclass
 import datetime
-from typing import Optional
+import json
+from pathlib import Path
+import queue
+from typing import Callable, Optional, Sequence
 import logging
-import csv
 import subprocess
+
+import attrs
+import numpy as np
 from unibe_mail import Reporter
-from encoding import encode_email
 
 import acconeer.exptool as et
 from acconeer.exptool import a121
@@ -23,16 +28,23 @@ from acconeer.exptool.a121.algo.breathing._ref_app import (
     RefAppConfig,
     get_sensor_config,
 )
+from acconeer.exptool.a121.algo.presence import Processor as PresenceProcessor
 from acconeer.exptool.a121.algo.presence import ProcessorConfig as PresenceProcessorConfig
 from dotenv import dotenv_values
 import psycopg
 
 from camera import get_ir_led_state, turn_ir_on, turn_ir_off
 from ignore_motion import are_we_still_blocked
-from image_upload import UploadImageError, upload_live_photo
+from notifications import Campaign, CampaignResult, NotificationWorker, notification_worker_from_env
 from persistent_rtsp import PersistentRtspRecorder
 from postgresql_store import PostgresTimeSeriesStore
+from subscribers import SubscriberStore
+from telemetry import TelemetryHub
 from time_utils import bern_image_timestamp
+from upload_outbox import UploadOutbox
+
+NEWSLETTER_BASE_URL = "https://voegeli.linusleo.synology.me"
+LAST_EMAIL_FILE = "last_email_sent.txt"
 
 
 @dataclass
@@ -48,13 +60,310 @@ class Sample:
     breathing_rate_bpm: Optional[float]
 
 
+# Adaptive duty cycling: MODE_IDLE runs a cheap presence-only config at a low frame rate while
+# the box is empty, MODE_ACTIVE the full breathing config.
+MODE_ACTIVE = "active"
+MODE_IDLE = "idle"
+
+
+@dataclass
+class RawFrame:
+    session: int
+    connection: int
+    received_s: float
+    result: a121.Result
+
+
+class FrameRing:
+    """
+    Bounded hand-off between the acquisition and processing threads.
+
+    ``put`` never blocks: when processing has fallen ``maxlen`` frames behind, the oldest frame is
+    discarded so the acquisition thread keeps draining the exptool client at the sensor rate.
+    """
+
+    def __init__(self, maxlen: int):
+        self._frames: collections.deque[RawFrame] = collections.deque(maxlen=maxlen)
+        self._cond = threading.Condition()
+        self.dropped = 0
+
+    def put(self, frame: RawFrame) -> None:
+        with self._cond:
+            if len(self._frames) == self._frames.maxlen:
+                self.dropped += 1
+            self._frames.append(frame)
+            self._cond.notify()
+
+    def get(self, timeout: float) -> Optional[RawFrame]:
+        with self._cond:
+            if not self._frames:
+                self._cond.wait(timeout)
+            return self._frames.popleft() if self._frames else None
+
+    def wake(self) -> None:
+        with self._cond:
+            self._cond.notify_all()
+
+    def __len__(self) -> int:
+        return len(self._frames)
+
+
+class RadarHistory:
+    """
+    Preallocated circular history of processed radar samples.
+
+    Every sample is written twice, at ``i`` and ``i + capacity`` of a ``2 * capacity`` array, so any
+    window of up to ``capacity`` recent samples is one contiguous slice and can be handed out as a
+    view. A view stays valid until the history has wrapped past it, i.e. for ``capacity`` samples;
+    copy it if it has to live longer. Distance and breathing rate are NaN when not valid.
+    """
+
+    DTYPE = np.dtype([
+        ("t", "f8"),
+        ("activity", "f8"),
+        ("temperature", "f8"),
+        ("distance_m", "f8"),
+        ("bpm", "f8"),
+        ("presence", "?"),
+        ("presence_detected", "?"),
+        ("intra_score", "f8"),
+        ("inter_score", "f8"),
+    ])
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._rows = np.zeros(2 * capacity, dtype=self.DTYPE)
+        self._lock = threading.Lock()
+        # number of samples ever appended; the next one goes to _count % capacity
+        self._count = 0
+
+    def append(self, t: float, activity: float, temperature: float, distance_m: float, bpm: float,
+               presence: bool, presence_detected: bool, intra_score: float, inter_score: float) -> None:
+        row = (t, activity, temperature, distance_m, bpm, presence, presence_detected, intra_score, inter_score)
+        with self._lock:
+            index = self._count % self.capacity
+            self._rows[index] = row
+            self._rows[index + self.capacity] = row
+            self._count += 1
+
+    @property
+    def count(self) -> int:
+        return self._count
+
+    def since(self, seq: int) -> tuple[np.ndarray, int]:
+        """Samples appended after sequence number ``seq`` (at most ``capacity``), and the sequence to resume from."""
+        with self._lock:
+            count = self._count
+        n = min(count - seq, self.capacity, count)
+        return self._view(count, n), count
+
+    def last(self, n: int) -> np.ndarray:
+        with self._lock:
+            count = self._count
+        return self._view(count, min(n, self.capacity, count))
+
+    def window(self, seconds: float) -> np.ndarray:
+        """Samples from the last ``seconds`` before the newest one."""
+        recent = self.last(self.capacity)
+        if not len(recent):
+            return recent
+        return recent[np.searchsorted(recent["t"], recent["t"][-1] - seconds, side="right"):]
+
+    def latest(self) -> Optional[np.void]:
+        recent = self.last(1)
+        return recent[0] if len(recent) else None
+
+    def _view(self, count: int, n: int) -> np.ndarray:
+        end = count % self.capacity or (self.capacity if count else 0)
+        if end < n:
+            end += self.capacity
+        return self._rows[end - n:end]
+
+    @staticmethod
+    def aggregate(samples: np.ndarray) -> Optional[dict]:
+        """Window statistics for the database writer; None for an empty window."""
+        if not len(samples):
+            return None
+        activity = samples["activity"]
+        distances = samples["distance_m"][samples["presence"]]
+        bpms = samples["bpm"][~np.isnan(samples["bpm"])]
+        return {
+            "count": len(samples),
+            "activity_mean": float(activity.mean()),
+            "activity_max": float(activity.max()),
+            "activity_p90": float(np.percentile(activity, 90)),
+            "temperature_mean": float(samples["temperature"].mean()),
+            "distance_mean_m": float(distances.mean()) if len(distances) else None,
+            "bpm_mean": float(bpms.mean()) if len(bpms) else None,
+            "presence_any": bool(samples["presence"].any()),
+            "presence_duty_cycle": float(samples["presence"].mean()),
+        }
+
+
+class SensorPipeline:
+    """
+    Per-sensor processing state: the ring the acquisition thread fills for this sensor, its
+    processor, its sample history and the worker thread that connects them. Field names written
+    to the database and telemetry get ``field_suffix`` appended ("" for the primary sensor).
+    """
+
+    def __init__(self, sensor_id: int, *, start_m: float, end_m: float, field_suffix: str, ring_maxlen: int,
+                 history_capacity: int):
+        self.sensor_id = sensor_id
+        self.start_m = start_m
+        self.end_m = end_m
+        self.field_suffix = field_suffix
+        self.frames = FrameRing(maxlen=ring_maxlen)
+        self.history = RadarHistory(capacity=history_capacity)
+        self.processor = None
+        self.app_state: Optional[str] = None
+        self.presence_active = False
+        self.thread: Optional[threading.Thread] = None
+
+
+class RadarFrameRecorder:
+    """
+    Opt-in recorder for raw A121 frames, for offline tuning of the presence/motion thresholds.
+
+    Frames go into rotating ``.npy`` files opened with ``np.lib.format.open_memmap``, each
+    preallocated for ``frames_per_file`` rows of (unix time, sensor temperature, complex frame).
+    Next to each file a ``.json`` sidecar holds the session's sensor config and metadata and the
+    number of rows filled. It is written when the file is opened and rewritten every
+    ``sidecar_every`` frames after flushing the rows, so after a crash it undercounts at most
+    that many frames and never points at unfilled rows. ``append`` only enqueues, so the acquisition thread never
+    waits for the disk; a background thread does the copying and the oldest files are deleted
+    once the recordings exceed ``max_bytes``.
+    """
+
+    def __init__(self, output_dir: str | Path, *, max_bytes: int = 2 * 1024 ** 3, frames_per_file: int = 1800,
+                 max_pending: int = 300, sidecar_every: int = 150):
+        self.output_dir = Path(output_dir)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.frames_per_file = frames_per_file
+        self.sidecar_every = max(1, sidecar_every)
+        self.dropped = 0
+        self.recorded = 0
+
+        self._pending: queue.Queue = queue.Queue(maxsize=max_pending)
+        self._session_info: dict = {}
+        self._file: Optional[np.memmap] = None
+        self._file_path: Optional[Path] = None
+        self._file_rows = 0
+        self._file_session: Optional[int] = None
+        self._thread = threading.Thread(target=self._run, name="radar_recorder", daemon=True)
+        self._thread.start()
+
+    def start_session(self, session: int, sensor_config, metadata) -> None:
+        info = {
+            "session": session,
+            "sensor_config": sensor_config.to_dict() if hasattr(sensor_config, "to_dict") else str(sensor_config),
+            "metadata": attrs.asdict(metadata) if attrs.has(type(metadata)) else str(metadata),
+        }
+        self._put(("session", session, info))
+
+    def append(self, session: int, timestamp_s: float, result) -> None:
+        self._put(("frame", session, (timestamp_s, result.temperature, result.frame)))
+
+    def _put(self, item) -> None:
+        try:
+            self._pending.put_nowait(item)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self) -> None:
+        self._pending.put(None)
+        self._thread.join(timeout=5.0)
+
+    def _run(self) -> None:
+        while True:
+            item = self._pending.get()
+            if item is None:
+                break
+            kind, session, payload = item
+            try:
+                if kind == "session":
+                    self._session_info[session] = payload
+                else:
+                    self._write_frame(session, *payload)
+            except Exception:
+                logging.exception("[radar] frame recorder failed; dropping frame.")
+                self._close_file()
+        self._close_file()
+
+    def _write_frame(self, session: int, timestamp_s: float, temperature: int, frame: np.ndarray) -> None:
+        if (self._file is None or self._file_session != session or self._file_rows >= self.frames_per_file
+                or self._file.dtype["frame"].shape != frame.shape):
+            self._close_file()
+            self._open_file(session, frame.shape)
+        self._file["t"][self._file_rows] = timestamp_s
+        self._file["temperature"][self._file_rows] = temperature
+        self._file["frame"][self._file_rows] = frame
+        self._file_rows += 1
+        self.recorded += 1
+        if self._file_rows % self.sidecar_every == 0:
+            self._file.flush()
+            self._write_sidecar()
+
+    def _open_file(self, session: int, frame_shape: tuple) -> None:
+        dtype = np.dtype([("t", "<f8"), ("temperature", "<i2"), ("frame", "<c8", frame_shape)])
+        stamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+        self._file_path = self.output_dir / f"radar_{stamp}_s{session}.npy"
+        self._file = np.lib.format.open_memmap(self._file_path, mode="w+", dtype=dtype,
+                                               shape=(self.frames_per_file,))
+        self._file_rows = 0
+        self._file_session = session
+        self._write_sidecar()
+
+    def _write_sidecar(self) -> None:
+        sidecar = {
+            "frames": self._file_rows,
+            "frames_per_file": self.frames_per_file,
+            **self._session_info.get(self._file_session, {"session": self._file_session}),
+        }
+        # replace, so a crash mid-write leaves the previous sidecar rather than a truncated one
+        path = self._file_path.with_suffix(".json")
+        tmp_path = path.with_suffix(".json.tmp")
+        tmp_path.write_text(json.dumps(sidecar, indent=2, default=str))
+        tmp_path.replace(path)
+
+    def _close_file(self) -> None:
+        if self._file is None:
+            return
+        self._file.flush()
+        self._write_sidecar()
+        self._file = None
+        self._enforce_disk_budget()
+
+    def _enforce_disk_budget(self) -> None:
+        recordings = sorted(self.output_dir.glob("radar_*.npy"))
+        total = sum(path.stat().st_size for path in recordings)
+        for path in recordings:
+            if total <= self.max_bytes:
+                break
+            total -= path.stat().st_size
+            path.unlink(missing_ok=True)
+            path.with_suffix(".json").unlink(missing_ok=True)
+
+
 class Radar:
+    TELEMETRY_FIELDS = (
+        "radar_activity",
+        "radar_temperature",
+        "radar_presence",
+        "radar_distance_m",
+        "radar_breathing_rate_bpm",
+        "radar_mode",
+    )
+
     def __init__(
             self,
             *,
             ip_address: str = "localhost",
             tcp_port: int = 6110,
             sensor_id: int = 1,
+            sensor_ids: Sequence[int] | None = None,
+            sensor_ranges: dict[int, tuple[float, float]] | None = None,
             frame_rate: float = 30.0,
             sweeps_per_frame: int = 16,
             hwaas: int = 32,
@@ -66,19 +375,39 @@ class Radar:
             num_distances: int = 1,
             distance_det_s: float = 6.0,
             write_period_s: float = 2.0,
-            motion_activity_threshold: float = 6.0,
+            history_s: float = 600.0,
+            adaptive: bool = False,
+            idle_frame_rate: float = 5.0,
+            idle_sweeps_per_frame: int = 8,
+            idle_hwaas: int = 8,
+            idle_after_s: float = 120.0,
+            capture_post_trigger_seconds: float = 5.0,
             env_file: str = ".env",
             recorder: PersistentRtspRecorder | None = None,
+            outbox: UploadOutbox | None = None,
+            telemetry: TelemetryHub | None = None,
+            frame_recorder: RadarFrameRecorder | None = None,
+            client_factory: Callable[..., a121.Client] | None = None,
+            db_store: PostgresTimeSeriesStore | None = None,
+            notifications: NotificationWorker | None = None,
+            subscribers: SubscriberStore | None = None,
+            clock=time,
     ) -> None:
         # Track last image save time and last email sent time
         self.last_image_time = 0
 
+        # client_factory and clock (anything with time() and sleep(), the time module by default)
+        # let radar_replay drive the whole pipeline from recorded or synthetic frames.
+        self.client_factory = client_factory or a121.Client.open
+        self._clock = clock
+
         env_values = dotenv_values(env_file)
-        self.mediamtx_url = env_values['IMAGE_GRAB_URL']
-        self.db_store = PostgresTimeSeriesStore(env_values)
+        # the URLs and token are only needed for the recorder/outbox created here, not injected ones
+        self.mediamtx_url = env_values.get('IMAGE_GRAB_URL')
+        self.db_store = db_store or PostgresTimeSeriesStore(env_values)
         self.bucket = self.db_store.bucket
-        self.upload_image_token = env_values['UPLOAD_IMAGE_TOKEN']
-        self.upload_image_url = env_values['UPLOAD_IMAGE_URL']
+        self.upload_image_token = env_values.get('UPLOAD_IMAGE_TOKEN')
+        self.upload_image_url = env_values.get('UPLOAD_IMAGE_URL')
         self.rtsp_recorder = recorder or PersistentRtspRecorder(
             self.mediamtx_url,
             local_buffer_dir=env_values.get("LOCAL_VIDEO_BUFFER_DIR"),
@@ -86,13 +415,35 @@ class Radar:
         )
         self._owns_rtsp_recorder = recorder is None
         self.rtsp_recorder.start()
+        self.upload_outbox = outbox or UploadOutbox(
+            self.upload_image_token,
+            self.upload_image_url,
+            outbox_dir=env_values.get("UPLOAD_OUTBOX_DIR") or "gallery/outbox",
+        )
+        self._owns_upload_outbox = outbox is None
+        self.upload_outbox.start()
+
+        self.frame_recorder = frame_recorder
+        self.telemetry = telemetry
 
         # replace this with custom email-interface
         self.email_reporter = Reporter("Voegeli")
+        # SMTP_HOST in .env switches motion alerts to pooled SMTP sessions, otherwise they go via the reporter
+        self.notifications = notifications or notification_worker_from_env(env_values, self.email_reporter)
+        self.subscribers = subscribers or SubscriberStore(
+            env_values.get("SUBSCRIBER_DB") or "newsletter_subscribers.sqlite3"
+        )
+        self._recipients_source: tuple | None = None
+        self._recipients: list[tuple[str, str]] = []
+        # one alert in flight at a time: held from the throttle check until last_email_sent.txt is written
+        self._notify_lock = threading.Lock()
 
         self.ip_address = ip_address
         self.tcp_port = tcp_port
-        self.sensor_id = sensor_id
+        # Several A121s on one board share one session; sensor_ranges optionally gives each its own
+        # (start_m, end_m). The first sensor is the primary one: its fields keep the legacy names.
+        self.sensor_ids = tuple(sensor_ids or (sensor_id,))
+        self.sensor_id = self.sensor_ids[0]
         self.frame_rate = frame_rate
         self.sweeps_per_frame = sweeps_per_frame
         self.hwaas = hwaas
@@ -104,37 +455,73 @@ class Radar:
         self.num_distances = num_distances
         self.distance_det_s = distance_det_s
         self.write_period_s = write_period_s
-        self.motion_activity_threshold = motion_activity_threshold
-        # Only consider presence within the configured range
-        self.min_presence_distance_m = start_m
-        self.max_presence_distance_m = end_m
+        # The clip ends this long after the trigger; with the default 5 s clip the still is taken
+        # 2.5 s after the trigger, which gives the IR-lit scene time to settle.
+        self.capture_post_trigger_seconds = capture_post_trigger_seconds
+        # With adaptive set, the sensor idles in a presence-only config and switches to the full
+        # config on presence; it drops back after idle_after_s without presence.
+        self.adaptive = adaptive
+        self.idle_frame_rate = idle_frame_rate
+        self.idle_sweeps_per_frame = idle_sweeps_per_frame
+        self.idle_hwaas = idle_hwaas
+        self.idle_after_s = idle_after_s
 
         self._client: Optional[a121.Client] = None
-        self._processor: Optional[Processor] = None
-        self._latest_lock = threading.Lock()
-        self._latest: Optional[Sample] = None
+        self.sensors: dict[int, SensorPipeline] = {}
+        for index, sid in enumerate(self.sensor_ids):
+            # only presence within the sensor's configured range counts
+            start, end = (sensor_ranges or {}).get(sid, (start_m, end_m))
+            self.sensors[sid] = SensorPipeline(
+                sid,
+                start_m=start,
+                end_m=end,
+                field_suffix="" if index == 0 else f"_s{sid}",
+                # ~2 s of frames at 30 Hz; beyond that the processing stage is hopelessly behind anyway
+                ring_maxlen=max(8, int(frame_rate * 2)),
+                # newest samples for the database writer and anyone wanting recent windows (10 min by default)
+                history_capacity=max(1, int(history_s * frame_rate)),
+            )
+        self.history = self.sensors[self.sensor_id].history
+        if self.telemetry is not None:
+            self.telemetry.register_fields(self._telemetry_fields())
         self._stop_event = threading.Event()
         self._presence_event = threading.Event()
-        self._sampler_thread: Optional[threading.Thread] = None
+        self._presence_trigger_time: Optional[float] = None
+        self._acquisition_thread: Optional[threading.Thread] = None
+        # bumped on every (re)connect so frames from an old session never reach a new processor
+        self._session = 0
+        # bumped on reconnects only; a mode switch keeps the presence edge state
+        self._connection = 0
+        self._mode: Optional[str] = None
+        self._requested_mode = MODE_IDLE if adaptive else MODE_ACTIVE
+        self._mode_since_s: Optional[float] = None
+        self._mode_seconds = {MODE_ACTIVE: 0.0, MODE_IDLE: 0.0}
+        self._mode_switches = 0
+        self._reconnect_requested = False
+        self._frames_received = 0
+        self._frames_late = 0
+        self._frames_stale = 0
+        self._max_processing_lag_s = 0.0
+        self._frame_stats_interval_s = 60.0
         self._writer_thread: Optional[threading.Thread] = None
         self._presence_thread: Optional[threading.Thread] = None
+        # rising-edge state of the presence of all sensors combined, guarded by _presence_lock
+        self._presence_lock = threading.Lock()
+        self._edge_connection: Optional[int] = None
         self._motion_active_prev: Optional[bool] = None
         self._motion_low_since_s: Optional[float] = None
         self._last_debug_log_s = 0.0
-        self._accum_lock = threading.Lock()
-        self._accum = {
-            "count": 0,
-            "activity_sum": 0.0,
-            "temp_sum": 0.0,
-            "distance_sum": 0.0,
-            "distance_count": 0,
-            "bpm_sum": 0.0,
-            "bpm_count": 0,
-            "presence_any": False,
-        }
         self._reconnect_delay_s = 2.0
 
-    def _create_sensor_config(self) -> tuple[a121.SensorConfig, ProcessorConfig]:
+    def _telemetry_fields(self) -> list[str]:
+        fields = ["radar_mode"]
+        for pipeline in self.sensors.values():
+            fields += [name + pipeline.field_suffix for name in self.TELEMETRY_FIELDS if name != "radar_mode"]
+        return fields
+
+    def _create_sensor_config(self, *, frame_rate: float | None = None, sweeps_per_frame: int | None = None,
+                              hwaas: int | None = None, start_m: float | None = None,
+                              end_m: float | None = None) -> tuple[a121.SensorConfig, ProcessorConfig]:
         breathing_config = BreathingProcessorConfig(
             lowest_breathing_rate=self.lowest_bpm,
             highest_breathing_rate=self.highest_bpm,
@@ -153,11 +540,11 @@ class Radar:
             use_presence_processor=True,
             num_distances_to_analyze=self.num_distances,
             distance_determination_duration=self.distance_det_s,
-            start_m=self.start_m,
-            end_m=self.end_m,
-            hwaas=self.hwaas,
-            frame_rate=self.frame_rate,
-            sweeps_per_frame=self.sweeps_per_frame,
+            start_m=start_m or self.start_m,
+            end_m=end_m or self.end_m,
+            hwaas=hwaas or self.hwaas,
+            frame_rate=frame_rate or self.frame_rate,
+            sweeps_per_frame=sweeps_per_frame or self.sweeps_per_frame,
             breathing_config=breathing_config,
             presence_config=presence_config,
         )
@@ -174,15 +561,78 @@ class Radar:
         return sensor_config, processor_config
 
     def _connect_radar(self) -> None:
-        sensor_config, processor_config = self._create_sensor_config()
-        self._client = a121.Client.open(ip_address=self.ip_address, tcp_port=self.tcp_port)
-        metadata = self._client.setup_session(a121.SessionConfig({self.sensor_id: sensor_config}))
-        assert not isinstance(metadata, list)
-        self._processor = Processor(
-            sensor_config=sensor_config, processor_config=processor_config, metadata=metadata
+        self._client = self.client_factory(ip_address=self.ip_address, tcp_port=self.tcp_port)
+        self._connection += 1
+        self._start_session()
+
+    def _start_session(self) -> None:
+        mode = self._requested_mode
+        overrides = {}
+        if mode == MODE_IDLE:
+            overrides = dict(
+                frame_rate=self.idle_frame_rate,
+                sweeps_per_frame=self.idle_sweeps_per_frame,
+                hwaas=self.idle_hwaas,
+            )
+        configs = {
+            sid: self._create_sensor_config(start_m=pipeline.start_m, end_m=pipeline.end_m, **overrides)
+            for sid, pipeline in self.sensors.items()
+        }
+        # extended: setup_session and get_next deal in one {sensor_id: ...} dict per group
+        session_config = a121.SessionConfig(
+            {sid: sensor_config for sid, (sensor_config, _) in configs.items()}, extended=True
         )
+        metadata = self._client.setup_session(session_config)[0]
+        # new session id first: frames still queued from the old session are discarded from here on
+        self._session += 1
+        processors = {}
+        for sid, (sensor_config, processor_config) in configs.items():
+            if mode == MODE_IDLE:
+                processors[sid] = PresenceProcessor(
+                    sensor_config=sensor_config,
+                    metadata=metadata[sid],
+                    processor_config=processor_config.presence_config,
+                )
+            else:
+                processors[sid] = Processor(
+                    sensor_config=sensor_config, processor_config=processor_config, metadata=metadata[sid]
+                )
+        self._enter_mode(mode)
+        for sid, processor in processors.items():
+            self.sensors[sid].processor = processor
+        if self.frame_recorder is not None:
+            # the recording format holds one sensor; record the primary one
+            self.frame_recorder.start_session(self._session, configs[self.sensor_id][0], metadata[self.sensor_id])
         self._client.start_session()
 
+    def _reconfigure(self) -> None:
+        # same client, new session config; the caller reconnects if this fails
+        self._client.stop_session()
+        self._start_session()
+
+    def _enter_mode(self, mode: str) -> None:
+        now_s = self._clock.time()
+        if self._mode is not None and self._mode_since_s is not None:
+            self._mode_seconds[self._mode] += now_s - self._mode_since_s
+            if mode != self._mode:
+                self._mode_switches += 1
+                logging.info("[radar] switching to %s mode", mode)
+        self._mode = mode
+        self._mode_since_s = now_s
+
+    def mode_stats(self) -> dict:
+        seconds = dict(self._mode_seconds)
+        mode, since_s = self._mode, self._mode_since_s
+        if mode is not None and since_s is not None:
+            seconds[mode] += self._clock.time() - since_s
+        return {
+            "mode": mode,
+            "adaptive": self.adaptive,
+            "active_s": seconds[MODE_ACTIVE],
+            "idle_s": seconds[MODE_IDLE],
+            "switches": self._mode_switches,
+        }
+
     def _disconnect_radar(self) -> None:
         if self._client is not None:
             try:
@@ -194,9 +644,8 @@ class Radar:
             except Exception:
                 pass
         self._client = None
-        self._processor = None
-        self._motion_active_prev = None
-        self._motion_low_since_s = None
+        for pipeline in self.sensors.values():
+            pipeline.processor = None
 
     def run(self) -> None:
         et.utils.config_logging()
@@ -206,36 +655,57 @@ class Radar:
             logging.warning("[radar] initial connect failed, retrying in sampler: %s", e)
             self._disconnect_radar()
 
-        self._sampler_thread = threading.Thread(
-            target=self._sampler, name="sampler", daemon=True
+        self._acquisition_thread = threading.Thread(
+            target=self._acquire, name="radar_acquisition", daemon=True
         )
+        for index, pipeline in enumerate(self.sensors.values()):
+            pipeline.thread = threading.Thread(
+                target=self._sampler, args=(pipeline, index == 0), name=f"sampler_{pipeline.sensor_id}", daemon=True
+            )
         self._writer_thread = threading.Thread(
             target=self._writer, name="writer", daemon=True
         )
         self._presence_thread = threading.Thread(
             target=self._presence_watcher, name="presence_watcher", daemon=True
         )
-        self._sampler_thread.start()
+        self._acquisition_thread.start()
+        for pipeline in self.sensors.values():
+            pipeline.thread.start()
         self._writer_thread.start()
         self._presence_thread.start()
+        # finish alert campaigns a crash cut short; relay failures are journaled and never resumed
+        threading.Thread(target=self._resume_notifications, name="radar_notify_resume", daemon=True).start()
 
     def stop(self) -> None:
         self._stop_event.set()
         self._presence_event.set()
-        if self._sampler_thread is not None:
-            self._sampler_thread.join(timeout=2.0)
+        for pipeline in self.sensors.values():
+            pipeline.frames.wake()
+        if self._acquisition_thread is not None:
+            self._acquisition_thread.join(timeout=2.0)
+        for pipeline in self.sensors.values():
+            if pipeline.thread is not None:
+                pipeline.thread.join(timeout=2.0)
         if self._writer_thread is not None:
             self._writer_thread.join(timeout=2.0)
         if self._presence_thread is not None:
             self._presence_thread.join(timeout=2.0)
         self._disconnect_radar()
+        if self.frame_recorder is not None:
+            self.frame_recorder.close()
         if self._owns_rtsp_recorder:
             self.rtsp_recorder.stop()
+        if self._owns_upload_outbox:
+            self.upload_outbox.stop()
         self.db_store.close()
 
-    def _sampler(self) -> None:
+    def _acquire(self) -> None:
+        """Acquisition stage: only drains the exptool client, so the frame cadence does not depend on processing."""
+        last_received_s: Optional[float] = None
         while not self._stop_event.is_set():
-            if self._client is None or self._processor is None:
+            if self._client is None or self.sensors[self.sensor_id].processor is None or self._reconnect_requested:
+                self._reconnect_requested = False
+                self._disconnect_radar()
                 try:
                     self._connect_radar()
                     logging.info("[radar] reconnected")
@@ -245,28 +715,170 @@ class Radar:
                     if self._stop_event.wait(self._reconnect_delay_s):
                         break
                     continue
+                last_received_s = None
+            elif self._requested_mode != self._mode:
+                try:
+                    self._reconfigure()
+                except Exception as e:
+                    logging.warning("[radar] switching to %s mode failed, reconnecting: %s", self._requested_mode, e)
+                    self._reconnect_requested = True
+                    continue
+                last_received_s = None
 
+            frame_period_s = 1.0 / (self.idle_frame_rate if self._mode == MODE_IDLE else self.frame_rate)
             try:
-                result = self._client.get_next()
-                processor_result = self._processor.process(result)
+                results = self._client.get_next()[0]
             except Exception as e:
-                logging.warning("[radar] sampler error, reconnecting: %s", e)
+                logging.warning("[radar] acquisition error, reconnecting: %s", e)
                 self._disconnect_radar()
                 if self._stop_event.wait(self._reconnect_delay_s):
                     break
                 continue
 
-            presence = processor_result.presence_result
+            received_s = time.monotonic()
+            clock_s = self._clock.time()
+            self._frames_received += 1
+            # late: a sensor flagged a delayed frame, or we picked it up well after its slot
+            if any(getattr(result, "frame_delayed", False) for result in results.values()) or (
+                    last_received_s is not None and clock_s - last_received_s > 1.5 * frame_period_s):
+                self._frames_late += 1
+            last_received_s = clock_s
+            for sid, result in results.items():
+                self.sensors[sid].frames.put(RawFrame(
+                    session=self._session, connection=self._connection, received_s=received_s, result=result
+                ))
+            if self.frame_recorder is not None:
+                self.frame_recorder.append(self._session, clock_s, results[self.sensor_id])
+
+    def latest_sample(self, sensor_id: int | None = None) -> Optional[Sample]:
+        pipeline = self.sensors[sensor_id or self.sensor_id]
+        row = pipeline.history.latest()
+        if row is None:
+            return None
+        return Sample(
+            timestamp_s=float(row["t"]),
+            activity=float(row["activity"]),
+            temperature=float(row["temperature"]),
+            app_state=pipeline.app_state,
+            presence_detected=bool(row["presence_detected"]),
+            presence_distance_m=float(row["distance_m"]),
+            intra_presence_score=float(row["intra_score"]),
+            inter_presence_score=float(row["inter_score"]),
+            breathing_rate_bpm=None if np.isnan(row["bpm"]) else float(row["bpm"]),
+        )
+
+    def frame_stats(self) -> dict:
+        return {
+            "received": self._frames_received,
+            "dropped": sum(pipeline.frames.dropped for pipeline in self.sensors.values()),
+            "late": self._frames_late,
+            "stale": self._frames_stale,
+            "queued": sum(len(pipeline.frames) for pipeline in self.sensors.values()),
+            "max_processing_lag_s": self._max_processing_lag_s,
+        }
+
+    def _sampler(self, pipeline: SensorPipeline, log_stats: bool) -> None:
+        """Processing stage for one sensor: runs its breathing/presence processor on frames from its ring buffer."""
+        next_stats_log_s = time.monotonic() + self._frame_stats_interval_s
+        field = {name: name + pipeline.field_suffix for name in self.TELEMETRY_FIELDS}
+        while not self._stop_event.is_set():
+            if log_stats and time.monotonic() >= next_stats_log_s:
+                next_stats_log_s += self._frame_stats_interval_s
+                stats = self.frame_stats()
+                if stats["dropped"] or stats["late"]:
+                    logging.info(
+                        "[radar] frames received=%d dropped=%d late=%d stale=%d max_processing_lag=%.3fs",
+                        stats["received"], stats["dropped"], stats["late"], stats["stale"],
+                        stats["max_processing_lag_s"],
+                    )
+                if self.adaptive:
+                    modes = self.mode_stats()
+                    logging.info(
+                        "[radar] mode=%s active=%.0fs idle=%.0fs switches=%d",
+                        modes["mode"], modes["active_s"], modes["idle_s"], modes["switches"],
+                    )
+
+            frame = pipeline.frames.get(timeout=0.5)
+            if frame is None:
+                continue
+            # read before the session check: _start_session bumps the session before swapping these
+            processor, mode = pipeline.processor, self._mode
+            if frame.session != self._session or processor is None:
+                self._frames_stale += 1
+                continue
+
+            result = frame.result
+            try:
+                processor_result = processor.process(result)
+            except Exception as e:
+                logging.warning("[radar] sensor %d processing error, reconnecting: %s", pipeline.sensor_id, e)
+                self._reconnect_requested = True
+                continue
+            self._max_processing_lag_s = max(self._max_processing_lag_s, time.monotonic() - frame.received_s)
+
+            if mode == MODE_IDLE:
+                presence = processor_result
+                breathing_result = None
+                app_state = "PRESENCE_ONLY"
+            else:
+                presence = processor_result.presence_result
+                breathing_result = processor_result.breathing_result
+                app_state = processor_result.app_state.name
             presence_distance = presence.presence_distance
             activity = max(presence.intra_presence_score, presence.inter_presence_score)
-            distance_ok = self.min_presence_distance_m < presence_distance < self.max_presence_distance_m
+            distance_ok = pipeline.start_m < presence_distance < pipeline.end_m
             presence_valid = presence.presence_detected and distance_ok
-            motion_active = presence_valid and activity >= self.motion_activity_threshold
-            now_s = time.time()
+            now_s = self._clock.time()
+
+            self._update_presence(pipeline, frame.connection, mode, presence_valid, now_s, presence_distance,
+                                  activity)
+
+            temperature_c = result.temperature
+
+            breathing_rate = None
+            if breathing_result is not None:
+                breathing_rate = breathing_result.breathing_rate
+            if not presence_valid:
+                breathing_rate = None
+
+            pipeline.app_state = app_state
+            pipeline.history.append(
+                now_s,
+                activity,
+                temperature_c,
+                presence_distance if presence_valid else np.nan,
+                np.nan if breathing_rate is None else breathing_rate,
+                presence_valid,
+                presence.presence_detected,
+                presence.intra_presence_score,
+                presence.inter_presence_score,
+            )
+            if self.telemetry is not None:
+                self.telemetry.publish({
+                    field["radar_activity"]: activity,
+                    field["radar_temperature"]: temperature_c,
+                    field["radar_presence"]: presence_valid,
+                    field["radar_distance_m"]: presence_distance if presence_valid else None,
+                    field["radar_breathing_rate_bpm"]: breathing_rate,
+                    "radar_mode": mode,
+                })
+
+    def _update_presence(self, pipeline: SensorPipeline, connection: int, mode: Optional[str],
+                         presence_valid: bool, now_s: float, presence_distance: float, activity: float) -> None:
+        """Fold one sensor's presence into the combined presence and fire the motion trigger on its rising edge."""
+        with self._presence_lock:
+            if connection != self._edge_connection:
+                # new connection: edge detection starts from scratch (a mode switch keeps it)
+                self._edge_connection = connection
+                self._motion_active_prev = None
+                self._motion_low_since_s = None
+                for other in self.sensors.values():
+                    other.presence_active = False
+            pipeline.presence_active = presence_valid
+            presence_active = any(other.presence_active for other in self.sensors.values())
 
             # Trigger only on rising edge of presence (low->high),
             # and only if presence was low for a full 60s.
-            presence_active = presence_valid
             if self._motion_active_prev is not None and presence_active and not self._motion_active_prev:
                 low_duration_s = (
                     now_s - self._motion_low_since_s
@@ -275,10 +887,12 @@ class Radar:
                 )
                 if self._motion_low_since_s is not None and low_duration_s >= 60.0:
                     logging.info(
-                        "[radar] motion rising edge detected at distance=%.3fm activity=%.3f",
+                        "[radar] motion rising edge detected by sensor %d at distance=%.3fm activity=%.3f",
+                        pipeline.sensor_id,
                         presence_distance,
                         activity,
                     )
+                    self._presence_trigger_time = now_s
                     self._presence_event.set()
                 else:
                     logging.info(
@@ -292,46 +906,19 @@ class Radar:
                 self._motion_low_since_s = now_s
             self._motion_active_prev = presence_active
 
-            temperature_c = result.temperature
-
-            breathing_rate = None
-            if processor_result.breathing_result is not None:
-                breathing_rate = processor_result.breathing_result.breathing_rate
-            if not presence_valid:
-                breathing_rate = None
-
-            sample = Sample(
-                timestamp_s=time.time(),
-                activity=activity,
-                temperature=temperature_c,
-                app_state=processor_result.app_state.name,
-                presence_detected=presence.presence_detected,
-                presence_distance_m=presence.presence_distance,
-                intra_presence_score=presence.intra_presence_score,
-                inter_presence_score=presence.inter_presence_score,
-                breathing_rate_bpm=breathing_rate,
-            )
-            with self._latest_lock:
-                self._latest = sample
-            with self._accum_lock:
-                self._accum["count"] += 1
-                self._accum["activity_sum"] += activity
-                self._accum["temp_sum"] += temperature_c
-                if presence_valid:
-                    self._accum["distance_sum"] += presence_distance
-                    self._accum["distance_count"] += 1
-                if breathing_rate is not None:
-                    self._accum["bpm_sum"] += breathing_rate
-                    self._accum["bpm_count"] += 1
-                if presence_valid:
-                    self._accum["presence_any"] = True
+            if self.adaptive:
+                if mode == MODE_IDLE and presence_active:
+                    self._requested_mode = MODE_ACTIVE
+                elif (mode == MODE_ACTIVE and self._motion_low_since_s is not None
+                      and now_s - self._motion_low_since_s >= self.idle_after_s):
+                    self._requested_mode = MODE_IDLE
 
     def write_device_data_to_db(self, device_data, measurement=None):
         self.db_store.write_device_data(device_data, measurement=measurement)
 
         # Function to store sensor data in the database
 
-    def motion_detected_callback(self, _os=None):
+    def motion_detected_callback(self, _os=None, trigger_time: float | None = None):
 
         # Check if motion detection should be ignored
         if are_we_still_blocked():
@@ -341,73 +928,42 @@ class Radar:
             print("Motion detection ignored because IR LED is on.")
             return
 
-        current_time = time.time()
+        trigger_time = self._clock.time() if trigger_time is None else trigger_time
 
-        # Send an email only if at least 23 hours have passed since last successful send
-        email_throttle_seconds = 23 * 60 * 60
-        file_path = "last_email_sent.txt"
-        last_email_time = 0
+        # Capture first: pin the buffered footage and light the scene before anything slow happens.
+        # Save an image only if at least an hour has passed
+        if trigger_time - self.last_image_time >= 3600:
+            previous_image_time = self.last_image_time
+            self.last_image_time = trigger_time
+            pin = self.rtsp_recorder.pin_segments(
+                trigger_time,
+                post_trigger_seconds=self.capture_post_trigger_seconds,
+            )
+            ir_enabled_for_capture = self._ir_needed_for_capture()
+            if ir_enabled_for_capture:
+                turn_ir_on()
+            threading.Thread(
+                target=self._capture_live_photo,
+                args=(pin, ir_enabled_for_capture, previous_image_time),
+                name="radar_capture",
+                daemon=True,
+            ).start()
 
-        # Read existing timestamp
-        try:
-            with open(file_path, "r") as f:
-                content = f.readline().strip()
-                last_email_time = int(content) if content else 0
-        except (FileNotFoundError, ValueError):
-            last_email_time = 0
+        # Notifications run independently, so capture latency does not depend on the subscriber count.
+        threading.Thread(
+            target=self._send_motion_notifications,
+            args=(trigger_time,),
+            name="radar_notify",
+            daemon=True,
+        ).start()
 
-        if current_time - last_email_time >= email_throttle_seconds:
-            sent_count = 0
-            try:
-                csv_file = 'newsletter_subscribers.csv'
-                with open(csv_file, mode='r') as file:
-                    reader = csv.reader(file)
-                    subscribers = list(reader)
-                    for subscriber in subscribers:
-                        if not subscriber:
-                            continue
-                        email = subscriber[0].strip()
-                        if not email:
-                            continue
-
-                        encoded_email = encode_email(email)
-                        base_url = "https://voegeli.linusleo.synology.me"
-                        unsubscribe_link = f"{base_url}/unsubscribe/{encoded_email}/"
-                        email_body = (
-                            "Hoi Du!<br>"
-                            "I just came back and entered my birdhouse!<br>"
-                            f"Check me out at {base_url}<br>"
-                            "Best Regards, Your Vögeli<br><br>"
-                            f'<a href="{unsubscribe_link}">Unsubscribe</a>'
-                        )
-
-                        try:
-                            self.email_reporter.send_mail(
-                                email_body,
-                                subject="Vögeli Motion Alert",
-                                recipients=email,
-                                is_html=True,
-                            )
-                            sent_count += 1
-                        except Exception:
-                            logging.exception("Failed to send motion email to %s.", email)
-            except FileNotFoundError:
-                logging.info("No newsletter_subscribers.csv found, skipping motion email.")
-
-            if sent_count > 0:
-                with open(file_path, "w") as f:
-                    f.write(str(int(current_time)))
-                logging.info("Sent %d motion notification email(s).", sent_count)
-            else:
-                logging.info("No motion emails sent; last_email_sent not updated.")
-        else:
-            remaining = int(email_throttle_seconds - (current_time - last_email_time))
-            logging.info("Motion email throttled for %ds.", max(0, remaining))
+        print("Motion detected! Data stored.")
 
-        # Save an image only if at least an hour has passed
-        if current_time - self.last_image_time >= 3600:
-            ir_enabled_for_capture = False
-            latest_lux = None
+    def _ir_needed_for_capture(self) -> bool:
+        latest_lux = None
+        if self.telemetry is not None:
+            latest_lux = self.telemetry.snapshot().get("luminosity")
+        if latest_lux is None:
             try:
                 latest_lux = self.db_store.query_last(
                     data_since="5m",
@@ -417,47 +973,114 @@ class Radar:
             except Exception:
                 logging.exception("Failed to read latest luminosity for IR gating.")
 
-            if isinstance(latest_lux, (int, float)) and latest_lux > 2000:
-                logging.info(
-                    "Skipping IR for automated picture: luminosity %.2f lux > 2000 lux.",
-                    float(latest_lux),
-                )
-            else:
-                turn_ir_on()
-                ir_enabled_for_capture = True
-                time.sleep(3)
-
-            timestamp = bern_image_timestamp()
-
-            try:
-                live_photo = self.rtsp_recorder.export_live_photo(
-                    timestamp=timestamp,
-                    output_dir="gallery",
-                )
-                if live_photo.warning:
-                    logging.warning("Radar live image %s warning: %s", timestamp, live_photo.warning)
-                self.last_image_time = current_time
-                upload_live_photo(
-                    live_photo_result=live_photo,
-                    token=self.upload_image_token,
-                    url=self.upload_image_url,
-                )
-                if live_photo.still_path is not None:
-                    live_photo.still_path.unlink(missing_ok=True)
-                if live_photo.motion_path is not None:
-                    live_photo.motion_path.unlink(missing_ok=True)
-            except subprocess.CalledProcessError as e:
-                logging.error(f"Failed to capture image: {e.stderr}")
-                print(f"Failed to capture image from MediaMTX server: {e}")
-            except UploadImageError as e:
-                logging.error("Failed to upload radar live image: %s", e)
-            except subprocess.TimeoutExpired:
-                logging.error("Timed out while capturing live image.")
+        if isinstance(latest_lux, (int, float)) and latest_lux > 2000:
+            logging.info(
+                "Skipping IR for automated picture: luminosity %.2f lux > 2000 lux.",
+                float(latest_lux),
+            )
+            return False
+        return True
 
+    def _capture_live_photo(self, pin, ir_enabled_for_capture: bool, previous_image_time: float) -> None:
+        timestamp = bern_image_timestamp()
+        captured = False
+        try:
+            live_photo = self.rtsp_recorder.export_live_photo(
+                timestamp=timestamp,
+                output_dir="gallery",
+                pinned=pin,
+            )
+            if live_photo.warning:
+                logging.warning("Radar live image %s warning: %s", timestamp, live_photo.warning)
+            captured = True
+            self.upload_outbox.enqueue(live_photo)
+        except subprocess.CalledProcessError as e:
+            logging.error(f"Failed to capture image: {e.stderr}")
+            print(f"Failed to capture image from MediaMTX server: {e}")
+        except OSError as e:
+            logging.error("Failed to queue radar live image for upload: %s", e)
+        except subprocess.TimeoutExpired:
+            logging.error("Timed out while capturing live image.")
+        except Exception:
+            logging.exception("Failed to capture radar live image.")
+        finally:
             if ir_enabled_for_capture:
                 turn_ir_off()
+            if not captured:
+                # let the next trigger try again instead of waiting an hour
+                self.last_image_time = previous_image_time
 
-        print("Motion detected! Data stored.")
+    def _send_motion_notifications(self, current_time: float) -> None:
+        # a trigger during a running campaign is dropped; that campaign already covers it
+        if not self._notify_lock.acquire(blocking=False):
+            logging.info("Motion email already being sent; trigger ignored.")
+            return
+        try:
+            self._send_motion_campaign(current_time)
+        finally:
+            self._notify_lock.release()
+
+    @staticmethod
+    def _last_email_time() -> int:
+        try:
+            with open(LAST_EMAIL_FILE, "r") as f:
+                content = f.readline().strip()
+                return int(content) if content else 0
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    def _record_motion_emails(self, result: CampaignResult) -> None:
+        # the throttle runs from when the alert was raised, also for a campaign resumed after a restart
+        if result.sent > 0:
+            if result.created > self._last_email_time():
+                with open(LAST_EMAIL_FILE, "w") as f:
+                    f.write(str(int(result.created)))
+            logging.info("Sent %d motion notification email(s).", result.sent)
+        else:
+            logging.info("No motion emails sent; last_email_sent not updated.")
+
+    def _send_motion_campaign(self, current_time: float) -> None:
+        # Send an email only if at least 23 hours have passed since last successful send
+        email_throttle_seconds = 23 * 60 * 60
+        last_email_time = self._last_email_time()
+
+        if current_time - last_email_time < email_throttle_seconds:
+            remaining = int(email_throttle_seconds - (current_time - last_email_time))
+            logging.info("Motion email throttled for %ds.", max(0, remaining))
+            return
+
+        campaign = Campaign(
+            campaign_id=f"motion-{int(current_time)}",
+            subject="Vögeli Motion Alert",
+            html_template=(
+                "Hoi Du!<br>"
+                "I just came back and entered my birdhouse!<br>"
+                f"Check me out at {NEWSLETTER_BASE_URL}<br>"
+                "Best Regards, Your Vögeli<br><br>"
+                '<a href="{unsubscribe_link}">Unsubscribe</a>'
+            ),
+            created=current_time,
+        )
+        self._record_motion_emails(self.notifications.send(campaign, self._notification_recipients()))
+
+    def _notification_recipients(self) -> list[tuple[str, str]]:
+        # rebuilt only when the subscriber store hands out a new snapshot
+        subscribers = self.subscribers.recipients()
+        if subscribers is not self._recipients_source:
+            self._recipients = [
+                (email, f"{NEWSLETTER_BASE_URL}/unsubscribe/{token}/") for email, token in subscribers
+            ]
+            self._recipients_source = subscribers
+        return self._recipients
+
+    def _resume_notifications(self) -> None:
+        # holds the alert slot, so a motion edge during startup cannot start a second campaign meanwhile
+        with self._notify_lock:
+            try:
+                for result in self.notifications.resume_pending(self._notification_recipients):
+                    self._record_motion_emails(result)
+            except Exception:
+                logging.exception("Failed to resume pending motion notifications.")
 
     def _presence_watcher(self) -> None:
         while not self._stop_event.is_set():
@@ -466,36 +1089,38 @@ class Radar:
                 break
             self._presence_event.clear()
             try:
-                self.motion_detected_callback()
+                self.motion_detected_callback(trigger_time=self._presence_trigger_time)
             except Exception:
                 logging.exception("Unhandled exception in motion_detected_callback.")
 
-    def store_radar_data(self, _state, presence_detected, presence_distance_m, breathing_rate_bpm, activity,
-                         temperature):
-
-        if presence_distance_m is not None:
-            presence_distance_m = float(presence_distance_m)
-        if activity is not None:
-            activity = float(activity)
-        if temperature is not None:
-            temperature = float(temperature)
-        if breathing_rate_bpm is not None:
-            breathing_rate_bpm = float(breathing_rate_bpm)
+    @staticmethod
+    def radar_fields(stats: dict, suffix: str = "") -> dict:
+        """Database fields for one sensor's window statistics; ``suffix`` is appended to every field name."""
+        fields = (
+            ('activity', stats["activity_mean"], 'score'),
+            ('radar_inside_temperature', stats["temperature_mean"], 'Celsius'),
+            ('breathing_rate', stats["bpm_mean"], 'bpm'),
+            ('object_distance', stats["distance_mean_m"], 'm'),
+            ('motion', stats["presence_any"], None),
+            ('activity_max', stats["activity_max"], 'score'),
+            ('activity_p90', stats["activity_p90"], 'score'),
+            ('presence_duty_cycle', stats["presence_duty_cycle"], 'fraction'),
+        )
+        data = {}
+        for name, value, unit in fields:
+            data[name + suffix] = value
+            if unit is not None:
+                data[f"{name}{suffix}_unit"] = unit
+        return data
 
+    def store_radar_data(self, stats_by_sensor: dict[int, dict]):
+        """Write every sensor's window statistics in one batch; the primary sensor keeps the legacy field names."""
+        data = {}
+        for sid, stats in stats_by_sensor.items():
+            data.update(self.radar_fields(stats, self.sensors[sid].field_suffix))
         device_data = {
             'device': 'voegeli',
-            'data': {
-                # radar data
-                'activity': activity,
-                'activity_unit': 'score',
-                'radar_inside_temperature': temperature,
-                'radar_inside_temperature_unit': 'Celsius',
-                'breathing_rate': breathing_rate_bpm,
-                'breathing_rate_unit': 'bpm',
-                'object_distance': presence_distance_m,
-                'object_distance_unit': 'm',
-                'motion': presence_detected,
-            }
+            'data': data,
         }
 
         try:
@@ -504,43 +1129,21 @@ class Radar:
             logging.warning(f"Database connection error, skipping this update: {e}")
 
     def _writer(self) -> None:
-        next_write = time.time()
+        next_write = self._clock.time()
+        seqs = {sid: pipeline.history.count for sid, pipeline in self.sensors.items()}
         while not self._stop_event.is_set():
-            now = time.time()
+            now = self._clock.time()
             if now < next_write:
-                time.sleep(min(0.05, next_write - now))
+                self._clock.sleep(min(0.05, next_write - now))
                 continue
-            with self._accum_lock:
-                accum = self._accum
-                self._accum = {
-                    "count": 0,
-                    "activity_sum": 0.0,
-                    "temp_sum": 0.0,
-                    "distance_sum": 0.0,
-                    "distance_count": 0,
-                    "bpm_sum": 0.0,
-                    "bpm_count": 0,
-                    "presence_any": False,
-                }
-            with self._latest_lock:
-                sample = self._latest
-            if accum["count"] > 0 and sample is not None:
-                avg_activity = accum["activity_sum"] / accum["count"]
-                avg_temp = accum["temp_sum"] / accum["count"]
-                avg_distance = (
-                    accum["distance_sum"] / accum["distance_count"]
-                    if accum["distance_count"] > 0
-                    else None
-                )
-                avg_bpm = (
-                    accum["bpm_sum"] / accum["bpm_count"]
-                    if accum["bpm_count"] > 0
-                    else None
-                )
-                presence_any = accum["presence_any"]
-
-                self.store_radar_data(sample.app_state, presence_any, avg_distance,
-                                      avg_bpm, avg_activity, avg_temp)
+            stats_by_sensor = {}
+            for sid, pipeline in self.sensors.items():
+                window, seqs[sid] = pipeline.history.since(seqs[sid])
+                stats = RadarHistory.aggregate(window)
+                if stats is not None:
+                    stats_by_sensor[sid] = stats
+            if stats_by_sensor:
+                self.store_radar_data(stats_by_sensor)
             next_write += self.write_period_s
 
 
@@ -0,0 +1,327 @@
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import math
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Iterable, Iterator
+
+import attrs
+import numpy as np
+from acconeer.exptool import a121
+
+from notifications import NotificationWorker
+from radar import Radar
+from subscribers import SubscriberStore
+
+# Hardware-free driver for radar.Radar.
+#
+# ReplayClient implements the part of a121.Client that Radar uses (open, setup_session,
+# start_session, get_next, stop_session, close) and serves frames from RadarFrameRecorder .npy
+# files or from a synthetic scene, paced by a ReplayClock that can run faster than real time.
+# Passing the clock to Radar as well keeps the rising-edge rule (60 s of low presence) and the
+# _writer aggregation period in replay time, so a whole evening of recordings runs in minutes.
+#
+#   python3 radar_replay.py --synthetic 900 --speed 50
+#   python3 radar_replay.py radar_recordings/radar_*.npy --speed 20
+
+_A121_WAVELENGTH_M = 0.005
+_POINT_SPACING_M = 0.0025
+
+
+class ReplayFinished(Exception):
+    pass
+
+
+class ReplayClock:
+    """Replay time: starts at ``start_s`` and runs ``speed`` times faster than the wall clock."""
+
+    def __init__(self, start_s: float | None = None, speed: float = 1.0):
+        if speed <= 0:
+            raise ValueError("speed must be positive")
+        self.start_s = time.time() if start_s is None else start_s
+        self.speed = speed
+        self._t0 = time.monotonic()
+
+    def time(self) -> float:
+        return self.start_s + (time.monotonic() - self._t0) * self.speed
+
+    def sleep(self, seconds: float) -> None:
+        time.sleep(max(0.0, seconds) / self.speed)
+
+
+@dataclass
+class ReplayResult:
+    """Duck-typed stand-in for a121.Result with the attributes the processors read."""
+    frame: np.ndarray
+    temperature: int
+    tick: int
+    data_saturated: bool = False
+    frame_delayed: bool = False
+    calibration_needed: bool = False
+
+    @property
+    def subframes(self) -> list[np.ndarray]:
+        return [self.frame]
+
+
+@dataclass
+class Visit:
+    """A synthetic bird: present from ``start_s`` to ``end_s`` at ``distance_m``, breathing at ``bpm``."""
+    start_s: float
+    end_s: float
+    distance_m: float = 0.2
+    bpm: float = 90.0
+
+
+def point_distances(sensor_config: a121.SensorConfig) -> np.ndarray:
+    return (sensor_config.start_point + np.arange(sensor_config.num_points) * sensor_config.step_length) \
+        * _POINT_SPACING_M
+
+
+def synthetic_metadata(sensor_config: a121.SensorConfig) -> a121.Metadata:
+    num_points = sensor_config.num_points
+    known = {
+        "frame_data_length": sensor_config.sweeps_per_frame * num_points,
+        "sweep_data_length": num_points,
+        "subsweep_data_offset": np.array([0]),
+        "subsweep_data_length": np.array([num_points]),
+        "calibration_temperature": 25,
+        "tick_period": 50,
+        "base_step_length_m": _POINT_SPACING_M,
+        "max_sweep_rate": 10000.0,
+        "high_speed_mode": True,
+    }
+    # only pass the fields this exptool version's Metadata actually has
+    names = {field.name for field in attrs.fields(a121.Metadata)}
+    return a121.Metadata(**{name: value for name, value in known.items() if name in names})
+
+
+def synthetic_frames(sensor_config: a121.SensorConfig, frame_rate: float, duration_s: float,
+                     visits: Iterable[Visit], *, seed: int = 0) -> Iterator[tuple[int, np.ndarray]]:
+    """
+    Static clutter plus noise, and during each visit a reflector that moves in over the first
+    second and then only shows a breathing-sized (0.3 mm) displacement.
+    """
+    rng = np.random.default_rng(seed)
+    distances = point_distances(sensor_config)
+    sweeps = sensor_config.sweeps_per_frame
+    clutter = (rng.normal(0, 150, distances.size) + 1j * rng.normal(0, 150, distances.size))
+    visits = list(visits)
+    for index in range(int(duration_s * frame_rate)):
+        t = index / frame_rate
+        frame = np.broadcast_to(clutter, (sweeps, distances.size)).copy()
+        frame += rng.normal(0, 15, frame.shape) + 1j * rng.normal(0, 15, frame.shape)
+        for visit in visits:
+            if not visit.start_s <= t < visit.end_s:
+                continue
+            since_entry = t - visit.start_s
+            # entering: slide in from the far end of the range over one second, hopping around a bit
+            approach = max(0.0, 1.0 - since_entry) * (distances[-1] - visit.distance_m)
+            jitter = rng.normal(0, 0.002, sweeps) if since_entry < 1.0 else np.zeros(sweeps)
+            breathing = 0.0003 * math.sin(2 * math.pi * visit.bpm / 60.0 * t)
+            position = visit.distance_m + approach + breathing + jitter
+            envelope = np.exp(-((distances[None, :] - position[:, None]) / 0.03) ** 2)
+            phase = 4 * math.pi * position / _A121_WAVELENGTH_M
+            frame += 900 * envelope * np.exp(1j * phase)[:, None]
+        yield 25, np.round(frame.real) + 1j * np.round(frame.imag)
+
+
+def recorded_frames(paths: Iterable[Path]) -> Iterator[tuple[int, np.ndarray]]:
+    """
+    Frames from RadarFrameRecorder files, in file order, skipping unfilled rows: those past the
+    sidecar's count and, for files without one, from the first row that was never written (t == 0).
+    """
+    for path in paths:
+        path = Path(path)
+        sidecar = path.with_suffix(".json")
+        filled = json.loads(sidecar.read_text())["frames"] if sidecar.exists() else None
+        data = np.load(path, mmap_mode="r")
+        for row in data[:filled]:
+            if row["t"] == 0:
+                break
+            yield int(row["temperature"]), np.asarray(row["frame"], dtype=np.complex128)
+
+
+class ReplayClient:
+    """Serves frames to Radar in place of a121.Client, paced by a ReplayClock."""
+
+    def __init__(self, frames: Iterator[tuple[int, np.ndarray]], clock: ReplayClock, *, frame_rate: float):
+        self._frames = frames
+        self.clock = clock
+        self.frame_period_s = 1.0 / frame_rate
+        self.frames_served = 0
+        self.finished = threading.Event()
+        self._closed = False
+        self._started = False
+        self._next_due_s = clock.time()
+        self._sensor_ids: list[int] = []
+        self._extended = False
+
+    @classmethod
+    def factory(cls, frames: Iterator[tuple[int, np.ndarray]], clock: ReplayClock, *, frame_rate: float):
+        """A Radar client_factory that hands out one replay; reconnects after it ends are refused."""
+        clients: list[ReplayClient] = []
+
+        def open_client(**_kwargs) -> ReplayClient:
+            if clients and clients[0].finished.is_set():
+                raise ConnectionError("replay finished")
+            if not clients:
+                clients.append(cls(frames, clock, frame_rate=frame_rate))
+            clients[0]._closed = False
+            return clients[0]
+
+        open_client.clients = clients
+        return open_client
+
+    def setup_session(self, session_config: a121.SessionConfig):
+        self._sensor_ids = list(session_config.groups[0])
+        self._extended = session_config.extended
+        metadata = {sid: synthetic_metadata(config) for sid, config in session_config.groups[0].items()}
+        return [metadata] if self._extended else metadata[self._sensor_ids[0]]
+
+    def start_session(self) -> None:
+        self._started = True
+        self._next_due_s = self.clock.time()
+
+    def get_next(self):
+        if not self._started or self._closed:
+            raise ConnectionError("session not started")
+        try:
+            temperature, frame = next(self._frames)
+        except StopIteration:
+            self.finished.set()
+            raise ReplayFinished("no more frames") from None
+        wait_s = self._next_due_s - self.clock.time()
+        if wait_s > 0:
+            self.clock.sleep(wait_s)
+        self._next_due_s += self.frame_period_s
+        self.frames_served += 1
+        result = ReplayResult(frame=frame, temperature=temperature, tick=self.frames_served)
+        if not self._extended:
+            return result
+        # recordings hold one sensor; every sensor of a multi-sensor session sees the same frames
+        return [{sid: result for sid in self._sensor_ids}]
+
+    def stop_session(self) -> None:
+        self._started = False
+
+    def close(self) -> None:
+        self._closed = True
+
+
+class _NullStore:
+    bucket = "replay"
+
+    def __init__(self):
+        self.writes: list[dict] = []
+
+    def write_device_data(self, device_data, measurement=None):
+        self.writes.append(device_data)
+
+    def query_last(self, **_kwargs):
+        return None
+
+    def close(self):
+        pass
+
+
+class _NullService:
+    """Stands in for the RTSP recorder and the upload outbox, which a replay never uses."""
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+
+class _NullTransport:
+    """Alert e-mails from a replay go nowhere."""
+
+    def send(self, recipient, subject, html_body, unsubscribe_link):
+        pass
+
+    def close(self):
+        pass
+
+
+class ReplayRadar(Radar):
+    """Full Radar pipeline with triggers and database writes recorded instead of acted on."""
+
+    def __init__(self, **kwargs):
+        self.triggers: list[float] = []
+        # a journal dir of its own, so a replay never resumes the deployment's notification_journal/
+        notifications = NotificationWorker(_NullTransport, journal_dir=tempfile.mkdtemp(prefix="radar-replay-"))
+        super().__init__(db_store=_NullStore(), recorder=_NullService(), outbox=_NullService(),
+                         subscribers=SubscriberStore(":memory:", legacy_csv=None), notifications=notifications,
+                         env_file=str(Path(tempfile.gettempdir()) / "radar_replay.env"), **kwargs)
+
+    def motion_detected_callback(self, _os=None, trigger_time: float | None = None):
+        self.triggers.append(self._clock.time() if trigger_time is None else trigger_time)
+        logging.info("[replay] motion trigger at replay time %.1fs", self.triggers[-1] - self._clock.start_s)
+
+
+def run_replay(frames: Iterator[tuple[int, np.ndarray]], *, speed: float, frame_rate: float = 30.0) -> dict:
+    clock = ReplayClock(speed=speed)
+    factory = ReplayClient.factory(frames, clock, frame_rate=frame_rate)
+    radar = ReplayRadar(client_factory=factory, clock=clock, frame_rate=frame_rate)
+    started = time.perf_counter()
+    radar.run()
+    try:
+        while not (factory.clients and factory.clients[0].finished.is_set()):
+            time.sleep(0.1)
+        # let the processing stage drain the ring buffer
+        while radar.frame_stats()["queued"]:
+            time.sleep(0.05)
+        elapsed_s = time.perf_counter() - started
+    finally:
+        radar.stop()
+
+    served = factory.clients[0].frames_served
+    stats = radar.frame_stats()
+    return {
+        "frames": served,
+        "replay_seconds": served / frame_rate,
+        "wall_seconds": elapsed_s,
+        "speedup": served / frame_rate / elapsed_s if elapsed_s else 0.0,
+        "frames_per_s": served / elapsed_s if elapsed_s else 0.0,
+        "dropped": stats["dropped"],
+        "late": stats["late"],
+        "max_processing_lag_s": stats["max_processing_lag_s"],
+        "triggers_s": [round(t - clock.start_s, 2) for t in radar.triggers],
+        "db_writes": len(radar.db_store.writes),
+        "modes": radar.mode_stats(),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay recorded or synthetic A121 frames through Radar.")
+    parser.add_argument("recordings", nargs="*", type=Path, help="RadarFrameRecorder .npy files")
+    parser.add_argument("--synthetic", type=float, default=None, metavar="SECONDS",
+                        help="replay a synthetic scene of this length instead of recordings")
+    parser.add_argument("--speed", type=float, default=20.0, help="replay speed relative to real time")
+    parser.add_argument("--frame-rate", type=float, default=30.0)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    if args.synthetic is not None:
+        # the synthetic scene has to match the sensor config Radar will set up with its defaults
+        defaults = dict(Radar.__init__.__kwdefaults__, frame_rate=args.frame_rate)
+        config, _ = Radar._create_sensor_config(SimpleNamespace(**defaults))
+        scene = [Visit(120.0, 240.0), Visit(420.0, 480.0, distance_m=0.25, bpm=70.0)]
+        source = synthetic_frames(config, args.frame_rate, args.synthetic, scene)
+    elif args.recordings:
+        source = recorded_frames(sorted(args.recordings))
+    else:
+        parser.error("pass recording files or --synthetic SECONDS")
+
+    report = run_replay(source, speed=args.speed, frame_rate=args.frame_rate)
+    print(json.dumps(report, indent=2))
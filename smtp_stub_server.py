@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+import argparse
+import logging
+import socketserver
+import threading
+import time
+
+# Local stand-in for an SMTP relay, for exercising notifications.py without sending real mail.
+# It speaks the plain-text subset smtplib uses (EHLO/HELO, MAIL, RCPT, DATA, RSET, NOOP, QUIT),
+# accepts any credentials-free session, and keeps every delivered message in memory. It can hang
+# up after every Nth message and reject chosen recipients, to check that a campaign resumes
+# without duplicates.
+
+
+class SmtpStubHandler(socketserver.StreamRequestHandler):
+    server: "SmtpStubServer"
+
+    def _reply(self, line: str) -> None:
+        self.wfile.write(line.encode() + b"\r\n")
+        self.wfile.flush()
+
+    def handle(self):
+        self.server.count_connection()
+        self._reply("220 smtp-stub ready")
+        mail_from = None
+        rcpts: list[str] = []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command, _, argument = line.decode(errors="replace").strip().partition(" ")
+            command = command.upper()
+            if command == "EHLO":
+                self._reply("250-smtp-stub")
+                self._reply("250-8BITMIME")
+                self._reply("250 SMTPUTF8")
+            elif command == "HELO":
+                self._reply("250 smtp-stub")
+            elif command == "MAIL":
+                mail_from, rcpts = _address(argument), []
+                self._reply("250 OK")
+            elif command == "RCPT":
+                rcpt = _address(argument)
+                if rcpt in self.server.reject:
+                    self._reply("550 no such user")
+                else:
+                    rcpts.append(rcpt)
+                    self._reply("250 OK")
+            elif command == "DATA":
+                if mail_from is None or not rcpts:
+                    self._reply("503 need MAIL and RCPT first")
+                    continue
+                self._reply("354 end data with <CR><LF>.<CR><LF>")
+                data = self._read_data()
+                if data is None:
+                    return
+                if self.server.should_drop():
+                    # simulate a relay that gives up mid-session without accepting the message
+                    self._reply("421 closing connection")
+                    return
+                if self.server.delay_s:
+                    time.sleep(self.server.delay_s)
+                self.server.deliver(mail_from, rcpts, data)
+                mail_from, rcpts = None, []
+                self._reply("250 OK queued")
+            elif command == "RSET":
+                mail_from, rcpts = None, []
+                self._reply("250 OK")
+            elif command == "NOOP":
+                self._reply("250 OK")
+            elif command == "QUIT":
+                self._reply("221 bye")
+                return
+            else:
+                self._reply("502 command not implemented")
+
+    def _read_data(self) -> bytes | None:
+        lines = []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return None
+            if line in (b".\r\n", b".\n"):
+                return b"".join(lines)
+            # dot-stuffing
+            lines.append(line[1:] if line.startswith(b"..") else line)
+
+
+def _address(argument: str) -> str:
+    _, _, rest = argument.partition(":")
+    return rest.split()[0].strip("<>").lower() if rest.strip() else ""
+
+
+class SmtpStubServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, *, drop_every: int = 0, reject: set[str] | None = None, delay_s: float = 0.0):
+        super().__init__(address, SmtpStubHandler)
+        self.drop_every = drop_every
+        self.reject = {address.lower() for address in reject or ()}
+        self.delay_s = delay_s
+        self.lock = threading.Lock()
+        self.received: list[dict] = []
+        self.connections = 0
+        self._message_counter = 0
+
+    @property
+    def port(self) -> int:
+        return self.server_address[1]
+
+    def count_connection(self) -> None:
+        with self.lock:
+            self.connections += 1
+
+    def should_drop(self) -> bool:
+        with self.lock:
+            self._message_counter += 1
+            return self.drop_every > 0 and self._message_counter % self.drop_every == 0
+
+    def deliver(self, mail_from: str, rcpts: list[str], data: bytes) -> None:
+        with self.lock:
+            self.received.append({"from": mail_from, "to": rcpts, "data": data})
+
+
+def run_stub_server(*, ip: str = "127.0.0.1", port: int = 0, drop_every: int = 0, reject: set[str] | None = None,
+                    delay_s: float = 0.0) -> SmtpStubServer:
+    """Start the stand-in server on a daemon thread; port 0 picks a free port (see ``server.port``)."""
+    server = SmtpStubServer((ip, port), drop_every=drop_every, reject=reject, delay_s=delay_s)
+    threading.Thread(target=server.serve_forever, name="smtp_stub", daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stand-in SMTP relay and motion-alert fan-out check.")
+    parser.add_argument("-n", "--subscribers", type=int, default=2000)
+    parser.add_argument("--connections", type=int, default=4)
+    parser.add_argument("--drop-every", type=int, default=250, help="hang up on every Nth message")
+    parser.add_argument("--delay-ms", type=float, default=0.0, help="simulated relay latency per message")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    import tempfile
+    from notifications import Campaign, NotificationWorker, SmtpTransport
+
+    stub = run_stub_server(drop_every=args.drop_every, delay_s=args.delay_ms / 1000.0)
+    worker = NotificationWorker(
+        lambda: SmtpTransport("127.0.0.1", stub.port, sender="voegeli@localhost", security="none"),
+        max_connections=args.connections,
+        journal_dir=tempfile.mkdtemp(prefix="notify-journal-"),
+        retry_delay_s=0.0,
+    )
+    recipients = [(f"bird{i}@example.org", f"https://example.org/unsubscribe/{i}/") for i in range(args.subscribers)]
+    campaign = Campaign("selftest", "Vögeli Motion Alert", "Hoi Du!<br>{unsubscribe_link}")
+    result = worker.send(campaign, recipients)
+
+    delivered = [rcpt for message in stub.received for rcpt in message["to"]]
+    assert sorted(delivered) == sorted(email for email, _ in recipients), "missing or duplicate deliveries"
+    print(f"OK: {result.sent} messages over {stub.connections} connections in {result.elapsed_s:.2f}s "
+          f"({result.sent / result.elapsed_s:.0f} msg/s), no duplicates despite dropped sessions")
+    stub.shutdown()
@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import csv
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Callable
+
+from encoding import encode_email
+
+# Newsletter subscribers, shared by the command handlers in main.py and the radar's motion alerts.
+#
+# The SQLite table is the durable copy; every add/remove is its own transaction. An in-memory dict
+# mirrors it, so add/remove/contains never scan anything, and the tuple handed to the notification
+# fan-out is rebuilt only after the subscriber list actually changed. A newsletter_subscribers.csv
+# from before this store is imported once and renamed to *.migrated.
+#
+# Each subscriber's unsubscribe token (encoding.encode_email) is computed when they subscribe and
+# stored next to the address, so sending an alert does no per-recipient encoding. If the ENCODING
+# key changes, the tokens are recomputed on the next start.
+
+
+class SubscriberStore:
+    def __init__(self, path: str | Path = "newsletter_subscribers.sqlite3",
+                 legacy_csv: str | Path | None = "newsletter_subscribers.csv",
+                 token_for: Callable[[str], str] = encode_email):
+        self.path = Path(path)
+        self.token_for = token_for
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS subscribers (email TEXT PRIMARY KEY, subscribed_at REAL NOT NULL)"
+            )
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(subscribers)")}
+            if "unsubscribe_token" not in columns:
+                self._conn.execute("ALTER TABLE subscribers ADD COLUMN unsubscribe_token TEXT")
+        # email -> unsubscribe token, in subscription order
+        self._emails: dict[str, str | None] = dict(
+            self._conn.execute("SELECT email, unsubscribe_token FROM subscribers ORDER BY subscribed_at, rowid")
+        )
+        self._snapshot: tuple[tuple[str, str], ...] | None = None
+        self._refresh_tokens()
+        if legacy_csv is not None:
+            self._migrate_csv(Path(legacy_csv))
+
+    def _refresh_tokens(self) -> None:
+        # a missing token, or a sample token that no longer matches, means a new store or a new key
+        sample = next(((email, token) for email, token in self._emails.items() if token is not None), None)
+        key_changed = sample is not None and self.token_for(sample[0]) != sample[1]
+        stale = [email for email, token in self._emails.items() if key_changed or token is None]
+        if not stale:
+            return
+        tokens = [(self.token_for(email), email) for email in stale]
+        with self._conn:
+            self._conn.executemany("UPDATE subscribers SET unsubscribe_token = ? WHERE email = ?", tokens)
+        for token, email in tokens:
+            self._emails[email] = token
+        logging.info("Computed unsubscribe tokens for %d newsletter subscriber(s).", len(tokens))
+
+    def _migrate_csv(self, csv_path: Path) -> None:
+        if not csv_path.exists():
+            return
+        with csv_path.open(newline="") as file:
+            emails = [row[0].strip() for row in csv.reader(file) if row and row[0].strip()]
+        now = time.time()
+        new = {email: self.token_for(email) for email in emails if email not in self._emails}
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO subscribers (email, subscribed_at, unsubscribe_token) VALUES (?, ?, ?)",
+                [(email, now, token) for email, token in new.items()],
+            )
+            self._emails.update(new)
+            self._snapshot = None
+        csv_path.rename(csv_path.with_name(csv_path.name + ".migrated"))
+        logging.info("Imported %d newsletter subscriber(s) from %s.", len(emails), csv_path)
+
+    def add(self, email: str) -> bool:
+        """Return False if the address was already subscribed."""
+        with self._lock:
+            if email in self._emails:
+                return False
+            token = self.token_for(email)
+            with self._conn:
+                self._conn.execute(
+                    "INSERT OR IGNORE INTO subscribers (email, subscribed_at, unsubscribe_token) VALUES (?, ?, ?)",
+                    (email, time.time(), token),
+                )
+            self._emails[email] = token
+            self._snapshot = None
+            return True
+
+    def remove(self, email: str) -> bool:
+        """Return False if the address was not subscribed."""
+        with self._lock:
+            if email not in self._emails:
+                return False
+            with self._conn:
+                self._conn.execute("DELETE FROM subscribers WHERE email = ?", (email,))
+            del self._emails[email]
+            self._snapshot = None
+            return True
+
+    def __contains__(self, email: str) -> bool:
+        return email in self._emails
+
+    def __len__(self) -> int:
+        return len(self._emails)
+
+    def recipients(self) -> tuple[tuple[str, str], ...]:
+        """(email, unsubscribe token) in subscription order; the same tuple is returned until the list changes."""
+        with self._lock:
+            if self._snapshot is None:
+                self._snapshot = tuple(self._emails.items())
+            return self._snapshot
+
+    def emails(self) -> tuple[str, ...]:
+        return tuple(email for email, _token in self.recipients())
+
+    def unsubscribe_token(self, email: str) -> str | None:
+        return self._emails.get(email)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,98 @@
+import asyncio
+import re
+
+# Wire framing for the command server.
+#
+# Two framings are supported, chosen per connection by the first byte the client sends:
+#   - newline: each frame is terminated by "\n" (a trailing "\r" is ignored); this is what
+#     existing clients already send
+#   - length: each frame is b"\x00" followed by a 4-byte big-endian payload length and the payload
+# Base64 ciphertext never starts with a NUL byte, so the two cannot be confused.
+#
+# Inside a frame a command may carry a request id, "#<id> [CMD] ...". The reply to it is prefixed
+# with the same "#<id> ", so clients can pipeline several commands and match replies that arrive
+# out of order. Commands without an id are answered in order, exactly as before.
+
+FRAMING_NEWLINE = "newline"
+FRAMING_LENGTH = "length"
+MAX_FRAME_BYTES = 64 * 1024
+
+_LENGTH_MARKER = 0x00
+_LENGTH_HEADER_BYTES = 5
+_REQUEST_ID_RE = re.compile(r"^#([A-Za-z0-9_.-]{1,32}) (.*)$", re.DOTALL)
+
+
+class FrameError(ValueError):
+    pass
+
+
+class FrameReader:
+    """Buffered frame reassembly on top of an ``asyncio.StreamReader``."""
+
+    def __init__(self, reader: asyncio.StreamReader, max_frame_bytes: int = MAX_FRAME_BYTES):
+        self.reader = reader
+        self.max_frame_bytes = max_frame_bytes
+        self.framing: str | None = None
+        self._buffer = bytearray()
+
+    async def read_frame(self) -> bytes | None:
+        """Return the next complete frame, or None at end of stream (a trailing partial frame is discarded)."""
+        while True:
+            frame = self._next_buffered_frame()
+            if frame is not None:
+                return frame
+            chunk = await self.reader.read(4096)
+            if not chunk:
+                return None
+            self._buffer += chunk
+
+    def _next_buffered_frame(self) -> bytes | None:
+        while self._buffer:
+            if self.framing is None:
+                self.framing = FRAMING_LENGTH if self._buffer[0] == _LENGTH_MARKER else FRAMING_NEWLINE
+
+            if self.framing == FRAMING_LENGTH:
+                if len(self._buffer) < _LENGTH_HEADER_BYTES:
+                    return None
+                if self._buffer[0] != _LENGTH_MARKER:
+                    raise FrameError("missing length-prefix marker")
+                length = int.from_bytes(self._buffer[1:_LENGTH_HEADER_BYTES], "big")
+                if length > self.max_frame_bytes:
+                    raise FrameError(f"frame of {length} bytes exceeds {self.max_frame_bytes}")
+                end = _LENGTH_HEADER_BYTES + length
+                if len(self._buffer) < end:
+                    return None
+                frame = bytes(self._buffer[_LENGTH_HEADER_BYTES:end])
+                del self._buffer[:end]
+                return frame
+
+            newline = self._buffer.find(b"\n")
+            if newline < 0:
+                if len(self._buffer) > self.max_frame_bytes:
+                    raise FrameError(f"line exceeds {self.max_frame_bytes} bytes without a newline")
+                return None
+            frame = bytes(self._buffer[:newline]).rstrip(b"\r")
+            del self._buffer[:newline + 1]
+            if frame:
+                return frame
+            # skip empty lines and keep looking
+        return None
+
+
+def encode_frame(payload: bytes, framing: str | None) -> bytes:
+    if framing == FRAMING_LENGTH:
+        return bytes([_LENGTH_MARKER]) + len(payload).to_bytes(4, "big") + payload
+    if payload.endswith(b"\n"):
+        return payload
+    return payload + b"\n"
+
+
+def split_request_id(message: str) -> tuple[str | None, str]:
+    match = _REQUEST_ID_RE.match(message)
+    if match is None:
+        return None, message
+    return match.group(1), match.group(2)
+
+
+def with_request_id(request_id: str | None, message: str) -> str:
+    return message if request_id is None else f"#{request_id} {message}"
@@ -0,0 +1,339 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import multiprocessing
+import queue
+import random
+import resource
+import secrets
+import string
+import tempfile
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import psutil
+
+from command_dispatcher import CommandDispatcher
+from encryption import Cipher
+from tcp_framing import FrameReader, split_request_id
+from tcp_server import run_server
+
+# Load generator for tcp_server.CommandServer.
+#
+# The server runs in a child process, wired to a CommandDispatcher with stub handlers, so its CPU
+# time and thread count can be measured separately from the clients. The parent opens N asyncio
+# clients that each do the encrypted-IP handshake and then fire a mix of commands with request ids,
+# while the child broadcasts timestamped "[REP] LOADTEST <seq> <unix_s>" messages.
+
+# command -> relative weight; "SLOW" stands in for a blocking handler such as the IR filter pulse
+COMMAND_MIX = {
+    "[CMD] PING": 6,
+    "[CMD] GET IR STATE": 3,
+    "[CMD] SLOW": 1,
+}
+
+
+def _raise_fd_limit() -> None:
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+def _write_key_file(directory: Path) -> Path:
+    key = "".join(secrets.choice(string.ascii_letters + string.digits) for _ in range(16))
+    env_file = directory / "loadtest.env"
+    env_file.write_text(f"TCP_ENCRYPTION_KEY={key}\n")
+    return env_file
+
+
+def _stub_dispatcher(slow_handler_s: float) -> CommandDispatcher:
+    dispatcher = CommandDispatcher()
+    dispatcher.register("PING", lambda _argument, send_ack: send_ack("[ACK] PONG"))
+    dispatcher.register("GET IR STATE", lambda _argument, send_ack: send_ack("[ACK] IR STATE is OFF"))
+
+    def slow(_argument, send_ack):
+        time.sleep(slow_handler_s)
+        send_ack("[ACK] SLOW executed")
+
+    dispatcher.register("SLOW", slow, blocking=True)
+    return dispatcher
+
+
+def _serve(env_file: Path, full_encryption: bool, broadcast_hz: float, slow_handler_s: float,
+           slow_client_policy: str, conn) -> None:
+    """Child process: command server, stub command loop and broadcaster; exits when the parent says so."""
+    _raise_fd_limit()
+    # the server's per-connection INFO logging would dominate the measurement
+    logging.getLogger().setLevel(logging.WARNING)
+    tcp_cmd_queue, tcp_cmd_ack_queue, tcp_rep_queue = queue.Queue(), queue.Queue(), queue.Queue()
+    server = run_server(tcp_cmd_queue, tcp_cmd_ack_queue, tcp_rep_queue, env_file, True, full_encryption,
+                        ip="127.0.0.1", port=0, slow_client_policy=slow_client_policy)
+    dispatcher = _stub_dispatcher(slow_handler_s)
+
+    def command_loop():
+        # same shape as the loop in main.py
+        while True:
+            cmd, response_queue = tcp_cmd_queue.get()
+            dispatcher.dispatch(cmd, response_queue.put)
+
+    def broadcaster(stop: threading.Event):
+        for seq in itertools.count():
+            if stop.wait(1.0 / broadcast_hz):
+                return
+            tcp_rep_queue.put(f"[REP] LOADTEST {seq} {time.time():.6f}")
+
+    stop = threading.Event()
+    threading.Thread(target=command_loop, daemon=True).start()
+    conn.send(server.server_address)
+    if conn.recv() == "broadcast" and broadcast_hz > 0:
+        threading.Thread(target=broadcaster, args=(stop,), daemon=True).start()
+    conn.recv()
+    stop.set()
+    conn.send(dispatcher.stats())
+    server.shutdown()
+
+
+@dataclass
+class ClientResult:
+    connected: bool = False
+    auth_s: float = 0.0
+    sent: int = 0
+    acked: int = 0
+    errors: int = 0
+    ack_latencies: dict[str, list[float]] = field(default_factory=dict)
+    broadcast_latencies: list[float] = field(default_factory=list)
+    broadcast_seqs: set[int] = field(default_factory=set)
+
+
+class LoadClient:
+    def __init__(self, address: tuple[str, int], env_file: Path, full_encryption: bool, *, pipeline: int,
+                 rate_hz: float):
+        self.address = address
+        # one Cipher per client: encrypted broadcasts carry the same nonce to every client
+        self.cipher = Cipher(env_file)
+        self.full_encryption = full_encryption
+        self.pipeline = pipeline
+        self.rate_hz = rate_hz
+        self.result = ClientResult()
+        self._pending: dict[str, tuple[str, float, asyncio.Future]] = {}
+        self._ids = itertools.count()
+
+    def _decode(self, frame: bytes) -> str:
+        if self.full_encryption:
+            return self.cipher.decrypt_message(frame)
+        return frame.decode("utf-8", errors="replace")
+
+    async def connect(self) -> None:
+        started = time.perf_counter()
+        self.reader, self.writer = await asyncio.open_connection(*self.address)
+        self.frames = FrameReader(self.reader)
+        self.writer.write(self.cipher.encrypt_message(self.address[0]) + b"\n")
+        await self.writer.drain()
+        reply = await self.frames.read_frame()
+        if reply is None or "authentication successful" not in self._decode(reply):
+            raise ConnectionError(f"handshake failed: {reply!r}")
+        self.result.connected = True
+        self.result.auth_s = time.perf_counter() - started
+
+    async def _read_loop(self) -> None:
+        while True:
+            frame = await self.frames.read_frame()
+            if frame is None:
+                return
+            received_at = time.time()
+            message = self._decode(frame).strip()
+            request_id, body = split_request_id(message)
+            if request_id is not None:
+                pending = self._pending.pop(request_id, None)
+                if pending is None:
+                    continue
+                command, sent_at, done = pending
+                if body.startswith("[ERR]"):
+                    self.result.errors += 1
+                else:
+                    self.result.acked += 1
+                    self.result.ack_latencies.setdefault(command, []).append(time.perf_counter() - sent_at)
+                done.set_result(None)
+            elif body.startswith("[REP] LOADTEST"):
+                _, _, seq, sent_unix = body.split()
+                self.result.broadcast_seqs.add(int(seq))
+                self.result.broadcast_latencies.append(received_at - float(sent_unix))
+
+    async def _send(self, command: str) -> asyncio.Future:
+        request_id = str(next(self._ids))
+        done = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = (command, time.perf_counter(), done)
+        self.writer.write(self.cipher.encrypt_message(f"#{request_id} {command}") + b"\n")
+        await self.writer.drain()
+        self.result.sent += 1
+        return done
+
+    async def run(self, duration_s: float, commands: list[str], weights: list[int]) -> None:
+        reader_task = asyncio.get_running_loop().create_task(self._read_loop())
+        slots = asyncio.Semaphore(self.pipeline)
+        deadline = time.perf_counter() + duration_s
+        interval = 1.0 / self.rate_hz if self.rate_hz > 0 else 0.0
+        try:
+            while time.perf_counter() < deadline and not reader_task.done():
+                await slots.acquire()
+                done = await self._send(random.choices(commands, weights)[0])
+                done.add_done_callback(lambda _done: slots.release())
+                if interval:
+                    await asyncio.sleep(interval)
+            # give outstanding commands the server's ACK timeout to come back
+            outstanding = [pending[2] for pending in self._pending.values()]
+            if outstanding:
+                await asyncio.wait(outstanding, timeout=11.0)
+            await asyncio.sleep(0.2)
+        finally:
+            reader_task.cancel()
+            self.writer.close()
+
+
+def _percentiles(values: list[float]) -> dict:
+    if not values:
+        return {"n": 0}
+    ordered = sorted(values)
+
+    def pick(p):
+        return ordered[min(len(ordered) - 1, int(round(p / 100.0 * (len(ordered) - 1))))] * 1000.0
+
+    return {"n": len(ordered), "p50_ms": pick(50), "p90_ms": pick(90), "p99_ms": pick(99),
+            "max_ms": ordered[-1] * 1000.0}
+
+
+async def _run_clients(address, env_file, args) -> tuple[list[LoadClient], float]:
+    clients = [LoadClient(address, env_file, args.full_encryption, pipeline=args.pipeline, rate_hz=args.rate)
+               for _ in range(args.clients)]
+    connect_results = await asyncio.gather(*(client.connect() for client in clients), return_exceptions=True)
+    for result in connect_results:
+        if isinstance(result, BaseException):
+            logging.warning("client failed to connect: %s", result)
+    connected = [client for client in clients if client.result.connected]
+    commands, weights = list(COMMAND_MIX), list(COMMAND_MIX.values())
+    started = time.perf_counter()
+    await asyncio.gather(*(client.run(args.duration, commands, weights) for client in connected))
+    return clients, time.perf_counter() - started
+
+
+def run_load_test(args) -> dict:
+    _raise_fd_limit()
+    work_dir = Path(tempfile.mkdtemp(prefix="tcp-load-"))
+    env_file = _write_key_file(work_dir)
+
+    parent_conn, child_conn = multiprocessing.Pipe()
+    server_process = multiprocessing.Process(
+        target=_serve,
+        args=(env_file, args.full_encryption, args.broadcast_hz, args.slow_handler_s, args.slow_client_policy,
+              child_conn),
+        daemon=True,
+    )
+    server_process.start()
+    address = parent_conn.recv()
+    server_stats = psutil.Process(server_process.pid)
+
+    max_threads = server_stats.num_threads()
+    sampling = threading.Event()
+
+    def sample_threads():
+        nonlocal max_threads
+        while not sampling.wait(0.2):
+            max_threads = max(max_threads, server_stats.num_threads())
+
+    sampler = threading.Thread(target=sample_threads, daemon=True)
+    sampler.start()
+
+    parent_conn.send("broadcast")
+    cpu_before = server_stats.cpu_times()
+    clients, elapsed_s = asyncio.run(_run_clients(address, env_file, args))
+    cpu_after = server_stats.cpu_times()
+    sampling.set()
+    sampler.join()
+
+    rss_mb = server_stats.memory_info().rss / 1e6
+    parent_conn.send("stop")
+    dispatcher_stats = parent_conn.recv()
+    server_process.join(timeout=5.0)
+
+    connected = [client.result for client in clients if client.result.connected]
+    per_command: dict[str, list[float]] = {}
+    for result in connected:
+        for command, latencies in result.ack_latencies.items():
+            per_command.setdefault(command, []).extend(latencies)
+    all_acks = [latency for latencies in per_command.values() for latency in latencies]
+    broadcasts_seen = max((max(result.broadcast_seqs) + 1 for result in connected if result.broadcast_seqs),
+                          default=0)
+    server_cpu_s = (cpu_after.user + cpu_after.system) - (cpu_before.user + cpu_before.system)
+
+    return {
+        "clients": args.clients,
+        "connected": len(connected),
+        "duration_s": elapsed_s,
+        "auth": _percentiles([result.auth_s for result in connected]),
+        "commands_sent": sum(result.sent for result in connected),
+        "commands_acked": sum(result.acked for result in connected),
+        "command_errors": sum(result.errors for result in connected),
+        "commands_per_s": sum(result.acked for result in connected) / elapsed_s if elapsed_s else 0.0,
+        "ack_latency": _percentiles(all_acks),
+        "ack_latency_by_command": {command: _percentiles(values) for command, values in per_command.items()},
+        "broadcasts_sent": broadcasts_seen,
+        # gaps only: clients finish at slightly different times, so the first/last broadcasts may legitimately differ
+        "broadcast_missed": sum(max(result.broadcast_seqs) - min(result.broadcast_seqs) + 1 - len(result.broadcast_seqs)
+                                for result in connected if result.broadcast_seqs),
+        "broadcast_latency": _percentiles([lat for result in connected for lat in result.broadcast_latencies]),
+        "server_cpu_s": server_cpu_s,
+        "server_cpu_perc": 100.0 * server_cpu_s / elapsed_s if elapsed_s else 0.0,
+        "server_max_threads": max_threads,
+        "server_rss_mb": rss_mb,
+        "dispatcher": dispatcher_stats,
+    }
+
+
+def _print_report(report: dict) -> None:
+    def line(label, stats):
+        if not stats.get("n"):
+            print(f"{label:<28}{'-':>8}")
+            return
+        print(f"{label:<28}{stats['n']:>8}{stats['p50_ms']:>10.2f}{stats['p90_ms']:>10.2f}"
+              f"{stats['p99_ms']:>10.2f}{stats['max_ms']:>10.2f}")
+
+    print(f"clients {report['connected']}/{report['clients']} connected, {report['duration_s']:.1f}s, "
+          f"{report['commands_acked']}/{report['commands_sent']} commands acked "
+          f"({report['command_errors']} errors), {report['commands_per_s']:.0f} cmd/s")
+    print(f"{'latency':<28}{'n':>8}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    line("handshake", report["auth"])
+    line("ACK (all)", report["ack_latency"])
+    for command, stats in sorted(report["ack_latency_by_command"].items()):
+        line(f"  {command}", stats)
+    line("broadcast fan-out", report["broadcast_latency"])
+    print(f"broadcasts: {report['broadcasts_sent']} sent, {report['broadcast_missed']} dropped across clients")
+    print(f"server: {report['server_cpu_perc']:.1f}% CPU ({report['server_cpu_s']:.2f}s), "
+          f"{report['server_max_threads']} threads max, {report['server_rss_mb']:.1f} MB RSS")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the TCP command server with N concurrent clients.")
+    parser.add_argument("-n", "--clients", type=int, default=20)
+    parser.add_argument("-d", "--duration", type=float, default=10.0, help="seconds of command load")
+    parser.add_argument("--pipeline", type=int, default=1, help="outstanding commands per client")
+    parser.add_argument("--rate", type=float, default=0.0,
+                        help="commands/s per client, 0 sends the next command as soon as a slot frees up")
+    parser.add_argument("--broadcast-hz", type=float, default=10.0)
+    parser.add_argument("--slow-handler-s", type=float, default=0.05, help="duration of the blocking SLOW command")
+    parser.add_argument("--slow-client-policy", default="coalesce")
+    parser.add_argument("--full-encryption", action="store_true")
+    parser.add_argument("--json", type=Path, default=None, help="write the report to this file")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    load_report = run_load_test(args)
+    _print_report(load_report)
+    if args.json is not None:
+        args.json.write_text(json.dumps(load_report, indent=2))
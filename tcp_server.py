@@ -1,196 +1,507 @@
+import asyncio
+import collections
 import queue
-import socket
-import socketserver
 import threading
 import time
 import logging
 from pathlib import Path
 
 from encryption import Cipher
+from tcp_framing import FrameReader, encode_frame, split_request_id, with_request_id
+from telemetry import TelemetryHub, parse_subscribe
 
 
-class ThreadedTCPRequestHandler(socketserver.BaseRequestHandler):
-    timeout = 10
-    connected_clients = set()
-
-    def receive(self):
-        raw = str(self.request.recv(1024), 'ascii')
-        if raw and hasattr(self.server, 'cipher'):
-            # message needs to be terminated by newline character
-            if raw[-1] == "\n":
-                raw.replace("\n", "")
-                return self.server.cipher.decrypt_message(raw)
-
-    def send(self, raw):
-        if raw and hasattr(self.server, 'cipher'):
-            encrypted = self.server.cipher.encrypt_message(raw)
-            self.request.sendall(encrypted)
-
-    def setup(self):
-        self.connection = self.request
-        if self.timeout is not None:
-            self.connection.settimeout(self.timeout)
-        # waiting for authentication
+def _running_loop() -> asyncio.AbstractEventLoop | None:
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+class ResponseFuture:
+    """
+    Queue-like reply slot handed to the command loop together with each command.
+
+    The command loop calls ``put`` from its own thread; that resolves an asyncio future on the
+    server loop, so the connection handler wakes up immediately instead of polling a queue.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self._loop = loop
+        self.future = loop.create_future()
+
+    def put(self, message, block=True, timeout=None):
+        self._loop.call_soon_threadsafe(self._set_result, message)
+
+    def _set_result(self, message):
+        if not self.future.done():
+            self.future.set_result(message)
+
+
+SLOW_CLIENT_POLICIES = ("drop", "coalesce", "disconnect")
+
+
+class ClientConnection:
+    """
+    One authenticated client with its own bounded outbound queue and writer task.
+
+    Broadcasts are enqueued without waiting, so a slow or half-dead client can only fall behind
+    itself. When the queue is full the ``policy`` decides what happens:
+      - ``drop``: discard the oldest queued broadcast
+      - ``coalesce``: replace a queued broadcast with the same key (e.g. "[REP] IR LED STATE")
+        by the newer one, otherwise discard the oldest broadcast
+      - ``disconnect``: close the connection
+    Command responses are never dropped or coalesced.
+    """
+
+    def __init__(self, writer: asyncio.StreamWriter, *, max_queue: int = 64, policy: str = "coalesce",
+                 stall_timeout: float = 30.0):
+        if policy not in SLOW_CLIENT_POLICIES:
+            raise ValueError(f"Unknown slow client policy {policy!r}, use one of {SLOW_CLIENT_POLICIES}")
+        self.writer = writer
+        self.address = writer.get_extra_info("peername")
+        self.framing: str | None = None
+        self.max_queue = max_queue
+        self.policy = policy
+        self.stall_timeout = stall_timeout
+
+        # items are [enqueued_at, key, payload, droppable]
+        self._queue: collections.deque[list] = collections.deque()
+        self._wakeup = asyncio.Event()
+        self._writer_task: asyncio.Task | None = None
+        self.closed = False
+
+        # live telemetry subscription, see telemetry.py
+        self.telemetry = None
+        self.telemetry_timer: asyncio.TimerHandle | None = None
+        self.telemetry_dropped_seen = 0
+
+        self.sent = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.last_lag_s = 0.0
+        self.max_lag_s = 0.0
+        self.queue_high_water = 0
+
+    def start(self) -> None:
+        self._writer_task = asyncio.get_running_loop().create_task(self._writer_loop())
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        self.closed = True
+        self.cancel_telemetry()
+        self._wakeup.set()
+        self.writer.close()
+
+    def cancel_telemetry(self) -> None:
+        self.telemetry = None
+        if self.telemetry_timer is not None:
+            self.telemetry_timer.cancel()
+            self.telemetry_timer = None
+
+    def enqueue(self, payload: bytes, *, key: str | None = None, droppable: bool = True) -> None:
+        if self.closed:
+            return
+        if droppable and len(self._queue) >= self.max_queue:
+            if self.policy == "disconnect":
+                logging.warning("[TCP] Disconnecting %s: %d messages behind", self.address, len(self._queue))
+                self.close()
+                return
+            if self.policy == "coalesce" and key is not None:
+                for item in self._queue:
+                    if item[3] and item[1] == key:
+                        # Keep the original position and age so the lag metric stays honest.
+                        item[2] = payload
+                        self.coalesced += 1
+                        return
+            for index, item in enumerate(self._queue):
+                if item[3]:
+                    del self._queue[index]
+                    self.dropped += 1
+                    break
+        self._queue.append([time.monotonic(), key, payload, droppable])
+        self.queue_high_water = max(self.queue_high_water, len(self._queue))
+        self._wakeup.set()
+
+    async def _writer_loop(self) -> None:
+        try:
+            while not self.closed:
+                if not self._queue:
+                    self._wakeup.clear()
+                    await self._wakeup.wait()
+                    continue
+                enqueued_at, _key, payload, _droppable = self._queue.popleft()
+                self.writer.write(payload)
+                await asyncio.wait_for(self.writer.drain(), self.stall_timeout)
+                self.sent += 1
+                self.last_lag_s = time.monotonic() - enqueued_at
+                self.max_lag_s = max(self.max_lag_s, self.last_lag_s)
+        except asyncio.TimeoutError:
+            logging.warning("[TCP] Disconnecting %s: send stalled for %.0fs", self.address, self.stall_timeout)
+        except (ConnectionError, OSError) as e:
+            logging.info("[TCP] Writer for %s stopped: %s", self.address, e)
+        finally:
+            self.close()
+
+    def stats(self) -> dict:
+        return {
+            "address": self.address,
+            "queued": len(self._queue),
+            "queue_high_water": self.queue_high_water,
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+            "last_lag_s": self.last_lag_s,
+            "max_lag_s": self.max_lag_s,
+        }
+
+
+def _broadcast_key(message: str) -> str | None:
+    # "[REP] IR LED STATE: ON" -> "[REP] IR LED STATE"; a newer state supersedes an older one.
+    head, sep, _ = message.partition(":")
+    return head if sep else None
+
+
+class CommandServer:
+    auth_timeout = 10
+    ack_timeout = 10.0
+    stats_log_interval_s = 60.0
+    # commands with a request id a single connection may have outstanding at once
+    max_pipelined_commands = 32
+
+    def __init__(self, tcp_cmd_queue: queue.Queue, tcp_cmd_ack_queue: queue.Queue, env_file: Path, run_tasks: bool,
+                 full_encryption: bool, server_address: tuple[str, int], *, client_queue_size: int = 64,
+                 slow_client_policy: str = "coalesce", telemetry: TelemetryHub | None = None) -> None:
+        if slow_client_policy not in SLOW_CLIENT_POLICIES:
+            raise ValueError(f"Unknown slow client policy {slow_client_policy!r}, use one of {SLOW_CLIENT_POLICIES}")
+        self.tcp_cmd_queue = tcp_cmd_queue
+        self.tcp_cmd_ack_queue = tcp_cmd_ack_queue
+        self.run_tasks = run_tasks
+        self.cipher = Cipher(env_file)
+        self.full_encryption = full_encryption
+        self.server_address = server_address
+        self.client_queue_size = client_queue_size
+        self.slow_client_policy = slow_client_policy
+        self.connected_clients: set[ClientConnection] = set()
+        # clients with a live telemetry subscription; only changed on the loop, read by publishers
+        self._telemetry_clients: set[ClientConnection] = set()
+        self.telemetry = telemetry
+
+        self.loop = asyncio.new_event_loop()
+        self._server: asyncio.AbstractServer | None = None
+        self._ready = threading.Event()
+        self._startup_error: BaseException | None = None
+        self._rep_messages: asyncio.Queue | None = None
+
+    # -- lifecycle -------------------------------------------------------------------------
+
+    def serve_forever(self, tcp_rep_queue: queue.Queue | None = None) -> None:
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_until_complete(self._start(tcp_rep_queue))
+        except BaseException as e:
+            self._startup_error = e
+            self._ready.set()
+            raise
+        self._ready.set()
+        try:
+            self.loop.run_forever()
+        finally:
+            self.loop.run_until_complete(self._close())
+            self.loop.close()
+
+    def wait_until_ready(self, timeout: float | None = None) -> None:
+        self._ready.wait(timeout)
+        if self._startup_error is not None:
+            raise self._startup_error
+
+    def shutdown(self) -> None:
+        self.run_tasks = False
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+    async def _start(self, tcp_rep_queue: queue.Queue | None) -> None:
+        host, port = self.server_address
+        self._server = await asyncio.start_server(self._handle_client, host, port)
+        self.server_address = self._server.sockets[0].getsockname()[:2]
+        if tcp_rep_queue is not None:
+            self._rep_messages = asyncio.Queue()
+            # Daemon thread that blocks on the REP queue fed by the rest of the application and hands
+            # each message to the loop; a daemon thread never keeps the process alive on exit.
+            threading.Thread(target=self._pump_rep_queue, args=(tcp_rep_queue,), name="tcp_rep_pump",
+                             daemon=True).start()
+            self.loop.create_task(self._broadcast_loop())
+        if self.telemetry is not None:
+            self.telemetry.add_listener(self._on_telemetry)
+        self.loop.create_task(self._log_client_stats())
+
+    async def _close(self) -> None:
+        if self.telemetry is not None:
+            self.telemetry.remove_listener(self._on_telemetry)
+        if self._server is not None:
+            self._server.close()
+        for client in list(self.connected_clients):
+            client.close()
+
+    # -- wire helpers ----------------------------------------------------------------------
+
+    async def _receive(self, frames: FrameReader) -> str | None:
+        frame = await frames.read_frame()
+        if not frame:
+            return None
+        return self.cipher.decrypt_message(frame)
+
+    def _payload(self, message: str) -> bytes:
+        if self.full_encryption:
+            return self.cipher.encrypt_message(message)
+        return message.encode("utf-8")
+
+    def _encode(self, message: str, framing: str | None) -> bytes:
+        return encode_frame(self._payload(message), framing)
+
+    # -- connections -----------------------------------------------------------------------
+
+    async def _authenticate(self, frames: FrameReader, writer: asyncio.StreamWriter) -> bool:
         # the client needs to send its encrypted ip address, we then decrypt the message and
         # check it against the connected ip address, if this is a match we are authenticated
+        client_ip = writer.get_extra_info("peername")[0]
         try:
-            ip_address = self.receive()
-            if ip_address == self.client_address[0]:
-                if hasattr(self.server, 'full_encryption') and self.server.full_encryption:
-                    self.send("[ACK] authentication successful\n")
-                else:
-                    self.request.sendall(b"[ACK] authentication successful\n")
-                self.timeout = None
-                self.connection.settimeout(self.timeout)
-                self.connected_clients.add(self.request)
-                logging.info(f"[TCP] Successful login attempt from {self.client_address[0]}")
-            else:
-                # this we send unencrypted!
-                self.request.sendall(b"[ERR] invalid token\n")
-                self.request.close()
-                logging.info(
-                    f"[TCP] Failed login attempt from {self.client_address[0]} with encrypted ip_address: {ip_address}")
-        except socket.timeout:
+            ip_address = await asyncio.wait_for(self._receive(frames), self.auth_timeout)
+        except asyncio.TimeoutError:
             # this we send unencrypted!
-            self.request.sendall(b"[ERR] timeout for login attempt\n")
-            self.request.close()
-            logging.info(f"[TCP] Timeout for login attempt from {self.client_address[0]}")
-            pass
-        except BrokenPipeError:
-            logging.info(f"[TCP] Connection closed from {self.client_address[0]}")
+            writer.write(encode_frame(b"[ERR] timeout for login attempt\n", frames.framing))
+            logging.info(f"[TCP] Timeout for login attempt from {client_ip}")
+            return False
+        except Exception as e:
+            writer.write(encode_frame(b"[ERR] invalid token\n", frames.framing))
+            logging.info(f"[TCP] Failed login attempt from {client_ip}: {e}")
+            return False
 
-    def handle(self):
+        if ip_address != client_ip:
+            # this we send unencrypted!
+            writer.write(encode_frame(b"[ERR] invalid token\n", frames.framing))
+            logging.info(f"[TCP] Failed login attempt from {client_ip} with encrypted ip_address: {ip_address}")
+            return False
+
+        writer.write(self._encode("[ACK] authentication successful\n", frames.framing))
+        await writer.drain()
+        logging.info(f"[TCP] Successful login attempt from {client_ip} ({frames.framing} framing)")
+        return True
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        client_address = writer.get_extra_info("peername")
+        frames = FrameReader(reader)
+        client = None
+        pipelined: set[asyncio.Task] = set()
+        pipeline_slots = asyncio.Semaphore(self.max_pipelined_commands)
         try:
-            if self.request not in self.connected_clients:
+            if not await self._authenticate(frames, writer):
                 return
-            while True:
-                data = self.receive()
+            client = ClientConnection(writer, max_queue=self.client_queue_size, policy=self.slow_client_policy)
+            client.framing = frames.framing
+            client.start()
+            self.connected_clients.add(client)
+            while self.run_tasks and not client.closed:
+                data = await self._receive(frames)
                 if not data:
                     # Connection closed by the client
-                    logging.info(f"[TCP] Connection closed by {self.client_address}\n")
+                    logging.info(f"[TCP] Connection closed by {client_address}\n")
                     break
-
-                # Handle the received data here
-                print(f"[TCP] Received data from {self.client_address}: {data}")
-
-                # You can send a response back to the client if needed
-                # self.request.sendall(b"Response from server")
-
-                if (hasattr(self.server, 'run_tasks') and hasattr(self.server, 'tcp_cmd_queue')
-                        and hasattr(self.server, 'tcp_cmd_ack_queue')):
-                    # Route each command to its own response queue to avoid stale/cross-client ACK mixups.
-                    response_queue = queue.Queue(maxsize=1)
-                    self.server.tcp_cmd_queue.put((data, response_queue))
-
-                    # note: we cannot use queue.get(timeout=timeout) because this would let this task stuck even when the 
-                    # main task is killed
-                    start = time.time()
-                    response = None
-                    while self.server.run_tasks:
-                        if time.time() - start > 10.0:
-                            break
-                        try:
-                            response = response_queue.get(block=False)
-                            break
-                        except queue.Empty:
-                            time.sleep(0.25)
-                            continue
-                    if response:
-                        logging.info("[TCP] Sending response to %s: %s", self.client_address, str(response).strip())
-                        if hasattr(self.server, 'full_encryption') and self.server.full_encryption:
-                            self.send(response)
-                        else:
-                            self.request.sendall(response.encode('utf-8'))
-                    else:
-                        logging.info("[TCP] Sending timeout error to %s", self.client_address)
-                        if hasattr(self.server, 'full_encryption') and self.server.full_encryption:
-                            self.send("[ERR] command not acknowledged\n")
-                        else:
-                            self.request.sendall("[ERR] command not acknowledged\n".encode('utf-8'))
-                else:
-                    raise AttributeError(
-                        "Server does not have a tcp_cmd_queue, tcp_cmd_ack_queue, run_tasks, authenticated_clients")
-
+                logging.debug(f"[TCP] Received data from {client_address}: {data}")
+                request_id, command = split_request_id(data)
+                if request_id is None:
+                    # Legacy clients match replies by order, so answer before reading the next command.
+                    await self._answer(client, None, command)
+                    continue
+                await pipeline_slots.acquire()
+                task = self.loop.create_task(self._answer(client, request_id, command))
+                pipelined.add(task)
+                task.add_done_callback(pipelined.discard)
+                task.add_done_callback(lambda _task: pipeline_slots.release())
         except ConnectionResetError:
             # Connection reset by the client
-            logging.info(f"[TCP] Connection reset by {self.client_address}")
-        except TimeoutError:
-            logging.info(f"[TCP] Timeout from {self.client_address}")
+            logging.info(f"[TCP] Connection reset by {client_address}")
         except BrokenPipeError:
-            logging.info(f"[TCP] Connection closed from {self.client_address[0]}")
-        except KeyboardInterrupt:
-            self.server.shutdown()
+            logging.info(f"[TCP] Connection closed from {client_address[0]}")
+        except Exception as e:
+            logging.warning(f"[TCP] Dropping {client_address}: {e}")
         finally:
-            if self.request in self.connected_clients:
-                self.connected_clients.remove(self.request)
-            self.request.close()
+            for task in list(pipelined):
+                task.cancel()
+            if client is not None:
+                self.connected_clients.discard(client)
+                self._telemetry_clients.discard(client)
+                client.close()
+            else:
+                writer.close()
 
+    async def _answer(self, client: ClientConnection, request_id: str | None, command: str) -> None:
+        response = self._handle_telemetry_command(client, command)
+        if response is not None:
+            # answered locally: telemetry subscriptions are per connection, the command loop never sees them
+            client.enqueue(self._encode(with_request_id(request_id, response), client.framing), droppable=False)
+            self._flush_telemetry(client)
+            return
+        response = await self._dispatch(command)
+        if response:
+            logging.info("[TCP] Sending response to %s: %s", client.address, str(response).strip())
+        else:
+            logging.info("[TCP] Sending timeout error to %s", client.address)
+            response = "[ERR] command not acknowledged\n"
+        client.enqueue(self._encode(with_request_id(request_id, response), client.framing), droppable=False)
 
-class ThreadedTCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
-    pass
+    async def _dispatch(self, data: str) -> str | None:
+        # Route each command to its own reply slot to avoid stale/cross-client ACK mixups.
+        response_slot = ResponseFuture(self.loop)
+        self.tcp_cmd_queue.put((data, response_slot))
+        try:
+            return await asyncio.wait_for(response_slot.future, self.ack_timeout)
+        except asyncio.TimeoutError:
+            return None
 
+    # -- telemetry -------------------------------------------------------------------------
 
-class CommandServer(ThreadedTCPServer):
-    def __init__(self, tcp_cmd_queue: queue.Queue, tcp_cmd_ack_queue: queue.Queue, env_file: Path, run_tasks: bool,
-                 full_encryption: bool, *args, **kwargs) -> None:
-        super().__init__(*args, **kwargs)
-        self.tcp_cmd_queue = tcp_cmd_queue
-        self.tcp_cmd_ack_queue = tcp_cmd_ack_queue
-        self.run_tasks = run_tasks
-        self.cipher = Cipher(env_file)
-        self.full_encryption = full_encryption
+    def _handle_telemetry_command(self, client: ClientConnection, command: str) -> str | None:
+        text = command.strip()
+        if not text.startswith("[CMD]"):
+            return None
+        verb, _, arguments = text[len("[CMD]"):].strip().partition(" ")
+        verb = verb.upper()
+        if verb == "UNSUBSCRIBE":
+            client.cancel_telemetry()
+            self._telemetry_clients.discard(client)
+            return "[ACK] UNSUBSCRIBED\n"
+        if verb != "SUBSCRIBE":
+            return None
+        if self.telemetry is None:
+            return "[ERR] telemetry not available\n"
+        try:
+            subscription = parse_subscribe(arguments, self.telemetry.fields())
+        except ValueError as e:
+            return f"[ERR] SUBSCRIBE: {e}\n"
+        client.cancel_telemetry()
+        subscription.update(self.telemetry.snapshot())
+        client.telemetry = subscription
+        client.telemetry_dropped_seen = client.dropped
+        self._telemetry_clients.add(client)
+        logging.info("[TCP] %s subscribed to %d telemetry field(s) at %.2f Hz",
+                     client.address, len(subscription.fields), subscription.rate_hz)
+        return f"[ACK] SUBSCRIBED {','.join(sorted(subscription.fields))} rate={subscription.rate_hz:g}\n"
 
+    def _on_telemetry(self, values: dict) -> None:
+        # called on the publisher's thread, for every radar frame; without subscribers the loop stays asleep
+        if not self._telemetry_clients:
+            return
+        try:
+            self.loop.call_soon_threadsafe(self._fan_out_telemetry, values)
+        except RuntimeError:
+            # loop already closed
+            pass
 
-def send_periodic_data_to_all_clients(tcp_rep_queue: queue.Queue, env_file: Path, full_encryption: bool = False):
-    cipher = Cipher(env_file)
-    while True:
-        # Send data to all connected clients periodically
+    def _fan_out_telemetry(self, values: dict) -> None:
+        for client in list(self._telemetry_clients):
+            if client.telemetry is not None and client.telemetry.update(values):
+                self._flush_telemetry(client)
 
-        # note: we cannot use queue.get(timeout=timeout) because this would let this task stuck even when the 
-        # main task is killed
-        message = None
-        while True:
+    def _flush_telemetry(self, client: ClientConnection) -> None:
+        subscription = client.telemetry
+        if subscription is None or client.closed:
+            return
+        if client.dropped != client.telemetry_dropped_seen:
+            # a delta may have been lost in the client's queue; resynchronise with a keyframe
+            client.telemetry_dropped_seen = client.dropped
+            subscription.request_keyframe()
+        now_s = time.time()
+        wait_s = subscription.seconds_until_due(now_s)
+        if wait_s > 0:
+            # rate-limited: changes keep accumulating in the subscription and go out in one line
+            if client.telemetry_timer is None:
+                client.telemetry_timer = self.loop.call_later(wait_s, self._telemetry_timer_fired, client)
+            return
+        message = subscription.next_message(now_s)
+        if message is not None:
+            client.enqueue(self._encode(message, client.framing))
+
+    def _telemetry_timer_fired(self, client: ClientConnection) -> None:
+        client.telemetry_timer = None
+        self._flush_telemetry(client)
+
+    # -- broadcasts ------------------------------------------------------------------------
+
+    def _pump_rep_queue(self, tcp_rep_queue: queue.Queue) -> None:
+        while not self.loop.is_closed():
+            message = tcp_rep_queue.get()
             try:
-                message = tcp_rep_queue.get(block=False)
+                self.loop.call_soon_threadsafe(self._rep_messages.put_nowait, message)
+            except RuntimeError:
+                # loop closed while we were waiting
                 break
-            except queue.Empty:
-                time.sleep(0.25)
+
+    async def _broadcast_loop(self) -> None:
+        while True:
+            message = await self._rep_messages.get()
+            if not message:
                 continue
-        try:
-            if message:
-                logging.info(
-                    "[TCP] Broadcasting message to %d client(s): %s",
-                    len(ThreadedTCPRequestHandler.connected_clients),
-                    str(message).strip(),
-                )
-            for client in ThreadedTCPRequestHandler.connected_clients:
-                # note that full encryption takes more time and is not necessary since the data itself is
-                # not private
-                if full_encryption:
-                    encrypted_message = cipher.encrypt_message(message)
-                    encrypted_message += b"\n"
-                    client.sendall(encrypted_message)
-                else:
-                    client.sendall(message.encode('utf-8'))
-        except Exception as e:
-            logging.error(f"[TCP] Error sending data to client: {e}")
+            logging.info(
+                "[TCP] Broadcasting message to %d client(s): %s",
+                len(self.connected_clients),
+                str(message).strip(),
+            )
+            key = _broadcast_key(message)
+            # Encrypt once and fan the same bytes out to every client; only the framing differs.
+            payload = self._payload(message)
+            framed: dict[str | None, bytes] = {}
+            for client in list(self.connected_clients):
+                try:
+                    if client.framing not in framed:
+                        framed[client.framing] = encode_frame(payload, client.framing)
+                    client.enqueue(framed[client.framing], key=key)
+                except Exception as e:
+                    logging.error(f"[TCP] Error queueing data for client {client.address}: {e}")
+            # Let the writer tasks run between broadcasts; otherwise a burst of REPs would be queued
+            # up front and overflow every client, not just the slow ones.
+            await asyncio.sleep(0)
+
+    def client_stats(self, timeout: float = 2.0) -> list[dict]:
+        """Per-client queue depth, drop/coalesce counters and send lag; safe to call from any thread."""
+        if not self.loop.is_running() or _running_loop() is self.loop:
+            return self._collect_client_stats()
+
+        async def collect() -> list[dict]:
+            return self._collect_client_stats()
+
+        # the loop adds and removes clients and updates their counters, so take the snapshot there
+        return asyncio.run_coroutine_threadsafe(collect(), self.loop).result(timeout)
+
+    def _collect_client_stats(self) -> list[dict]:
+        return [client.stats() for client in list(self.connected_clients)]
+
+    async def _log_client_stats(self) -> None:
+        while True:
+            await asyncio.sleep(self.stats_log_interval_s)
+            for stats in self._collect_client_stats():
+                if stats["dropped"] or stats["coalesced"] or stats["max_lag_s"] > 1.0:
+                    logging.info(
+                        "[TCP] Client %s lagging: queued=%d high_water=%d dropped=%d coalesced=%d "
+                        "last_lag=%.3fs max_lag=%.3fs",
+                        stats["address"], stats["queued"], stats["queue_high_water"], stats["dropped"],
+                        stats["coalesced"], stats["last_lag_s"], stats["max_lag_s"],
+                    )
 
 
 def run_server(tcp_cmd_queue: queue.Queue, tcp_cmd_ack_queue: queue.Queue, tcp_rep_queue: queue.Queue, env_file: Path,
-               run_tasks: bool, full_encryption: bool = False, ip='0.0.0.0', port=65432):
+               run_tasks: bool, full_encryption: bool = False, ip='0.0.0.0', port=65432,
+               client_queue_size: int = 64, slow_client_policy: str = "coalesce",
+               telemetry: TelemetryHub | None = None):
     server = CommandServer(tcp_cmd_queue, tcp_cmd_ack_queue, env_file, run_tasks, full_encryption, (ip, port),
-                           ThreadedTCPRequestHandler)
-    ip, port = server.server_address
-    server_thread = threading.Thread(target=server.serve_forever)
+                           client_queue_size=client_queue_size, slow_client_policy=slow_client_policy,
+                           telemetry=telemetry)
+    server_thread = threading.Thread(target=server.serve_forever, args=(tcp_rep_queue,), name="tcp_server")
     server_thread.daemon = True
     server_thread.start()
+    server.wait_until_ready(timeout=10.0)
 
-    # Start a separate thread for sending periodic data to all clients
-    periodic_thread = threading.Thread(target=send_periodic_data_to_all_clients,
-                                       args=(tcp_rep_queue, env_file, full_encryption))
-    periodic_thread.daemon = True
-    periodic_thread.start()
-
+    ip, port = server.server_address
     logging.info(f"[TPC] Server loop running on: {ip}, {port}")
     return server
 
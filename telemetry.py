@@ -0,0 +1,174 @@
+from __future__ import annotations
+
+import logging
+import math
+import threading
+import time
+from typing import Callable, Iterable
+
+# Live telemetry pushed to TCP clients that sent "[CMD] SUBSCRIBE <fields> [rate=<hz>]".
+#
+# Publishers (the periodic sensor logger, the radar sampler) hand their freshest values to a
+# TelemetryHub. Every subscriber gets its own TelemetrySubscription, which rate-limits and
+# delta-encodes what it sends:
+#
+#   [TEL] K <unix_ms> inside_temperature=21.4 inside_co2=612 radar_presence=1
+#   [TEL] D <unix_ms> inside_co2=618
+#
+# "K" lines are keyframes carrying every subscribed field that has a value; "D" lines carry only
+# the fields whose encoded value changed since the previous line. A keyframe is sent right after
+# subscribing, periodically, and whenever frames to that client had to be dropped, so a client can
+# always resynchronise. Booleans are 1/0, a missing reading is "-".
+
+TelemetryListener = Callable[[dict], None]
+
+MIN_RATE_HZ = 0.01
+MAX_RATE_HZ = 10.0
+DEFAULT_RATE_HZ = 1.0
+
+
+def encode_value(value) -> str:
+    if value is None:
+        return "-"
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, int):
+        return str(value)
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return str(value).replace(" ", "_")
+    if math.isnan(value) or math.isinf(value):
+        return "-"
+    return f"{value:.6g}"
+
+
+class TelemetryHub:
+    """Latest value per field, fanned out to listeners on every publish; safe to use from any thread."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._fields: set[str] = set()
+        self._latest: dict[str, object] = {}
+        self._listeners: list[TelemetryListener] = []
+
+    def register_fields(self, names: Iterable[str]) -> None:
+        with self._lock:
+            self._fields.update(names)
+
+    def fields(self) -> list[str]:
+        with self._lock:
+            return sorted(self._fields)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(self._latest)
+
+    def add_listener(self, listener: TelemetryListener) -> None:
+        with self._lock:
+            self._listeners.append(listener)
+
+    def remove_listener(self, listener: TelemetryListener) -> None:
+        with self._lock:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+
+    def publish(self, values: dict) -> None:
+        with self._lock:
+            values = {name: value for name, value in values.items() if name in self._fields}
+            if not values:
+                return
+            self._latest.update(values)
+            listeners = list(self._listeners)
+        for listener in listeners:
+            try:
+                listener(values)
+            except Exception:
+                logging.exception("Telemetry listener failed.")
+
+
+class TelemetrySubscription:
+    """Per-client rate limit and delta state; not thread-safe, owned by one connection."""
+
+    def __init__(self, fields: Iterable[str], rate_hz: float = DEFAULT_RATE_HZ, keyframe_interval_s: float = 30.0):
+        self.fields = frozenset(fields)
+        self.rate_hz = min(MAX_RATE_HZ, max(MIN_RATE_HZ, rate_hz))
+        self.min_interval_s = 1.0 / self.rate_hz
+        self.keyframe_interval_s = keyframe_interval_s
+
+        self._current: dict[str, str] = {}
+        self._sent: dict[str, str] = {}
+        self._last_sent_s = -math.inf
+        self._last_keyframe_s = -math.inf
+        self._force_keyframe = True
+
+    def update(self, values: dict) -> bool:
+        """Merge new readings; return True if anything subscribed actually changed."""
+        changed = False
+        for name, value in values.items():
+            if name not in self.fields:
+                continue
+            encoded = encode_value(value)
+            if self._current.get(name) != encoded:
+                self._current[name] = encoded
+                changed = True
+        return changed
+
+    def request_keyframe(self) -> None:
+        self._force_keyframe = True
+
+    def seconds_until_due(self, now_s: float) -> float:
+        return max(0.0, self._last_sent_s + self.min_interval_s - now_s)
+
+    def next_message(self, now_s: float | None = None) -> str | None:
+        """Return the line to send now, or None if rate-limited or nothing changed."""
+        now_s = time.time() if now_s is None else now_s
+        if self.seconds_until_due(now_s) > 0:
+            return None
+        keyframe = self._force_keyframe or now_s - self._last_keyframe_s >= self.keyframe_interval_s
+        if keyframe:
+            items = self._current
+        else:
+            items = {name: value for name, value in self._current.items() if self._sent.get(name) != value}
+            if not items:
+                return None
+
+        body = " ".join(f"{name}={value}" for name, value in sorted(items.items()))
+        line = f"[TEL] {'K' if keyframe else 'D'} {int(now_s * 1000)}"
+        if body:
+            line += " " + body
+        self._sent.update(items)
+        self._last_sent_s = now_s
+        if keyframe:
+            self._last_keyframe_s = now_s
+            self._force_keyframe = False
+        return line + "\n"
+
+
+def parse_subscribe(command: str, known_fields: Iterable[str]) -> TelemetrySubscription:
+    """
+    Parse the argument part of "SUBSCRIBE <field>[,<field>...] [rate=<hz>]"; "*" selects all fields.
+
+    Raises ValueError with a client-facing message for unknown fields or a bad rate.
+    """
+    known = set(known_fields)
+    fields: set[str] = set()
+    rate_hz = DEFAULT_RATE_HZ
+    for token in command.replace(",", " ").split():
+        if token.lower().startswith("rate="):
+            try:
+                rate_hz = float(token[len("rate="):])
+            except ValueError:
+                raise ValueError(f"invalid rate {token[len('rate='):]!r}") from None
+            if not rate_hz > 0:
+                raise ValueError("rate must be positive")
+        elif token == "*":
+            fields.update(known)
+        else:
+            fields.add(token)
+    if not fields:
+        raise ValueError(f"no fields given, available: {','.join(sorted(known))}")
+    unknown = fields - known
+    if unknown:
+        raise ValueError(f"unknown field(s) {','.join(sorted(unknown))}")
+    return TelemetrySubscription(fields, rate_hz)
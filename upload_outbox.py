@@ -0,0 +1,323 @@
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import logging
+import random
+import shutil
+import sqlite3
+import threading
+import time
+
+import requests
+
+from image_upload import UploadImageError, upload_live_photo
+from live_photo import LivePhotoResult
+
+
+class UploadOutbox:
+    """
+    Persistent queue of Live Photo bundles waiting to be uploaded.
+
+    Captured files are recorded in a small SQLite manifest and then moved into
+    ``outbox_dir`` before the first upload attempt, so an unreachable endpoint or
+    a restart never loses them. The row is written first (state 'moving', with
+    both the capture and the outbox paths), so a move cut short by an error or a
+    crash is finished on the next start; a file that cannot be moved is uploaded
+    from where it was captured. Files are only deleted after the server
+    confirmed both parts.
+    """
+
+    def __init__(
+        self,
+        token: str,
+        url: str,
+        *,
+        outbox_dir: str = "gallery/outbox",
+        max_concurrency: int = 2,
+        base_backoff_seconds: float = 5.0,
+        max_backoff_seconds: float = 15 * 60,
+        rate_limiter=None,
+        chunked: bool = False,
+    ) -> None:
+        self.token = token
+        self.url = url
+        self.outbox_dir = Path(outbox_dir)
+        self.max_concurrency = max(1, max_concurrency)
+        self.base_backoff_seconds = base_backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.rate_limiter = rate_limiter
+        self.chunked = chunked
+
+        self.outbox_dir.mkdir(parents=True, exist_ok=True)
+        self._db_lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.outbox_dir / "manifest.db"), check_same_thread=False)
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS entries (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                bundle_id TEXT NOT NULL,
+                asset_id TEXT NOT NULL,
+                still_path TEXT NOT NULL,
+                motion_path TEXT NOT NULL,
+                apple_metadata_ready INTEGER NOT NULL,
+                state TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL,
+                created_at REAL NOT NULL,
+                last_error TEXT
+            )
+            """
+        )
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(entries)")}
+        for column in ("source_still_path", "source_motion_path"):
+            if column not in columns:
+                self._db.execute(f"ALTER TABLE entries ADD COLUMN {column} TEXT")
+        self._db.commit()
+
+        self._wake_event = threading.Event()
+        self._stop_event = threading.Event()
+        self._in_flight = 0
+        self._in_flight_lock = threading.Lock()
+        self._executor: ThreadPoolExecutor | None = None
+        # motion clips go out here while each worker sends its bundle's still; one slot per worker
+        self._part_executor: ThreadPoolExecutor | None = None
+        self._dispatcher_thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        if self._dispatcher_thread is not None and self._dispatcher_thread.is_alive():
+            return
+        with self._db_lock:
+            # Anything in flight when we went down never got a confirmed upload.
+            self._db.execute("UPDATE entries SET state = 'pending' WHERE state = 'in_flight'")
+            self._db.commit()
+            moving = self._db.execute(
+                """
+                SELECT id, bundle_id, source_still_path, still_path, source_motion_path, motion_path
+                FROM entries WHERE state = 'moving'
+                """
+            ).fetchall()
+        for entry_id, bundle_id, source_still, still_path, source_motion, motion_path in moving:
+            logging.warning("[outbox] entry %d (%s) was interrupted while queueing, finishing it", entry_id, bundle_id)
+            self._finish_move(entry_id, [(source_still, still_path), (source_motion, motion_path)])
+        self._stop_event.clear()
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="outbox")
+        self._part_executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="outbox_part")
+        self._dispatcher_thread = threading.Thread(target=self._dispatcher, name="upload_outbox", daemon=True)
+        self._dispatcher_thread.start()
+        pending = self.pending_count()
+        if pending:
+            logging.info("[outbox] resuming with %d pending upload(s)", pending)
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self._wake_event.set()
+        if self._dispatcher_thread is not None:
+            self._dispatcher_thread.join(timeout=2.0)
+            self._dispatcher_thread = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        if self._part_executor is not None:
+            self._part_executor.shutdown(wait=False, cancel_futures=True)
+            self._part_executor = None
+
+    def enqueue(self, live_photo: LivePhotoResult) -> int:
+        if live_photo.still_path is None or live_photo.motion_path is None:
+            raise ValueError("Live photo bundle is incomplete")
+
+        bundle_dir = self.outbox_dir / live_photo.bundle_id
+        still_path = bundle_dir / live_photo.still_path.name
+        motion_path = bundle_dir / live_photo.motion_path.name
+
+        now = time.time()
+        with self._db_lock:
+            cursor = self._db.execute(
+                """
+                INSERT INTO entries
+                (bundle_id, asset_id, still_path, motion_path, source_still_path, source_motion_path,
+                 apple_metadata_ready, state, next_attempt_at, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, 'moving', ?, ?)
+                """,
+                (
+                    live_photo.bundle_id,
+                    live_photo.asset_id,
+                    str(still_path),
+                    str(motion_path),
+                    str(live_photo.still_path),
+                    str(live_photo.motion_path),
+                    int(live_photo.apple_metadata_ready),
+                    now,
+                    now,
+                ),
+            )
+            self._db.commit()
+            entry_id = cursor.lastrowid
+
+        live_photo.still_path, live_photo.motion_path = self._finish_move(
+            entry_id,
+            [(str(live_photo.still_path), str(still_path)), (str(live_photo.motion_path), str(motion_path))],
+        )
+        logging.info("[outbox] queued live photo %s as entry %d", live_photo.bundle_id, entry_id)
+        self._wake_event.set()
+        return entry_id
+
+    def _finish_move(self, entry_id: int, parts: list[tuple[str | None, str]]) -> list[Path | None]:
+        """
+        Move each (source, target) part of an entry into the outbox and mark the entry pending.
+
+        A part that cannot be moved stays at its source and is uploaded from there. The entry is only
+        deleted if none of its files exist anywhere.
+        """
+        located: list[Path | None] = []
+        for source, target in parts:
+            source_path = Path(source) if source else None
+            target_path = Path(target)
+            # the source still existing means the move never completed (a cross-device move copies first)
+            if source_path is not None and source_path.exists():
+                try:
+                    target_path.parent.mkdir(parents=True, exist_ok=True)
+                    shutil.move(str(source_path), str(target_path))
+                except OSError as e:
+                    logging.error("[outbox] could not move %s into the outbox, uploading it in place: %s",
+                                  source_path, e)
+                    located.append(source_path)
+                    continue
+            located.append(target_path if target_path.exists() else None)
+
+        with self._db_lock:
+            if all(path is None for path in located):
+                logging.error("[outbox] files for entry %d are gone, dropping it", entry_id)
+                self._db.execute("DELETE FROM entries WHERE id = ?", (entry_id,))
+            else:
+                # a part that is gone parks the entry at its first upload attempt
+                still_path, motion_path = (str(path or target) for path, (_, target) in zip(located, parts))
+                self._db.execute(
+                    "UPDATE entries SET state = 'pending', still_path = ?, motion_path = ? WHERE id = ?",
+                    (still_path, motion_path, entry_id),
+                )
+            self._db.commit()
+        return located
+
+    def pending_count(self) -> int:
+        with self._db_lock:
+            (count,) = self._db.execute("SELECT COUNT(*) FROM entries").fetchone()
+        return count
+
+    def _dispatcher(self) -> None:
+        while not self._stop_event.is_set():
+            # cleared before looking at the manifest, so a wakeup during the scan is not lost
+            self._wake_event.clear()
+            with self._in_flight_lock:
+                free_slots = self.max_concurrency - self._in_flight
+
+            wait_seconds = 30.0
+            if free_slots > 0:
+                now = time.time()
+                with self._db_lock:
+                    rows = self._db.execute(
+                        """
+                        SELECT id, bundle_id, asset_id, still_path, motion_path, apple_metadata_ready, attempts
+                        FROM entries
+                        WHERE state = 'pending' AND next_attempt_at <= ?
+                        ORDER BY next_attempt_at
+                        LIMIT ?
+                        """,
+                        (now, free_slots),
+                    ).fetchall()
+                    for row in rows:
+                        self._db.execute("UPDATE entries SET state = 'in_flight' WHERE id = ?", (row[0],))
+                    self._db.commit()
+                    (next_due,) = self._db.execute(
+                        "SELECT MIN(next_attempt_at) FROM entries WHERE state = 'pending'"
+                    ).fetchone()
+
+                for row in rows:
+                    with self._in_flight_lock:
+                        self._in_flight += 1
+                    self._executor.submit(self._attempt, row)
+
+                if next_due is not None:
+                    wait_seconds = min(wait_seconds, max(0.0, next_due - time.time()))
+
+            self._wake_event.wait(timeout=wait_seconds)
+
+    def _attempt(self, row) -> None:
+        entry_id, bundle_id, asset_id, still_path, motion_path, apple_metadata_ready, attempts = row
+        live_photo = LivePhotoResult(
+            still_path=Path(still_path),
+            motion_path=Path(motion_path),
+            bundle_id=bundle_id,
+            asset_id=asset_id,
+            used_heic=False,
+            apple_metadata_ready=bool(apple_metadata_ready),
+        )
+        try:
+            still_exists, motion_exists = live_photo.still_path.exists(), live_photo.motion_path.exists()
+            if not still_exists and not motion_exists:
+                logging.error("[outbox] files for entry %d (%s) are gone, dropping it", entry_id, bundle_id)
+                self._delete_entry(entry_id)
+                return
+            if not still_exists or not motion_exists:
+                # half a bundle cannot be uploaded; keep the row so the remaining file stays accounted for
+                logging.error("[outbox] entry %d (%s) is missing a part, parking it", entry_id, bundle_id)
+                with self._db_lock:
+                    self._db.execute(
+                        "UPDATE entries SET state = 'incomplete', last_error = 'missing part' WHERE id = ?",
+                        (entry_id,),
+                    )
+                    self._db.commit()
+                return
+            upload_live_photo(
+                live_photo_result=live_photo,
+                token=self.token,
+                url=self.url,
+                rate_limiter=self.rate_limiter,
+                chunked=self.chunked,
+                part_executor=self._part_executor,
+            )
+        except (UploadImageError, requests.RequestException, OSError) as e:
+            attempts += 1
+            backoff = min(self.max_backoff_seconds, self.base_backoff_seconds * (2 ** (attempts - 1)))
+            backoff *= random.uniform(0.8, 1.2)
+            logging.warning(
+                "[outbox] upload of %s failed (attempt %d), retrying in %.0fs: %s",
+                bundle_id, attempts, backoff, e,
+            )
+            with self._db_lock:
+                self._db.execute(
+                    """
+                    UPDATE entries
+                    SET state = 'pending', attempts = ?, next_attempt_at = ?, last_error = ?
+                    WHERE id = ?
+                    """,
+                    (attempts, time.time() + backoff, str(e)[:500], entry_id),
+                )
+                self._db.commit()
+        except Exception:
+            logging.exception("[outbox] unexpected error uploading %s, retrying later", bundle_id)
+            with self._db_lock:
+                self._db.execute(
+                    "UPDATE entries SET state = 'pending', next_attempt_at = ? WHERE id = ?",
+                    (time.time() + self.max_backoff_seconds, entry_id),
+                )
+                self._db.commit()
+        else:
+            live_photo.still_path.unlink(missing_ok=True)
+            live_photo.motion_path.unlink(missing_ok=True)
+            if live_photo.still_path.parent.parent == self.outbox_dir:
+                try:
+                    live_photo.still_path.parent.rmdir()
+                except OSError:
+                    pass
+            self._delete_entry(entry_id)
+            logging.info("[outbox] uploaded live photo %s after %d attempt(s)", bundle_id, attempts + 1)
+        finally:
+            with self._in_flight_lock:
+                self._in_flight -= 1
+            self._wake_event.set()
+
+    def _delete_entry(self, entry_id: int) -> None:
+        with self._db_lock:
+            self._db.execute("DELETE FROM entries WHERE id = ?", (entry_id,))
+            self._db.commit()
@@ -0,0 +1,184 @@
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import logging
+import re
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+# Local stand-in for the birdhouse-rs upload endpoint, for exercising image_upload.py without the
+# real server. It accepts the classic multipart POST on /api/upload_image and implements the
+# resumable protocol described in image_upload.upload_image_resumable.
+
+_CHUNK_PATH_RE = re.compile(r"^/api/upload_image/chunked/([0-9a-f]{64})(/complete)?$")
+_CONTENT_RANGE_RE = re.compile(r"^bytes (\d+)-(\d+)/(\d+)$")
+
+
+class UploadStubHandler(BaseHTTPRequestHandler):
+    server: "UploadStubServer"
+
+    def log_message(self, fmt, *args):
+        logging.debug("[upload stub] " + fmt, *args)
+
+    def _reply(self, status: int, payload: dict) -> None:
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+    def _authorized(self) -> bool:
+        if self.headers.get("X-Upload-Token") == self.server.token:
+            return True
+        self._reply(401, {"error": "invalid token"})
+        return False
+
+    def do_GET(self):
+        match = _CHUNK_PATH_RE.match(urlparse(self.path).path)
+        if not match or match.group(2):
+            self._reply(404, {"error": "not found"})
+            return
+        if not self._authorized():
+            return
+        self._reply(200, {"offset": self.server.committed_offset(match.group(1))})
+
+    def do_PUT(self):
+        match = _CHUNK_PATH_RE.match(urlparse(self.path).path)
+        if not match or match.group(2):
+            self._reply(404, {"error": "not found"})
+            return
+        if not self._authorized():
+            return
+        upload_id = match.group(1)
+        range_match = _CONTENT_RANGE_RE.match(self.headers.get("Content-Range", ""))
+        if not range_match:
+            self._reply(400, {"error": "missing or malformed Content-Range"})
+            return
+        start, end, _total = (int(group) for group in range_match.groups())
+
+        if self.server.should_drop_chunk():
+            # Simulate a network blip: read part of the chunk, then hang up without committing.
+            self.rfile.read(max(0, (end - start + 1) // 2))
+            self.close_connection = True
+            self.connection.shutdown(2)
+            return
+
+        chunk = self._read_body()
+        if len(chunk) != end - start + 1:
+            self._reply(400, {"error": "chunk length does not match Content-Range"})
+            return
+        if hashlib.sha256(chunk).hexdigest() != self.headers.get("X-Chunk-SHA256"):
+            self._reply(400, {"error": "chunk hash mismatch"})
+            return
+
+        with self.server.lock:
+            committed = self.server.committed_offset(upload_id)
+            if start != committed:
+                self._reply(409, {"offset": committed})
+                return
+            with self.server.partial_path(upload_id).open("ab") as f:
+                f.write(chunk)
+            committed = self.server.committed_offset(upload_id)
+        self._reply(200, {"offset": committed})
+
+    def do_POST(self):
+        path = urlparse(self.path).path
+        if path == "/api/upload_image":
+            body = self._read_body()
+            self.server.received.append({"mode": "multipart", "bytes": len(body)})
+            self._reply(200, {"status": "ok", "bytes": len(body)})
+            return
+
+        match = _CHUNK_PATH_RE.match(path)
+        if not match or not match.group(2):
+            self._reply(404, {"error": "not found"})
+            return
+        if not self._authorized():
+            return
+        upload_id = match.group(1)
+        form = {k: v[0] for k, v in parse_qs(self._read_body().decode()).items()}
+        if form.get("auth_token") != self.server.token:
+            self._reply(401, {"error": "invalid token"})
+            return
+
+        with self.server.lock:
+            partial = self.server.partial_path(upload_id)
+            if not partial.exists():
+                self._reply(404, {"error": "unknown upload"})
+                return
+            digest = hashlib.sha256(partial.read_bytes()).hexdigest()
+            if digest != upload_id or form.get("sha256") != upload_id:
+                partial.unlink()
+                self._reply(422, {"error": "file hash mismatch, upload discarded"})
+                return
+            final_path = self.server.storage_dir / Path(form.get("filename", upload_id)).name
+            partial.replace(final_path)
+        self.server.received.append({"mode": "chunked", "path": str(final_path), **form})
+        self._reply(200, {"status": "ok", "path": str(final_path)})
+
+
+class UploadStubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, *, token: str, storage_dir: Path, drop_every: int = 0):
+        super().__init__(address, UploadStubHandler)
+        self.token = token
+        self.storage_dir = storage_dir
+        self.storage_dir.mkdir(parents=True, exist_ok=True)
+        self.drop_every = drop_every
+        self.lock = threading.Lock()
+        self.received: list[dict] = []
+        self._chunk_counter = 0
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/api/upload_image"
+
+    def partial_path(self, upload_id: str) -> Path:
+        return self.storage_dir / f"{upload_id}.partial"
+
+    def committed_offset(self, upload_id: str) -> int:
+        partial = self.partial_path(upload_id)
+        return partial.stat().st_size if partial.exists() else 0
+
+    def should_drop_chunk(self) -> bool:
+        with self.lock:
+            self._chunk_counter += 1
+            return self.drop_every > 0 and self._chunk_counter % self.drop_every == 0
+
+
+def run_stub_server(token: str, *, storage_dir: Path | None = None, ip: str = "127.0.0.1", port: int = 0,
+                    drop_every: int = 0) -> UploadStubServer:
+    """Start the stand-in server on a daemon thread; port 0 picks a free port (see ``server.url``)."""
+    storage_dir = storage_dir or Path(tempfile.mkdtemp(prefix="upload-stub-"))
+    server = UploadStubServer((ip, port), token=token, storage_dir=storage_dir, drop_every=drop_every)
+    threading.Thread(target=server.serve_forever, name="upload_stub", daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stand-in upload server and resumable upload check.")
+    parser.add_argument("file", type=Path, help="file to upload through the chunked protocol")
+    parser.add_argument("--chunk-size", type=int, default=256 * 1024)
+    parser.add_argument("--drop-every", type=int, default=3, help="drop every Nth chunk mid-transfer")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    from image_upload import upload_image_resumable
+
+    stub = run_stub_server("stub-token", drop_every=args.drop_every)
+    upload_image_resumable(args.file, "stub-token", stub.url, chunk_size=args.chunk_size)
+    stored = Path(stub.received[-1]["path"])
+    assert stored.read_bytes() == args.file.read_bytes(), "stored file differs from source"
+    print(f"OK: {args.file} uploaded intact to {stored} despite dropped chunks")
+    stub.shutdown()